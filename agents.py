@@ -149,22 +149,25 @@
 
 # agents.py
 
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.teams import DiGraphBuilder, GraphFlow
-from autogen_agentchat.conditions import TextMentionTermination
-from autogen_agentchat.agents import AssistantAgent,MessageFilterAgent,MessageFilterConfig,PerSourceFilter
-from database import store_data, query_db
+from typing import TYPE_CHECKING
+from database import store_data, query_db, get_industry_rollup
 from tools import search_web
 from formatting_tools import format_web_data
 
+if TYPE_CHECKING:
+    from autogen_ext.models.openai import OpenAIChatCompletionClient
 
-def create_team(llm_client: OpenAIChatCompletionClient):
+
+def create_team(llm_client: "OpenAIChatCompletionClient"):
     """
     Build the agent team for Industry Monitoring System.
     The workflow:
     QueryAgent -> SearchAgent -> FormattingAgent -> DataProcessingAgent -> ResponseAgent -> FormattingAgentFinal -> Terminate
     """
+    # autogen takes about a second to import: only pay for it when a team is built
+    from autogen_agentchat.agents import AssistantAgent, MessageFilterAgent, MessageFilterConfig, PerSourceFilter
+    from autogen_agentchat.teams import DiGraphBuilder, GraphFlow
+    from autogen_agentchat.conditions import TextMentionTermination
 
     # ---------- Agents ----------
 
@@ -220,9 +223,11 @@ def create_team(llm_client: OpenAIChatCompletionClient):
         system_message=(
             "You generate concise, accurate, and professional responses. "
             "Query the database when needed and present clear analysis, "
-            "avoiding raw JSON or code outputs."
+            "avoiding raw JSON or code outputs. "
+            "For questions about a whole sector, use get_industry_rollup instead of "
+            "fetching every company in it."
         ),
-        tools=[query_db]
+        tools=[query_db, get_industry_rollup]
     )
 
     formatting_agent_final = AssistantAgent(
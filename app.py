@@ -1,49 +1,302 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from database import query_db, init_db, close_db
+from typing import List, Optional
+from database import (
+    query_page, stream_query, init_db, close_db, get_query_cache, get_write_stats, get_write_buffer,
+    get_company_version, get_company_history, get_industry_rollup, list_industry_rollups, get_data_codec,
+    get_pool_stats, get_replica_router, get_backend_status, get_data_version, sync_data_version, begin_request_scope,
+    get_suggest_index, refresh_suggest_index, warm_pool, query_db,
+    add_watch, remove_watch, list_watchlist, watch_freshness, get_change_hub,
+)
+from cache import QueryCache, normalize_query
 from config import Config
-from agents import create_team
-from autogen_ext.models.openai import OpenAIChatCompletionClient
+from job_queue import JobQueue, QueueFullError
+from batch import ChatBatch, extract_entities
+from monitor import WatchlistMonitor, RateBudget
+from profiling import RequestProfiler, LoopMonitor
+import tracing
+from tools import search_web
+from formatting_tools import format_web_data
 import asyncio
+import hashlib
+import importlib
+import json
+import os
+import time
+from datetime import datetime
 
 app = FastAPI(title="Industry Monitoring API", version="1.0.0")
 config = Config()
 
-# Global team object
-team = None
+# One agent team per job worker (a team cannot run two tasks at once)
+teams = []
+
+# LLM client shared by the teams, also used directly by /chat/batch
+llm_client = None
+
+# Bounded queue every agent run goes through, /chat included
+job_queue = None
+
+# /chat answers keyed by normalized query + data version (see get_chat_cache)
+chat_cache = None
+
+# Warm-up progress per component, reported by /ready (see warm_up)
+warmup = {"ready": False, "draining": False, "seconds": None, "components": {}}
+
+# Periodic catch-up of the typeahead index with other processes' writes
+suggest_refresher = None
+
+# Background refresher of watched companies; runs in one web worker only (see startup_event)
+monitor = None
+
+# Sampling profiler for a fraction of requests, or those sending PROFILE_HEADER (opt-in: PROFILE_ENABLED)
+profiler = RequestProfiler(
+    directory=getattr(config, "PROFILE_DIR", "profiles"),
+    sample_rate=getattr(config, "PROFILE_SAMPLE_RATE", 0.01),
+    header=getattr(config, "PROFILE_HEADER", "X-Profile"),
+    interval=getattr(config, "PROFILE_INTERVAL", 0.005),
+    max_concurrent=getattr(config, "PROFILE_MAX_CONCURRENT", 2),
+) if getattr(config, "PROFILE_ENABLED", False) else None
+
+# Event-loop lag and blocked-callback watchdog (see startup_event)
+loop_monitor = None
+
+# The agent stack, imported on first use (init_agents) so `import app` stays fast;
+# run_app.py imports it up front before forking workers (see preload_agent_modules)
+AGENT_MODULES = ("agents", "autogen_agentchat.agents", "autogen_agentchat.teams", "autogen_ext.models.openai", "tavily")
 
 class QueryRequest(BaseModel):
     query: str
 
+class JobRequest(BaseModel):
+    query: str
+    priority: str = "normal"  # high | normal | low
+
+class BatchRequest(BaseModel):
+    queries: List[str]
+
+class WatchRequest(BaseModel):
+    kind: str  # company | industry
+    name: str
+    interval: Optional[float] = None  # initial seconds between refreshes
+
 class QueryResponse(BaseModel):
     response: str
     query: str
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database and agent team on startup"""
-    global team
-    
+def get_chat_cache() -> QueryCache:
+    """Agent answers by normalized query; the shared data version is the variant, so a write by any worker retires them."""
+    global chat_cache
+    if chat_cache is None:
+        chat_cache = QueryCache(
+            ttl=getattr(config, "CHAT_CACHE_TTL", 300),
+            max_entries=getattr(config, "CHAT_CACHE_MAX_ENTRIES", 256),
+        )
+    return chat_cache
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest() + '"'
+
+def cache_headers(etag: str) -> dict:
+    """ETag plus Cache-Control: clients may reuse the body for HTTP_CACHE_MAX_AGE seconds, then revalidate."""
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={getattr(config, 'HTTP_CACHE_MAX_AGE', 0)}, must-revalidate",
+    }
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+@app.middleware("http")
+async def read_your_writes(request, call_next):
+    """Give each request its own read-after-write window (see DB_READ_AFTER_WRITE_WINDOW)."""
+    begin_request_scope()
+    return await call_next(request)
+
+@app.middleware("http")
+async def profile_requests(request, call_next):
+    """Profile sampled requests until their body is sent; the profile's file name is in X-Profile."""
+    profile = profiler.begin(request.method, request.url.path) \
+        if profiler is not None and profiler.wanted(request.headers) else None
+    if profile is None:
+        return await call_next(request)
     try:
-        await init_db()
-        print("Database initialized successfully")
-    except Exception as e:
-        print(f"Database initialization failed: {e}")
-    
-    # Initialize agent team
+        response = await call_next(request)
+    except BaseException:
+        await profiler.finish(profile, 500)
+        raise
+    body = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await profiler.finish(profile, response.status_code)
+
+    response.body_iterator = profiled_body()
+    response.headers["X-Profile"] = profile["file"]
+    return response
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    """Start a trace for sampled requests; everything the request awaits (or queues) is traced under it."""
+    request_span = tracing.start_span(
+        f"{request.method} {request.url.path}", root=True, kind="server",
+        method=request.method, path=request.url.path,
+    )
+    if request_span is None:
+        return await call_next(request)
     try:
-        llm_client = OpenAIChatCompletionClient(
-            model="gpt-4.1",
-            api_key=config.OPENAI_API_KEY
-        )
-        team = create_team(llm_client)
-        print("Agent team initialized successfully")
+        with tracing.use_span(request_span):
+            response = await call_next(request)
+    except BaseException as e:
+        tracing.end_span(request_span, e)
+        raise
+    request_span.set(status_code=response.status_code)
+    body = response.body_iterator
+
+    async def traced_body():
+        # Streamed responses (NDJSON, /chat/batch) do their work while the body is sent
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            tracing.end_span(request_span)
+
+    response.body_iterator = traced_body()
+    response.headers["X-Trace-Id"] = request_span.trace_id
+    return response
+
+async def _warm_component(name: str, step):
+    """Run one warm-up step, recording its outcome and duration for /ready."""
+    started = time.perf_counter()
+    try:
+        detail = await step
+        warmup["components"][name] = {"status": "ready", "seconds": round(time.perf_counter() - started, 3)}
+        if detail is not None:
+            warmup["components"][name]["detail"] = detail
+        print(f"{name.capitalize()} initialized successfully")
     except Exception as e:
-        print(f"Agent team initialization failed: {e}")
+        warmup["components"][name] = {"status": "error", "error": str(e)}
+        print(f"{name.capitalize()} initialization failed: {e}")
+
+async def init_database():
+    """Database schema, typeahead index and a few pooled connections opened up front"""
+    await init_db()
+    connections = getattr(config, "DB_POOL_WARM_CONNECTIONS", 4)
+    return {"warm_connections": await warm_pool(connections) if connections else 0}
+
+def preload_agent_modules():
+    """Import the agent stack now rather than on first use"""
+    for name in AGENT_MODULES:
+        importlib.import_module(name)
+
+async def init_agents():
+    """One agent team per job worker, and the job queue in front of them"""
+    global teams, job_queue, llm_client
+    from agents import create_team
+    from autogen_ext.models.openai import OpenAIChatCompletionClient
+    llm_client = OpenAIChatCompletionClient(
+        model="gpt-4.1",
+        api_key=config.OPENAI_API_KEY
+    )
+    workers = getattr(config, "JOB_WORKERS", 4)
+    teams = [create_team(llm_client) for _ in range(workers)]
+    job_queue = JobQueue(
+        run_agents,
+        workers=workers,
+        max_depth=getattr(config, "JOB_QUEUE_MAX_DEPTH", 100),
+        result_ttl=getattr(config, "JOB_RESULT_TTL", 600),
+    )
+    return {"job_workers": workers}
+
+async def warm_up():
+    """Initialize this worker's resources concurrently; /ready flips once every one of them is up."""
+    started = time.perf_counter()
+    await asyncio.gather(
+        _warm_component("database", init_database()),
+        _warm_component("agents", init_agents()),
+    )
+    warmup["seconds"] = round(time.perf_counter() - started, 3)
+    warmup["ready"] = all(component["status"] == "ready" for component in warmup["components"].values())
+
+def create_tracer() -> tracing.Tracer:
+    """Tracer exporting to TRACE_FILE (per worker with --workers) and/or the TRACE_OTLP_ENDPOINT collector"""
+    exporters = []
+    path = getattr(config, "TRACE_FILE", "traces.jsonl")
+    if path:
+        worker = os.environ.get("WEB_WORKER_INDEX")
+        exporters.append(tracing.JsonlExporter(f"{path}.{worker}" if worker else path))
+    endpoint = getattr(config, "TRACE_OTLP_ENDPOINT", None)
+    if endpoint:
+        exporters.append(tracing.OtlpHttpExporter(endpoint, getattr(config, "TRACE_SERVICE_NAME", "fleet")))
+    return tracing.Tracer(
+        exporters,
+        sample_rate=getattr(config, "TRACE_SAMPLE_RATE", 1.0),
+        keep=getattr(config, "TRACE_KEEP", 100),
+        max_queued=getattr(config, "TRACE_MAX_QUEUED", 10000),
+    )
+
+async def refresh_suggestions(interval: float):
+    """Pick up companies other processes (web workers, the console app) wrote since the last refresh."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_suggest_index()
+        except Exception as e:
+            print(f"Typeahead refresh failed: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    """Warm up the database, agent teams and job queue; the worker takes traffic once this returns"""
+    global suggest_refresher, monitor, loop_monitor
+    if getattr(config, "TRACE_ENABLED", False):
+        tracing.configure(create_tracer())
+    if getattr(config, "LOOP_MONITOR_ENABLED", False):
+        loop_monitor = LoopMonitor(
+            interval=getattr(config, "LOOP_MONITOR_INTERVAL", 0.1),
+            block_threshold=getattr(config, "LOOP_BLOCK_THRESHOLD", 0.1),
+        )
+        loop_monitor.start()
+    await warm_up()
+    interval = getattr(config, "SUGGEST_REFRESH_SECONDS", 60)
+    if interval and getattr(config, "SUGGEST_INDEX", True):
+        suggest_refresher = asyncio.create_task(refresh_suggestions(interval))
+    # Forked workers (run_app.py --workers) share one search budget: only worker 0 monitors
+    if getattr(config, "MONITOR_ENABLED", True) and os.environ.get("WEB_WORKER_INDEX", "0") == "0":
+        monitor = WatchlistMonitor(
+            budget=RateBudget(getattr(config, "MONITOR_SEARCHES_PER_MINUTE", 10)),
+            tick=getattr(config, "MONITOR_TICK", 30),
+            concurrency=getattr(config, "MONITOR_CONCURRENCY", 2),
+            min_interval=getattr(config, "MONITOR_MIN_INTERVAL", 900),
+            max_interval=getattr(config, "MONITOR_MAX_INTERVAL", 86400),
+        )
+        monitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Clean up database connections on shutdown"""
+    """Stop the job workers and clean up database connections on shutdown"""
+    warmup["ready"] = False
+    warmup["draining"] = True
+    if suggest_refresher is not None:
+        suggest_refresher.cancel()
+    if monitor is not None:
+        await monitor.close()
+    if job_queue is not None:
+        await job_queue.close()
+    if loop_monitor is not None:
+        await loop_monitor.close()
+    tracer = tracing.get_tracer()
+    if tracer is not None:
+        tracing.configure(None)
+        await asyncio.to_thread(tracer.close)
     await close_db()
 
 @app.get("/")
@@ -51,46 +304,451 @@ async def root():
     return {"message": "Industry Monitoring API is running"}
 
 @app.get("/query/{query}")
-async def query_data(query: str):
+async def query_data(
+    request: Request,
+    query: str,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+):
+    """
+    Search companies. Results are paginated: pass `next_cursor` back as `after`.
+    `fields=industry,summary` projects rows; `stream=true` returns every match (after `after`) as NDJSON.
+    Pages carry an ETag; a matching If-None-Match gets 304 (served from the query cache).
+    """
     if not query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
     
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    
+    if stream:
+        rows = stream_query(query, fields=field_list, after=after)
+        try:
+            # Fetch the first row before answering: bad fields or cursors are a 400, not a cut-off 200
+            first = await anext(rows, None)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        
+        async def ndjson():
+            try:
+                if first is not None:
+                    yield json.dumps(first) + "\n"
+                    async for row in rows:
+                        yield json.dumps(row) + "\n"
+            finally:
+                await rows.aclose()
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
     try:
-        results = await query_db(query)
-        return {"results": results, "query": query}
+        page = await query_page(query, limit=limit, after=after, fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-
-@app.post("/chat", response_model=QueryResponse)
-async def chat_endpoint(request: QueryRequest):
-    """Process queries using the agent system"""
-    global team
-    
-    query = request.query.strip()
-    if not query:
-        raise HTTPException(status_code=400, detail="Query cannot be empty")
-    
-    if not team:
-        raise HTTPException(status_code=503, detail="Agent team not initialized")
     
+    if "results" not in page:
+        raise HTTPException(status_code=500, detail=f"Database error: {page.get('message')}")
+    if after is None:
+        get_suggest_index().record_search(query)
+    headers = cache_headers(make_etag(query, limit, page["etag"]))
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(
+        content={"results": page["results"], "query": query, "next_cursor": page["next_cursor"]},
+        headers=headers,
+    )
+
+@app.get("/suggest")
+async def suggest(prefix: str = "", limit: int = 8, by: str = "recency"):
+    """Typeahead: companies, aliases and industries starting with `prefix`, from memory (no database)."""
     try:
-        final_response = None
-        
-        # Stream the team workflow
+        suggestions = get_suggest_index().suggest(prefix, limit=max(1, min(limit, 50)), by=by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"prefix": prefix, "suggestions": suggestions}
+
+@app.get("/history/{company}")
+async def company_history(
+    company: str,
+    version: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Stored versions of a company's data: one `version`, or every version between `start` and `end`."""
+    if version is not None:
+        snapshot = await get_company_version(company, version=version)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"No version {version} for {company}")
+        return snapshot
+    return {"company": company, "versions": await get_company_history(company, start=start, end=end)}
+
+@app.get("/industries")
+async def industries():
+    """Rollups for every industry (company count, metric averages, news volume, freshness)."""
+    return {"industries": await list_industry_rollups()}
+
+@app.get("/industries/{industry}")
+async def industry_rollup(industry: str):
+    """Precomputed aggregates for one industry; cost does not grow with its number of companies."""
+    rollup = await get_industry_rollup(industry)
+    if not rollup["company_count"]:
+        raise HTTPException(status_code=404, detail=f"No companies stored for industry {industry}")
+    return rollup
+
+async def run_agents(query: str, worker: int) -> dict:
+    """Run the agent workflow for one query on the worker's own team; the answer is cached for /chat."""
+    team = teams[worker]
+    await team.reset()
+    final_response = None
+
+    # Stream the team workflow; tool calls made by the agents become children of this span
+    with tracing.span("agents.run", worker=worker, query=query) as run_span:
+        turn_started = time.time_ns()
+        turns = 0
         async for msg in team.run_stream(task=query):
+            source = getattr(msg, "source", "")
+            if run_span is not None and source and source != "user":
+                # An agent turn lasts from the previous message to this one
+                now = time.time_ns()
+                usage = getattr(msg, "models_usage", None)
+                tracing.record_span(
+                    f"agent.{source}", turn_started, now, agent=source, message_type=type(msg).__name__,
+                    prompt_tokens=usage.prompt_tokens if usage else None,
+                    completion_tokens=usage.completion_tokens if usage else None,
+                )
+                turn_started = now
+                turns += 1
             # Check if FormattingAgentFinal produced output
-            if getattr(msg, "source", "") == "FormattingAgentFinal" and getattr(msg, "content", None):
+            if source == "FormattingAgentFinal" and getattr(msg, "content", None):
                 final_response = msg.content
                 break
-        
-        if final_response:
-            return {"response": final_response, "query": query}
-        else:
-            return {"response": "No response generated from the agent system.", "query": query}
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Agent processing error: {str(e)}")
+        if run_span is not None:
+            run_span.set(turns=turns, answered=final_response is not None)
+
+    result = {"response": final_response or "No response generated from the agent system.", "query": query}
+    if final_response:
+        # Keyed by the version after the run: the agents may have just stored what they found
+        get_chat_cache().put(query, result, variant=get_data_version())
+    return result
+
+def submit_job(query: str, priority: str = "normal"):
+    """Queue an agent run, or answer 429 with Retry-After when the queue is full."""
+    query = query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Agent team not initialized")
+    try:
+        return job_queue.submit(query, priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+@app.post("/chat", response_model=QueryResponse)
+async def chat_endpoint(request: QueryRequest, response: Response):
+    """
+    Process queries using the agent system (waits for the queued run to finish).
+    A repeated query answers from the cache until company data changes or CHAT_CACHE_TTL passes;
+    one about watched companies the monitor keeps fresh is answered from stored data (X-Source: watchlist).
+    """
+    cached = get_chat_cache().get(request.query, variant=await sync_data_version())
+    if cached is not None:
+        response.headers["X-Cache"] = "hit"
+        response.headers["ETag"] = make_etag(normalize_query(request.query), cached["response"])
+        return {**cached, "query": request.query.strip()}
+
+    answer = await answer_from_watchlist(request.query.strip())
+    if answer is not None:
+        response.headers["X-Cache"] = "miss"
+        response.headers["X-Source"] = "watchlist"
+        response.headers["ETag"] = make_etag(normalize_query(request.query), answer)
+        return {"response": answer, "query": request.query.strip()}
+
+    job = submit_job(request.query)
+    await job_queue.wait(job)
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail=f"Agent processing error: {job.error}")
+    response.headers["X-Cache"] = "miss"
+    response.headers["ETag"] = make_etag(normalize_query(request.query), job.result["response"])
+    return job.result
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    """Queue an agent run and return its id at once; poll GET /jobs/{id} for the result."""
+    job = submit_job(request.query, request.priority)
+    return JSONResponse(status_code=202, content=job.to_dict(), headers={"Location": f"/jobs/{job.id}"})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status and, once done, its result. `wait` long-polls up to JOB_MAX_WAIT seconds for completion."""
+    job = job_queue.get(job_id) if job_queue else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job {job_id}")
+    if wait > 0 and job.status in ("queued", "running"):
+        await job_queue.wait(job, timeout=min(wait, getattr(config, "JOB_MAX_WAIT", 30)))
+    return job.to_dict()
+
+BATCH_SYSTEM_MESSAGE = (
+    "You answer industry monitoring questions from the research provided with each question "
+    "(stored company data, industry rollups and web search results). "
+    "Give a clear, professional answer in text, not JSON/YAML; use tables for comparisons when useful. "
+    "Say so when the research does not cover part of the question."
+)
+
+def _is_fresh(record: dict) -> bool:
+    """Whether a stored company is recent enough (CHAT_BATCH_MAX_AGE seconds) to answer without searching."""
+    try:
+        updated = datetime.fromisoformat(record.get("last_updated") or "")
+    except ValueError:
+        return False
+    return (datetime.utcnow() - updated).total_seconds() <= getattr(config, "CHAT_BATCH_MAX_AGE", 86400)
+
+async def research_entity(kind: str, name: str) -> dict:
+    """What a batch knows about one entity: fresh stored data if there is some, otherwise a web search."""
+    if kind == "industry":
+        return {"source": "database", "rollup": await get_industry_rollup(name)}
+    if kind == "company":
+        records = await query_db(name, limit=1)
+        if isinstance(records, list) and records and normalize_query(records[0]["name"]) == normalize_query(name) \
+                and (_is_fresh(records[0]) or (await watch_freshness([(kind, name)]))[(kind, name)]):
+            return {"source": "database", "company": records[0]}
+    return {"source": "web", "results": await format_web_data(await search_web(name))}
+
+async def synthesize_answer(query: str, context: dict) -> str:
+    """One LLM call answering `query` from its entities' research."""
+    from autogen_core.models import SystemMessage, UserMessage
+    research = json.dumps(context, default=str)[:getattr(config, "CHAT_BATCH_CONTEXT_CHARS", 12000)]
+    with tracing.span("llm.create", kind="client", query=query, context_chars=len(research)) as current:
+        result = await llm_client.create([
+            SystemMessage(content=BATCH_SYSTEM_MESSAGE),
+            UserMessage(content=f"Question: {query}\n\nResearch:\n{research}", source="user"),
+        ])
+        if current is not None and getattr(result, "usage", None) is not None:
+            current.set(prompt_tokens=result.usage.prompt_tokens, completion_tokens=result.usage.completion_tokens)
+    answer = result.content if isinstance(result.content, str) else str(result.content)
+    get_chat_cache().put(query, {"response": answer, "query": query}, variant=get_data_version())
+    return answer
+
+async def answer_from_watchlist(query: str) -> Optional[str]:
+    """
+    Answer straight from stored data when every company/industry the query names is
+    watched and freshly refreshed by the monitor: one LLM call, no web search or agent run.
+    None when that does not hold.
+    """
+    if llm_client is None or not getattr(config, "MONITOR_ENABLED", True):
+        return None
+    entities = extract_entities(query, get_suggest_index())
+    if any(kind == "query" for kind, _ in entities):
+        return None
+    freshness = await watch_freshness(entities)
+    if not all(freshness.values()):
+        return None
+    research = await asyncio.gather(*(research_entity(kind, name) for kind, name in entities))
+    return await synthesize_answer(query, {f"{kind}: {name}": result for (kind, name), result in zip(entities, research)})
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchRequest):
+    """
+    Answer many queries in one call, streamed as NDJSON lines as each answer is ready
+    (`index` is the query's position), followed by a {"summary": ...} line.
+    Companies and industries the queries mention are researched once per batch
+    (database lookup, web search when nothing fresh is stored), then each distinct
+    query gets one LLM call, CHAT_BATCH_CONCURRENCY at a time.
+    """
+    if not request.queries or any(not query.strip() for query in request.queries):
+        raise HTTPException(status_code=400, detail="Queries cannot be empty")
+    max_queries = getattr(config, "CHAT_BATCH_MAX_QUERIES", 500)
+    if len(request.queries) > max_queries:
+        raise HTTPException(status_code=400, detail=f"At most {max_queries} queries per batch")
+    if llm_client is None:
+        raise HTTPException(status_code=503, detail="Agent team not initialized")
+
+    await sync_data_version()
+    batch = ChatBatch(
+        request.queries,
+        get_suggest_index(),
+        research=research_entity,
+        answer=synthesize_answer,
+        cached=lambda query: get_chat_cache().get(query, variant=get_data_version()),
+        concurrency=getattr(config, "CHAT_BATCH_CONCURRENCY", 4),
+    )
+
+    async def ndjson():
+        async for item in batch.run():
+            yield json.dumps(item, default=str) + "\n"
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.get("/watchlist")
+async def get_watchlist():
+    """Watched companies and industries with their refresh state, plus the monitor's counters"""
+    return {"items": await list_watchlist(), "monitor": monitor.stats() if monitor else None}
+
+@app.post("/watchlist")
+async def watch(request: WatchRequest):
+    """Watch a company or industry (every company stored in it); the monitor refreshes it right away"""
+    result = await add_watch(request.kind, request.name.strip(), request.interval)
+    if result["status"] != "success":
+        raise HTTPException(status_code=400, detail=result["message"])
+    if monitor is not None:
+        monitor.wake()
+    return result
+
+@app.delete("/watchlist/{kind}/{name}")
+async def unwatch(kind: str, name: str):
+    result = await remove_watch(kind, name)
+    if result["status"] != "success":
+        raise HTTPException(status_code=404, detail=result["message"])
+    return result
+
+def _filter_values(value) -> List[str]:
+    """A /ws filter field given as a list or a comma-separated string."""
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise ValueError("filter fields must be lists or comma-separated strings")
+    return [str(item).strip() for item in value if str(item).strip()]
+
+@app.websocket("/ws")
+async def change_feed(websocket: WebSocket, companies: str = "", industries: str = "", changes: str = ""):
+    """
+    Push company changes (new news, changed metrics/industry/fields) as this process commits them.
+    Filter with comma-separated `companies`, `industries` and `changes`; send a JSON object with
+    the same keys to replace the filter. A client that falls WS_MAX_LAG events behind is closed
+    with code 1013 and should re-fetch what it shows.
+    """
+    await websocket.accept()
+    hub = get_change_hub()
+    try:
+        subscription = hub.subscribe(_filter_values(companies), _filter_values(industries), _filter_values(changes))
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=1008)
+        return
+    max_lag = getattr(config, "WS_MAX_LAG", 1000)
+    sending = asyncio.Lock()
+
+    async def send(message: dict):
+        async with sending:
+            await websocket.send_json(message)
+
+    async def push():
+        while True:
+            event = await subscription.get()
+            await send(event)
+            if event["type"] == "lagged" and event["dropped"] >= max_lag:
+                await websocket.close(code=1013)
+                return
+
+    await send({"type": "subscribed", "filter": subscription.describe_filter()})
+    pusher = asyncio.create_task(push())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                if not isinstance(message, dict):
+                    raise ValueError("expected a JSON object")
+                subscription.set_filter(*(
+                    _filter_values(message.get(key, [])) for key in ("companies", "industries", "changes")
+                ))
+                await send({"type": "subscribed", "filter": subscription.describe_filter()})
+            except ValueError as e:  # includes malformed JSON
+                await send({"type": "error", "message": str(e)})
+    except (WebSocketDisconnect, RuntimeError):  # RuntimeError: push() closed a lagging client
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+        pusher.cancel()
+        if pusher.done() and not pusher.cancelled() and pusher.exception() is not None:
+            print(f"⚠️ /ws push failed: {pusher.exception()}")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": "2025-09-11"}
\ No newline at end of file
+    return {"status": "healthy", "timestamp": "2025-09-11"}
+
+@app.get("/ready")
+async def readiness_check():
+    """200 once this worker's warm-up finished with every component up; 503 before that and while shutting down."""
+    if warmup["draining"]:
+        status = "draining"
+    elif warmup["ready"]:
+        status = "ready"
+    else:
+        status = "starting" if warmup["seconds"] is None else "failed"
+    body = {"status": status, **warmup}
+    return JSONResponse(body, status_code=200 if warmup["ready"] else 503)
+
+@app.get("/traces")
+async def recent_traces():
+    """The traces this worker kept in memory (TRACE_KEEP), newest first"""
+    tracer = tracing.get_tracer()
+    if tracer is None:
+        raise HTTPException(status_code=404, detail="Tracing is disabled (TRACE_ENABLED)")
+    traces = []
+    for trace_id, spans in reversed(tracer.recent.items()):
+        root = min(spans, key=lambda span: span["start_ns"])
+        traces.append({
+            "trace_id": trace_id,
+            "name": root["name"],
+            "started": datetime.utcfromtimestamp(root["start_ns"] / 1e9).isoformat(),
+            "duration_ms": round((max(span["end_ns"] for span in spans) - root["start_ns"]) / 1e6, 3),
+            "spans": len(spans),
+            "errors": sum(span["status"] == "error" for span in spans),
+        })
+    return {"traces": traces, "tracer": tracer.stats()}
+
+@app.get("/traces/{trace_id}")
+async def trace_detail(trace_id: str):
+    """Every span of one trace, its critical path and per-operation totals"""
+    tracer = tracing.get_tracer()
+    spans = tracer.recent.get(trace_id) if tracer is not None else None
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} is not in memory (see TRACE_FILE)")
+    return {
+        "trace_id": trace_id,
+        "spans": sorted(spans, key=lambda span: span["start_ns"]),
+        "critical_path": tracing.critical_path(spans),
+        "by_name": tracing.summarize(spans),
+    }
+
+@app.get("/debug/loop")
+async def loop_report(blocks: int = 50):
+    """Event-loop lag and the most recent callbacks that blocked the loop, with their stacks"""
+    if loop_monitor is None:
+        raise HTTPException(status_code=404, detail="Loop monitor is disabled (LOOP_MONITOR_ENABLED)")
+    return loop_monitor.stats(blocks=max(0, blocks))
+
+@app.get("/metrics")
+async def metrics():
+    """In-process performance counters"""
+    metrics = {
+        "backend": get_backend_status(),
+        "query_cache": get_query_cache().stats(),
+        "writes": get_write_stats(),
+        "compression": get_data_codec().stats(),
+        "pool": get_pool_stats(),
+    }
+    router = get_replica_router()
+    if router is not None:
+        metrics["replicas"] = router.stats()
+    buffer = get_write_buffer()
+    if buffer is not None:
+        metrics["write_behind"] = buffer.stats()
+    if job_queue is not None:
+        metrics["jobs"] = job_queue.stats()
+    if chat_cache is not None:
+        metrics["chat_cache"] = chat_cache.stats()
+    metrics["suggest"] = get_suggest_index().stats()
+    if monitor is not None:
+        metrics["monitor"] = monitor.stats()
+    metrics["change_feed"] = get_change_hub().stats()
+    if loop_monitor is not None:
+        metrics["event_loop"] = loop_monitor.stats(blocks=0)
+    if profiler is not None:
+        metrics["profiler"] = profiler.stats()
+    if tracing.get_tracer() is not None:
+        metrics["tracing"] = tracing.get_tracer().stats()
+    return metrics
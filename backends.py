@@ -0,0 +1,629 @@
+"""
+Database backends: engine setup and the dialect-specific fast paths of the data layer
+"""
+import asyncio
+import json
+import re
+from datetime import datetime
+
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import Config
+from pool_metrics import MonitoredPool
+from sqlite_writer import SQLiteWriter
+
+_JSON_KEY = re.compile(r"^[A-Za-z0-9_]+$")
+
+# Columns written by upsert_companies, in COPY/staging order
+COMPANY_COLUMNS = ["name", "industry", "data", "data_z", "last_updated", "content_hash", "last_checked"]
+
+
+def json_keys(path: str) -> list:
+    """Split a dotted JSON path, rejecting anything that is not a plain key."""
+    keys = path.split(".")
+    if not all(_JSON_KEY.match(key) for key in keys):
+        raise ValueError(f"Invalid JSON path: {path!r}")
+    return keys
+
+
+def flatten_json(value: dict, prefix: str = "") -> dict:
+    """Flatten nested dicts into {"a.b": leaf} pairs."""
+    flat = {}
+    for key, item in value.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(item, dict):
+            flat.update(flatten_json(item, path))
+        else:
+            flat[path] = item
+    return flat
+
+
+class Backend:
+    """
+    One database the data layer can run on.
+
+    Owns the engine and session maker for `url` and the schema/search-index
+    state of that database. database.py calls the hooks below instead of
+    branching on the dialect. This base class implements most of them portably
+    (row by row, LIKE scans) and subclasses override them with their fast
+    paths; the JSON hooks have no portable SQL, so every subclass implements
+    them and create_backend only accepts dialects in BACKENDS.
+    """
+
+    name = "generic"
+
+    def __init__(self, url: str, connect_timeout: float = None):
+        self.url = url
+        self.connect_timeout = connect_timeout  # seconds to give up connecting (None: driver default)
+        self.engine = None
+        self._session_maker = None
+        self.schema_ready = False
+        self.search_ready = None  # None = not checked yet
+        self.trigram = False  # ranked_search also matches names by trigram similarity (pg_trgm)
+
+    # ---------- Engine ----------
+
+    def create_engine(self):
+        return create_async_engine(self.url, echo=False, future=True)
+
+    def get_engine(self):
+        if self.engine is None:
+            self.engine = self.create_engine()
+        return self.engine
+
+    def get_session_maker(self):
+        if self._session_maker is None:
+            self._session_maker = async_sessionmaker(self.get_engine(), expire_on_commit=False, class_=AsyncSession)
+        return self._session_maker
+
+    def get_write_session_maker(self):
+        """Session maker run_write uses; the regular one unless writes have their own engine."""
+        return self.get_session_maker()
+
+    async def run_write(self, job):
+        """Run `job(session)` in its own transaction and commit it; returns the job's result."""
+        async with self.get_write_session_maker()() as session:
+            try:
+                result = await job(session)
+                await session.commit()
+                return result
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def probe(self, timeout: float) -> bool:
+        """SELECT 1 bounded by `timeout` seconds."""
+        try:
+            async def ping():
+                async with self.get_engine().connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            await asyncio.wait_for(ping(), timeout=timeout)
+            return True
+        except Exception as e:
+            print(f"⚠️ {self.name} probe failed: {e!r}")
+            return False
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+        self.engine = None
+        self._session_maker = None
+        self.schema_ready = False
+        self.search_ready = None
+
+    # ---------- Storage / JSON ----------
+
+    async def prepare_storage(self, conn):
+        """Backend-specific column types and JSON indexes, run once at init_db."""
+
+    def json_text(self, path: str) -> str:
+        """SQL expression for the text value at `path` inside companies.data."""
+        raise NotImplementedError(f"JSON paths are not supported on {self.name}")
+
+    def json_filters(self, contains: dict, has: list, where: dict,
+                     updated_since: datetime, news_since: datetime) -> list:
+        """Translate filter_companies arguments into SQL conditions."""
+        raise NotImplementedError(f"JSON filters are not supported on {self.name}")
+
+    def data_column(self) -> str:
+        """companies.data as selected by searches (JSON text or a driver-decoded value)."""
+        return "companies.data"
+
+    def project_field(self, key: str) -> str:
+        """Select the top-level `key` of companies.data as JSON text named f_<key>."""
+        raise NotImplementedError(f"Field projection is not supported on {self.name}")
+
+    # ---------- Search ----------
+
+    async def install_search_index(self, conn) -> bool:
+        """Create the full-text index; False means searches use LIKE scans."""
+        return False
+
+    def ranked_search(self, query: str, indexed: bool):
+        """
+        FROM/WHERE clause, rank expression, rank direction and parameters for a search.
+
+        The portable version is a case-insensitive substring scan on name and
+        industry ranked by name only.
+        """
+        return (
+            "FROM companies WHERE lower(name) LIKE lower(:pattern) OR lower(industry) LIKE lower(:pattern)",
+            "0",
+            "ASC",
+            {"pattern": f"%{query}%"},
+        )
+
+    # ---------- Writes ----------
+
+    async def lock_companies(self, session: AsyncSession, names: list):
+        """
+        Hold off other writers of the companies `names` (stored or not) until the
+        transaction ends, so the row read before a write is the one it replaces.
+        """
+
+    async def upsert_companies(self, session: AsyncSession, model, rows: list):
+        """Insert or update companies by name, one row at a time."""
+        for row in rows:
+            result = await session.execute(select(model).filter_by(name=row["name"]))
+            company = result.scalar_one_or_none()
+            if company:
+                for column, value in row.items():
+                    setattr(company, column, value)
+            else:
+                session.add(model(**row))
+
+    async def insert_missing(self, session: AsyncSession, model, rows: list, key: str):
+        """Insert the rows whose `key` is not stored yet, leaving existing rows alone."""
+        column = getattr(model, key)
+        stored = set((await session.execute(select(column).filter(column.in_([row[key] for row in rows])))).scalars())
+        for row in rows:
+            if row[key] not in stored:
+                session.add(model(**row))
+        await session.flush()
+
+
+# ---------- PostgreSQL ----------
+
+# Hot JSON keys that get their own expression index on PostgreSQL
+INDEXED_JSON_PATHS = ["key_metrics.revenue", "data_quality.last_updated"]
+
+# Weighted document searched by query_db on PostgreSQL: name > industry > summary/news.
+PG_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(industry, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(data->>'summary', '') || ' ' || "
+    "coalesce((data->'recent_news')::text, '')), 'C')"
+)
+
+PG_SEARCH_DDL = [
+    f"CREATE INDEX IF NOT EXISTS idx_companies_search_tsv ON companies USING GIN (({PG_SEARCH_DOCUMENT}))",
+]
+
+# Fuzzy name/industry matching; optional, since pg_trgm may not be installable on the server
+PG_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_companies_name_trgm ON companies USING GIN (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_companies_industry_trgm ON companies USING GIN (industry gin_trgm_ops)",
+]
+
+
+class PostgresBackend(Backend):
+    """asyncpg with a monitored pool, JSONB operators, tsvector/trigram search and COPY upserts."""
+
+    name = "postgresql"
+
+    def create_engine(self):
+        """Async engine with the pool and statement cache configured from Config."""
+        config = Config()
+        # asyncpg prepares each distinct statement once per connection and reuses it
+        # from this LRU; query_db binds its search terms, so its SQL text is stable.
+        # Set to 0 behind pgbouncer in transaction mode.
+        statement_cache = getattr(config, "DB_PREPARED_STATEMENT_CACHE_SIZE", 500)
+        separator = "&" if "?" in self.url else "?"
+        pool_timeout = getattr(config, "DB_POOL_TIMEOUT", 30)
+        connect_args = {}
+        if self.connect_timeout is not None:
+            # Fail fast: asyncpg gives up on unreachable hosts after this many seconds
+            pool_timeout = self.connect_timeout
+            connect_args["timeout"] = self.connect_timeout
+        engine = create_async_engine(
+            f"{self.url}{separator}prepared_statement_cache_size={statement_cache}",
+            echo=False,
+            poolclass=MonitoredPool,
+            pool_size=getattr(config, "DB_POOL_SIZE", 10),
+            max_overflow=getattr(config, "DB_MAX_OVERFLOW", 20),
+            pool_timeout=pool_timeout,
+            pool_recycle=getattr(config, "DB_POOL_RECYCLE", 1800),
+            pool_pre_ping=getattr(config, "DB_POOL_PRE_PING", True),
+            connect_args=connect_args,
+            future=True,
+        )
+        engine.pool.metrics.warn_after = getattr(config, "DB_POOL_WAIT_WARN_MS", 100) / 1000
+        return engine
+
+    async def prepare_storage(self, conn):
+        """
+        Migrate companies.data to JSONB and create its indexes: a jsonb_path_ops
+        GIN index for @> / @? and expression indexes on INDEXED_JSON_PATHS.
+        """
+        data_type = await conn.scalar(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'companies' AND column_name = 'data'"
+        ))
+        if data_type == "json":
+            print("🔄 Migrating companies.data from JSON to JSONB...")
+            await conn.execute(text(
+                "ALTER TABLE companies ALTER COLUMN data TYPE jsonb USING data::jsonb"
+            ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_companies_data_gin "
+            "ON companies USING GIN (data jsonb_path_ops)"
+        ))
+        for path in INDEXED_JSON_PATHS:
+            index_name = "idx_companies_data_" + "_".join(json_keys(path))
+            await conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON companies ({self.json_text(path)})"
+            ))
+
+    def json_text(self, path: str) -> str:
+        return f"(data #>> '{{{','.join(json_keys(path))}}}')"
+
+    def json_filters(self, contains, has, where, updated_since, news_since) -> list:
+        conditions = []
+        if contains:
+            conditions.append(text("data @> CAST(:contains AS jsonb)").bindparams(contains=json.dumps(contains)))
+
+        for path in has or []:
+            jsonpath = "$." + ".".join(f'"{key}"' for key in json_keys(path))
+            conditions.append(text(f"data @? '{jsonpath}'"))
+
+        for i, (path, value) in enumerate((where or {}).items()):
+            if isinstance(value, (dict, list)):
+                raise ValueError(f"Only scalar values can be matched at {path!r}")
+            value = json.dumps(value) if not isinstance(value, str) else value
+            param = f"where_{i}"
+            conditions.append(text(f"{self.json_text(path)} = :{param}").bindparams(**{param: value}))
+
+        if updated_since:
+            conditions.append(
+                text(f"{self.json_text('data_quality.last_updated')} >= :updated_since")
+                .bindparams(updated_since=updated_since.isoformat())
+            )
+
+        if news_since:
+            since = news_since.isoformat()
+            conditions.append(text(f"data @? '$.recent_news[*] ? (@.extracted_at >= \"{since}\")'"))
+        return conditions
+
+    def data_column(self) -> str:
+        return "companies.data::text AS data"
+
+    def project_field(self, key: str) -> str:
+        return f"(companies.data -> '{key}')::text AS f_{key}"
+
+    async def dispose(self):
+        await super().dispose()
+        self.trigram = False
+
+    async def install_search_index(self, conn) -> bool:
+        """
+        A GIN tsvector expression index, plus pg_trgm GIN indexes on
+        name/industry when the extension can be installed.
+        """
+        for ddl in PG_SEARCH_DDL:
+            await conn.execute(text(ddl))
+        try:
+            # Own savepoint: a missing extension must not roll back the tsvector index
+            async with conn.begin_nested():
+                for ddl in PG_TRIGRAM_DDL:
+                    await conn.execute(text(ddl))
+            self.trigram = True
+        except Exception as e:
+            print(f"⚠️ pg_trgm unavailable, searching without fuzzy name matching: {e}")
+            self.trigram = False
+        return True
+
+    def ranked_search(self, query: str, indexed: bool):
+        if not indexed:
+            return super().ranked_search(query, indexed)
+        where = f"WHERE ({PG_SEARCH_DOCUMENT}) @@ q OR name ILIKE :pattern OR industry ILIKE :pattern"
+        rank = f"ts_rank(({PG_SEARCH_DOCUMENT}), q)"
+        if self.trigram:
+            where += " OR name % :term"
+            rank += " + greatest(similarity(name, :term), similarity(coalesce(industry, ''), :term))"
+        return (
+            f"FROM companies, websearch_to_tsquery('english', :term) AS q {where}",
+            rank,
+            "DESC",
+            {"term": query, "pattern": f"%{query}%"},
+        )
+
+    async def upsert_companies(self, session, model, rows):
+        """COPY rows into a temp staging table, then merge them into companies."""
+        conn = await session.connection()
+        await conn.execute(text(
+            "CREATE TEMP TABLE IF NOT EXISTS companies_staging "
+            "(name varchar(255), industry varchar(100), data text, data_z bytea, last_updated timestamp, "
+            "content_hash varchar(64), last_checked timestamp) "
+            "ON COMMIT DELETE ROWS"
+        ))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "companies_staging",
+            records=[
+                tuple(json.dumps(r["data"]) if column == "data" else r[column] for column in COMPANY_COLUMNS)
+                for r in rows
+            ],
+            columns=COMPANY_COLUMNS,
+        )
+        await conn.execute(text(
+            "INSERT INTO companies (name, industry, data, data_z, last_updated, content_hash, last_checked) "
+            "SELECT name, industry, data::jsonb, data_z, last_updated, content_hash, last_checked FROM companies_staging "
+            "ON CONFLICT (name) DO UPDATE SET "
+            "industry = EXCLUDED.industry, data = EXCLUDED.data, data_z = EXCLUDED.data_z, "
+            "last_updated = EXCLUDED.last_updated, "
+            "content_hash = EXCLUDED.content_hash, last_checked = EXCLUDED.last_checked"
+        ))
+
+    async def insert_missing(self, session, model, rows, key):
+        await session.execute(pg_insert(model).values(rows).on_conflict_do_nothing(index_elements=[key]))
+
+    async def lock_companies(self, session, names):
+        """Transaction-scoped advisory lock per name (covers companies not inserted yet), in hash order."""
+        await session.execute(
+            text(
+                "SELECT count(pg_advisory_xact_lock(key)) FROM "
+                "(SELECT DISTINCT hashtext(name) AS key FROM unnest(CAST(:names AS text[])) AS name "
+                "ORDER BY key) AS keys"
+            ).bindparams(names=list(names))
+        )
+
+
+# ---------- SQLite ----------
+
+# Applied to every connection in the production profile; override via Config.SQLITE_PRAGMAS
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative = KiB, i.e. 64 MB
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+
+
+def _sqlite_search_content(alias: str) -> str:
+    """SQL expression extracting the searchable text (summary + news) of a companies row."""
+    return (
+        f"CASE WHEN json_valid({alias}.data) THEN "
+        f"coalesce(json_extract({alias}.data, '$.summary'), '') || ' ' || coalesce(("
+        f"SELECT group_concat(coalesce(json_extract(value, '$.headline'), '') || ' ' || "
+        f"coalesce(json_extract(value, '$.summary'), ''), ' ') "
+        f"FROM json_each({alias}.data, '$.recent_news') WHERE type = 'object'), '') "
+        f"ELSE '' END"
+    )
+
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS companies_fts USING fts5("
+    "name, industry, content, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS companies_fts_ai AFTER INSERT ON companies BEGIN "
+    "INSERT INTO companies_fts(rowid, name, industry, content) "
+    f"VALUES (new.id, new.name, new.industry, {_sqlite_search_content('new')}); END",
+    "CREATE TRIGGER IF NOT EXISTS companies_fts_ad AFTER DELETE ON companies BEGIN "
+    "DELETE FROM companies_fts WHERE rowid = old.id; END",
+    # Only content changes reindex: an unchanged write just touches last_checked
+    "CREATE TRIGGER IF NOT EXISTS companies_fts_au AFTER UPDATE OF name, industry, data ON companies BEGIN "
+    "DELETE FROM companies_fts WHERE rowid = old.id; "
+    "INSERT INTO companies_fts(rowid, name, industry, content) "
+    f"VALUES (new.id, new.name, new.industry, {_sqlite_search_content('new')}); END",
+]
+
+
+def _fts5_match(query: str) -> str:
+    """Build an FTS5 MATCH expression: every word must match as a prefix."""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", query))
+
+
+def _control_begin(engine, begin_immediate=False):
+    """Have SQLAlchemy emit BEGIN itself; with `begin_immediate` every transaction takes the write lock up front."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        # pysqlite's implicit transactions break savepoints and start deferred
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if begin_immediate else "BEGIN")
+
+
+def _apply_pragmas(engine, begin_immediate=False):
+    """Set the production pragmas on every new connection; optionally take the write lock on BEGIN."""
+    pragmas = {**SQLITE_PRAGMAS, **getattr(Config(), "SQLITE_PRAGMAS", {})}
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    _control_begin(engine, begin_immediate)
+
+
+class SQLiteBackend(Backend):
+    """
+    aiosqlite with JSON1 filters, an FTS5 search table and multi-row upserts.
+
+    Writes run in BEGIN IMMEDIATE transactions on their own engine, so a write
+    holds the database lock from its first read. With Config.SQLITE_PRODUCTION,
+    connections also get SQLITE_PRAGMAS (WAL etc.), reads share a small pool
+    and every write goes through one SQLiteWriter that group-commits on a
+    single dedicated connection.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, url: str, connect_timeout: float = None):
+        super().__init__(url, connect_timeout)
+        self.write_engine = None
+        self._write_session_maker = None
+        self.writer = None
+
+    @staticmethod
+    def production_mode() -> bool:
+        return bool(getattr(Config(), "SQLITE_PRODUCTION", False))
+
+    def create_engine(self):
+        if not self.production_mode():
+            return create_async_engine(self.url, echo=False, future=True)
+        print("Using SQLite production profile: WAL, read pool, single writer")
+        engine = create_async_engine(
+            self.url,
+            echo=False,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=getattr(Config(), "SQLITE_READ_POOL_SIZE", 8),
+            max_overflow=0,
+        )
+        _apply_pragmas(engine)
+        return engine
+
+    def get_write_engine(self):
+        """Engine for run_write: BEGIN IMMEDIATE connections; one dedicated connection in production."""
+        if self.write_engine is None and not self.production_mode():
+            self.write_engine = create_async_engine(self.url, echo=False, future=True)
+            _control_begin(self.write_engine, begin_immediate=True)
+        if self.write_engine is None:
+            self.write_engine = create_async_engine(
+                self.url,
+                echo=False,
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=1,
+                max_overflow=0,
+            )
+            _apply_pragmas(self.write_engine, begin_immediate=True)
+        return self.write_engine
+
+    def get_write_session_maker(self):
+        if self._write_session_maker is None:
+            self._write_session_maker = async_sessionmaker(
+                self.get_write_engine(), class_=AsyncSession, expire_on_commit=False
+            )
+        return self._write_session_maker
+
+    def get_writer(self) -> SQLiteWriter:
+        if self.writer is None:
+            self.writer = SQLiteWriter(self.get_write_session_maker(),
+                                       max_batch=getattr(Config(), "SQLITE_WRITE_BATCH", 64))
+        return self.writer
+
+    async def run_write(self, job):
+        if not self.production_mode():
+            return await super().run_write(job)
+        return await self.get_writer().submit(job)
+
+    async def dispose(self):
+        if self.writer is not None:
+            await self.writer.stop()
+            self.writer = None
+        if self.write_engine is not None:
+            await self.write_engine.dispose()
+            self.write_engine = None
+        self._write_session_maker = None
+        await super().dispose()
+
+    def json_text(self, path: str) -> str:
+        return f"json_extract(data, '$.{'.'.join(json_keys(path))}')"
+
+    def json_filters(self, contains, has, where, updated_since, news_since) -> list:
+        conditions = []
+        if contains:
+            where = {**flatten_json(contains), **(where or {})}
+
+        for path in has or []:
+            conditions.append(text(f"json_type(data, '$.{'.'.join(json_keys(path))}') IS NOT NULL"))
+
+        for i, (path, value) in enumerate((where or {}).items()):
+            if isinstance(value, (dict, list)):
+                raise ValueError(f"Only scalar values can be matched at {path!r}")
+            param = f"where_{i}"
+            conditions.append(text(f"{self.json_text(path)} = :{param}").bindparams(**{param: value}))
+
+        if updated_since:
+            conditions.append(
+                text(f"{self.json_text('data_quality.last_updated')} >= :updated_since")
+                .bindparams(updated_since=updated_since.isoformat())
+            )
+
+        if news_since:
+            conditions.append(text(
+                "EXISTS (SELECT 1 FROM json_each(companies.data, '$.recent_news') "
+                "WHERE type = 'object' AND json_extract(value, '$.extracted_at') >= :news_since)"
+            ).bindparams(news_since=news_since.isoformat()))
+        return conditions
+
+    def project_field(self, key: str) -> str:
+        return f"json_quote(json_extract(companies.data, '$.{key}')) AS f_{key}"
+
+    async def install_search_index(self, conn) -> bool:
+        """FTS5 table kept in sync by triggers, backfilled on first install."""
+        exists = await conn.scalar(text(
+            "SELECT count(*) FROM sqlite_master WHERE name = 'companies_fts'"
+        ))
+        trigger = await conn.scalar(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'companies_fts_au'"
+        ))
+        if trigger and "UPDATE OF" not in trigger:
+            # Older databases reindex on every UPDATE; replaced only then, so concurrent workers never race
+            await conn.execute(text("DROP TRIGGER IF EXISTS companies_fts_au"))
+        for ddl in SQLITE_SEARCH_DDL:
+            await conn.execute(text(ddl))
+        if not exists:
+            # Backfill rows written before the index existed
+            await conn.execute(text(
+                "INSERT INTO companies_fts(rowid, name, industry, content) "
+                f"SELECT c.id, c.name, c.industry, {_sqlite_search_content('c')} FROM companies c"
+            ))
+        return True
+
+    def ranked_search(self, query: str, indexed: bool):
+        if not (indexed and _fts5_match(query)):
+            return super().ranked_search(query, indexed)
+        return (
+            "FROM companies_fts JOIN companies ON companies.id = companies_fts.rowid "
+            "WHERE companies_fts MATCH :match",
+            "bm25(companies_fts, 10.0, 5.0, 1.0)",
+            "ASC",
+            {"match": _fts5_match(query)},
+        )
+
+    async def upsert_companies(self, session, model, rows):
+        """Multi-row INSERT ... ON CONFLICT(name) DO UPDATE in a single statement."""
+        stmt = sqlite_insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.name],
+            set_={column: stmt.excluded[column] for column in COMPANY_COLUMNS if column != "name"},
+        )
+        await session.execute(stmt)
+
+    async def insert_missing(self, session, model, rows, key):
+        await session.execute(sqlite_insert(model).values(rows).on_conflict_do_nothing(index_elements=[key]))
+
+
+BACKENDS = {
+    PostgresBackend.name: PostgresBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def create_backend(url: str, connect_timeout: float = None) -> Backend:
+    """Backend for a SQLAlchemy URL, chosen by its dialect; ValueError for dialects without one."""
+    dialect = url.split(":", 1)[0].split("+", 1)[0]
+    if dialect not in BACKENDS:
+        raise ValueError(f"Unsupported database dialect: {dialect!r} (supported: {', '.join(BACKENDS)})")
+    return BACKENDS[dialect](url, connect_timeout)
@@ -0,0 +1,169 @@
+"""
+Batched agent queries: research each distinct entity once, then answer every query from the shared results
+"""
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cache import normalize_query
+from typeahead import PrefixIndex
+
+# Longest company/industry name (in words) matched against the typeahead index
+MAX_ENTITY_WORDS = 6
+
+# Capitalized words that start a question rather than name a company
+LEADING_STOPWORDS = {
+    "a", "about", "an", "and", "are", "compare", "could", "did", "do", "does", "for", "give", "how", "i",
+    "in", "is", "list", "me", "of", "or", "please", "show", "summarize", "tell", "the", "vs", "versus",
+    "was", "what", "what's", "when", "where", "which", "who", "why", "will",
+}
+
+_PUNCTUATION = ",;:!?\"()[]{}"
+_CAPITALIZED_RUN = re.compile(r"\b[A-Z][\w&.'-]*(?:\s+(?:&\s+)?[A-Z0-9][\w&.'-]*)*")
+
+
+def _tokens(text: str) -> List[str]:
+    tokens = [token.strip(_PUNCTUATION) for token in text.split()]
+    tokens = [token[:-2] if token.lower().endswith("'s") else token for token in tokens]
+    if tokens and tokens[-1].endswith("."):
+        tokens[-1] = tokens[-1].rstrip(".")  # end of sentence
+    return [token for token in tokens if token]
+
+
+def extract_entities(query: str, index: PrefixIndex) -> List[tuple]:
+    """
+    (kind, name) pairs a query is about, without calling the LLM.
+
+    Known companies (by name or alias) and industries are matched against the
+    typeahead index, longest phrase first. Runs of capitalized words that
+    match nothing are kept as ("company", text) so they get searched. A query
+    naming nothing is its own ("query", text) entity.
+    """
+    words = _tokens(query)
+    entities = []
+    known = []  # matched phrases and names, so capitalized runs don't repeat them
+    position = 0
+    while position < len(words):
+        for length in range(min(MAX_ENTITY_WORDS, len(words) - position), 0, -1):
+            phrase = " ".join(words[position:position + length])
+            found = index.lookup(phrase)
+            if found:
+                entities += [term for term in found if term not in entities]
+                known += [normalize_query(phrase)] + [normalize_query(name) for _, name in found]
+                position += length
+                break
+        else:
+            position += 1
+
+    for run in _CAPITALIZED_RUN.findall(query):
+        run_words = _tokens(run)
+        while run_words and run_words[0].lower() in LEADING_STOPWORDS:
+            run_words.pop(0)
+        if not run_words:
+            continue
+        text = " ".join(run_words)
+        key = normalize_query(text)
+        if any(key in name or name in key for name in known):
+            continue
+        known.append(key)
+        entities.append(("company", text))
+    return entities or [("query", query.strip())]
+
+
+class ChatBatch:
+    """
+    Answers many queries while researching each distinct entity only once.
+
+    `research(kind, name)` gathers what is known about one entity (a database
+    lookup, a web search when the database has nothing fresh) and is called
+    once per distinct entity across the whole batch. `answer(query, context)`
+    then writes each distinct query's answer from the research results of its
+    entities. `concurrency` bounds how many research calls and how many
+    answers run at once. Identical queries (after normalization) are answered
+    once; `cached(query)` may return an earlier answer to skip both steps.
+    """
+
+    def __init__(self, queries: List[str], index: PrefixIndex,
+                 research: Callable[[str, str], Awaitable[dict]],
+                 answer: Callable[[str, Dict[str, dict]], Awaitable[str]],
+                 cached: Optional[Callable[[str], Optional[dict]]] = None,
+                 concurrency: int = 4):
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.queries = queries
+        self._index = index
+        self._research = research
+        self._answer = answer
+        self._cached = cached
+        self._research_slots = asyncio.Semaphore(concurrency)
+        self._answer_slots = asyncio.Semaphore(concurrency)
+        self._entities: Dict[tuple, asyncio.Task] = {}
+        self.stats = {
+            "queries": len(queries),
+            "distinct_queries": 0,
+            "entities": 0,
+            "researched": 0,
+            "research_errors": 0,
+            "answered": 0,
+            "cache_hits": 0,
+        }
+
+    def _research_once(self, entity: tuple) -> asyncio.Task:
+        """The shared research task for `entity`, started by the first query that needs it."""
+        if entity not in self._entities:
+            self._entities[entity] = asyncio.create_task(self._run_research(*entity))
+            self.stats["entities"] += 1
+        return self._entities[entity]
+
+    async def _run_research(self, kind: str, name: str) -> dict:
+        async with self._research_slots:
+            self.stats["researched"] += 1
+            try:
+                return await self._research(kind, name)
+            except Exception as e:
+                self.stats["research_errors"] += 1
+                return {"status": "error", "message": str(e)}
+
+    async def _run_query(self, query: str) -> dict:
+        cached = self._cached(query) if self._cached else None
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return {"query": query, "response": cached["response"], "entities": [], "cached": True}
+        entities = extract_entities(query, self._index)
+        results = await asyncio.gather(*(self._research_once(entity) for entity in entities))
+        context = {f"{kind}: {name}": result for (kind, name), result in zip(entities, results)}
+        async with self._answer_slots:
+            response = await self._answer(query, context)
+        self.stats["answered"] += 1
+        return {
+            "query": query,
+            "response": response,
+            "entities": [{"kind": kind, "name": name} for kind, name in entities],
+            "cached": False,
+        }
+
+    async def run(self):
+        """Yield {"index", "query", "response", ...} per submitted query as answers complete, then a summary line."""
+        by_key: Dict[str, List[int]] = {}
+        for position, query in enumerate(self.queries):
+            by_key.setdefault(normalize_query(query), []).append(position)
+        self.stats["distinct_queries"] = len(by_key)
+
+        async def run_one(positions: List[int]):
+            try:
+                result = await self._run_query(self.queries[positions[0]].strip())
+            except Exception as e:
+                result = {"query": self.queries[positions[0]], "status": "error", "message": str(e)}
+            return positions, result
+
+        tasks = [asyncio.create_task(run_one(positions)) for positions in by_key.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                positions, result = await finished
+                for position in positions:
+                    yield {"index": position, **result, "query": self.queries[position]}
+        finally:
+            # The client went away (or we are done): stop work nobody will read
+            for task in tasks + list(self._entities.values()):
+                task.cancel()
+        yield {"summary": self.stats}
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the Fleet data layer
+
+Usage:
+  python3 benchmark.py store --rows 2000 --batch-size 500
+  python3 benchmark.py compression --rows 1000 --news 10
+  python3 benchmark.py importtime --modules app,agents --runs 5 --history importtime.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_records(count: int, prefix: str = "Bench Company", news: int = 1) -> list:
+    """Build synthetic company records shaped like format_web_data output, with `news` items each."""
+    records = []
+    for i in range(count):
+        data = {
+            "company_info": {"name": f"{prefix} {i}", "industry": "Technology"},
+            "key_metrics": {"revenue": f"${i} million", "employees": str(i * 10)},
+            "recent_news": [{"headline": f"Headline {i}", "summary": "Lorem ipsum " * 10}],
+            "summary": f"{prefix} {i} operates in the Technology sector.",
+        }
+        if news > 1:
+            data["recent_news"] = [
+                {
+                    "headline": f"{prefix} {i} announces update {n}",
+                    "summary": f"{prefix} {i} reported quarter {n} results with revenue of ${i + n} million. " * 3,
+                    "url": f"https://news.example.com/{i}/{n}",
+                    "extracted_at": f"2025-09-{n % 28 + 1:02d}T12:00:00",
+                }
+                for n in range(news)
+            ]
+            data["data_quality"] = {
+                "completeness": 0.8,
+                "sources": [
+                    {"url": f"https://news.example.com/{i}/{n}", "title": f"Update {n}", "scraped_at": "2025-09-11T12:00:00"}
+                    for n in range(news)
+                ],
+            }
+        records.append({
+            "company_name": f"{prefix} {i}",
+            "industry": ("Technology", "Energy", "Finance", "Healthcare")[i % 4],
+            "data": data,
+        })
+    return records
+
+
+async def delete_bench_rows(pattern: str):
+    """Remove the companies a benchmark wrote (names LIKE `pattern`) with their snapshots, then rebuild rollups."""
+    import database
+    from database import Company, CompanySnapshot, rebuild_industry_rollups
+    from sqlalchemy import select, delete
+
+    async def purge(session):
+        ids = select(Company.id).filter(Company.name.like(pattern))
+        await session.execute(delete(CompanySnapshot).where(CompanySnapshot.company_id.in_(ids)))
+        await session.execute(delete(Company).where(Company.id.in_(ids)))
+        return await database._bump_data_version(session)
+
+    database._note_write(await database._run_write(purge))
+    await rebuild_industry_rollups()
+
+
+async def bench_store(rows: int, batch_size: int):
+    """Compare per-row store_data against store_many on the configured database; its rows are removed afterwards."""
+    from database import init_db, store_data, store_many, close_db
+
+    run = int(time.time())  # fresh names, so no write is skipped as unchanged
+    await init_db()
+    try:
+        records = make_records(rows, prefix=f"Bench Row {run}")
+        start = time.perf_counter()
+        for record in records:
+            await store_data(record["company_name"], record["industry"], record["data"])
+        per_row = time.perf_counter() - start
+
+        records = make_records(rows, prefix=f"Bench Bulk {run}")
+        start = time.perf_counter()
+        result = await store_many(records, batch_size=batch_size)
+        bulk = time.perf_counter() - start
+
+        print(f"rows:        {rows}")
+        print(f"store_data:  {per_row:.3f}s ({rows / per_row:.0f} rows/s)")
+        print(f"store_many:  {bulk:.3f}s ({rows / bulk:.0f} rows/s, batch_size={batch_size})")
+        print(f"speedup:     {per_row / bulk:.1f}x")
+        if result["errors"]:
+            print(f"store_many errors: {result['errors']}")
+    finally:
+        try:
+            await delete_bench_rows(f"Bench % {run} %")
+        finally:
+            await close_db()
+
+
+async def bench_compression(rows: int, news: int, threshold: int):
+    """Stored size and store/read latency of Company.data: plain vs zstd vs zstd with a trained dictionary."""
+    import database
+    from codec import DataCodec, train_dictionary
+    from database import init_db, store_many, stream_query, close_db, Company
+    from sqlalchemy import select
+
+    samples = make_records(max(rows // 2, 10), prefix="Bench Sample", news=news)
+    dictionary = train_dictionary([r["data"] for r in samples], 16 * 1024)
+    modes = [
+        ("Plain", DataCodec(enabled=False)),
+        ("Zstd", DataCodec(enabled=True, threshold=threshold)),
+        ("Zdict", DataCodec(enabled=True, threshold=threshold, dictionary=dictionary)),
+    ]
+    run = int(time.time())  # fresh names, so no write is skipped as unchanged
+
+    await init_db()
+    try:
+        print(f"rows: {rows}, news items per company: {news}, threshold: {threshold} bytes")
+        for label, codec in modes:
+            database._data_codec = codec
+            prefix = f"Bench {label} {run}"
+            batch = make_records(rows, prefix=prefix, news=news)
+
+            start = time.perf_counter()
+            await store_many(batch)
+            write = time.perf_counter() - start
+
+            start = time.perf_counter()
+            read = [row async for row in stream_query(prefix)]
+            read_time = time.perf_counter() - start
+            assert len(read) == rows and all(r["data"]["recent_news"][0].get("summary") for r in read)
+
+            async with database.get_session_maker()() as session:
+                stored = (await session.execute(
+                    select(Company.data, Company.data_z).filter(Company.name.like(f"{prefix} %"))
+                )).all()
+            size = sum(len(json.dumps(data)) + len(data_z or b"") for data, data_z in stored)
+            print(f"{label:6} stored {size / 1024:9.1f} KiB  "
+                  f"store_many {write * 1000:8.1f} ms  read {read_time * 1000:8.1f} ms")
+    finally:
+        try:
+            # Rows written with the throwaway dictionary would be unreadable later
+            await delete_bench_rows(f"Bench % {run} %")
+        finally:
+            database._data_codec = None
+            await close_db()
+
+
+def profile_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter under -X importtime; wall time plus per-module cumulative/self microseconds."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=here, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"import {module} failed: {errors[-1] if errors else result.returncode}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            modules.append({
+                "name": match[4],
+                "self_us": int(match[1]),
+                "cumulative_us": int(match[2]),
+                "depth": (len(match[3]) - 1) // 2,
+            })
+    return {"wall": wall, "modules": modules}
+
+
+def bench_importtime(modules: list, runs: int, top: int, history: str = None):
+    """Cold-start cost of importing each module: median wall time and import time, and its heaviest dependencies."""
+    report = {"timestamp": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0], "modules": {}}
+    for module in modules:
+        profiles = [profile_import(module) for _ in range(runs)]
+        # -X importtime lists a module after everything it imported; take its entry and its direct imports
+        trees = []
+        for profile in profiles:
+            entries = profile["modules"]
+            position = max(i for i, m in enumerate(entries) if m["name"] == module and m["depth"] == 0)
+            children = []
+            while position > 0 and entries[position - 1]["depth"] > 0:
+                position -= 1
+                if entries[position]["depth"] == 1:
+                    children.append(entries[position])
+            own = next(m for m in entries if m["name"] == module and m["depth"] == 0)
+            trees.append((profile["wall"], own["cumulative_us"], children))
+        median = sorted(trees, key=lambda tree: tree[1])[len(trees) // 2]
+        heaviest = sorted(median[2], key=lambda m: -m["cumulative_us"])[:top]
+        report["modules"][module] = {
+            "wall_ms": round(statistics.median(tree[0] for tree in trees) * 1000, 1),
+            "import_ms": round(statistics.median(tree[1] for tree in trees) / 1000, 1),
+            "heaviest": {m["name"]: round(m["cumulative_us"] / 1000, 1) for m in heaviest},
+        }
+        result = report["modules"][module]
+        print(f"{module:10} wall {result['wall_ms']:8.1f} ms  imports {result['import_ms']:8.1f} ms  (median of {runs})")
+        for name, ms in result["heaviest"].items():
+            print(f"    {name:40} {ms:8.1f} ms")
+    if history:
+        with open(history, "a") as f:
+            f.write(json.dumps(report) + "\n")
+        print(f"Appended to {history}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet data layer benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    store = sub.add_parser("store", help="per-row store_data vs bulk store_many")
+    store.add_argument("--rows", type=int, default=2000)
+    store.add_argument("--batch-size", type=int, default=500)
+
+    compression = sub.add_parser("compression", help="Company.data size and latency with the zstd codec")
+    compression.add_argument("--rows", type=int, default=1000)
+    compression.add_argument("--news", type=int, default=10)
+    compression.add_argument("--threshold", type=int, default=1024)
+
+    importtime = sub.add_parser("importtime", help="cold-start import cost (-X importtime) per module")
+    importtime.add_argument("--modules", default="app,agents,database,tools",
+                            help="comma-separated modules to import")
+    importtime.add_argument("--runs", type=int, default=5)
+    importtime.add_argument("--top", type=int, default=8, help="heaviest dependencies to list per module")
+    importtime.add_argument("--history", help="append the results as one JSON line to this file")
+
+    args = parser.parse_args()
+    if args.command == "store":
+        asyncio.run(bench_store(args.rows, args.batch_size))
+    elif args.command == "compression":
+        asyncio.run(bench_compression(args.rows, args.news, args.threshold))
+    elif args.command == "importtime":
+        bench_importtime([m.strip() for m in args.modules.split(",") if m.strip()], args.runs, args.top, args.history)
+
+
+if __name__ == "__main__":
+    main()
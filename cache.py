@@ -0,0 +1,190 @@
+"""
+In-process read-through cache for company lookups
+"""
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+# pg_trgm's default similarity_threshold, used by `name % term` in PostgreSQL searches
+TRIGRAM_THRESHOLD = 0.3
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a search term: lower-cased with collapsed whitespace."""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def searchable_text(company_name: str, industry: Optional[str], data: Any) -> str:
+    """Text a query could match for this company (name, industry, summary, news)."""
+    parts = [company_name or "", industry or ""]
+    if isinstance(data, dict):
+        summary = data.get("summary")
+        if summary:
+            parts.append(str(summary))
+        news = data.get("recent_news")
+        if isinstance(news, list):
+            for item in news:
+                if isinstance(item, dict):
+                    parts.append(str(item.get("headline", "")))
+                    parts.append(str(item.get("summary", "")))
+    return " ".join(parts).lower()
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm's trigrams of `text`: per lower-cased word, padded with two spaces before and one after."""
+    return {
+        padded[i:i + 3]
+        for word in re.findall(r"[^\W_]+", text.lower())
+        for padded in ["  " + word + " "]
+        for i in range(len(padded) - 2)
+    }
+
+
+def trigram_similarity(a: Set[str], b: Set[str]) -> float:
+    """pg_trgm similarity() of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def could_match(query: str, company_name: str, industry: Optional[str], data: Any, fuzzy: bool = False) -> bool:
+    """
+    Whether a search for `query` could return this company.
+
+    Every query word must appear in the company's searchable text; this is a
+    superset of both the full-text prefix match and the substring scan. With
+    `fuzzy` (a backend that also matches names by trigram similarity), a name
+    similar enough to the query matches too.
+    """
+    text = searchable_text(company_name, industry, data)
+    if all(token in text for token in normalize_query(query).split()):
+        return True
+    return fuzzy and trigram_similarity(trigrams(company_name or ""), trigrams(query)) >= TRIGRAM_THRESHOLD
+
+
+def _result_rows(result) -> list:
+    """Company rows inside a cached value (a list, or a page dict with "results")."""
+    if isinstance(result, dict):
+        return result.get("results") or []
+    return result
+
+
+class QueryCache:
+    """
+    TTL + LRU cache of query_db results keyed by normalized query.
+
+    Memory is bounded by both entry count and the approximate JSON size of the
+    cached results. Writes invalidate precisely: every entry whose results
+    contain the written company, plus every entry whose query could now match it.
+
+    A `variant` (page size, cursor, projection...) distinguishes several cached
+    results for the same query; invalidation always applies to all of them.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, size, result)
+        self._by_company: Dict[str, Set[tuple]] = {}  # company name -> keys whose results include it
+        self._bytes = 0
+        self.version = 0  # bumped on every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, query: str, variant: str = ""):
+        """Return the cached result for `query`, or None on a miss."""
+        key = (normalize_query(query), variant)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, query: str, result, version: int = None, variant: str = ""):
+        """
+        Cache `result` for `query`.
+
+        Pass the `version` read before querying the database; if a write has
+        invalidated anything since then the result may be stale and is dropped.
+        """
+        if version is not None and version != self.version:
+            return
+        key = (normalize_query(query), variant)
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl, size, result)
+        self._bytes += size
+        for row in _result_rows(result):
+            if isinstance(row, dict) and row.get("name"):
+                self._by_company.setdefault(row["name"], set()).add(key)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_company(self, company_name: str, industry: str = None, data: Any = None, fuzzy: bool = False):
+        """Drop every entry a write to `company_name` could have changed (see could_match for `fuzzy`)."""
+        self.version += 1
+        stale = set(self._by_company.get(company_name, ()))
+        text = searchable_text(company_name, industry, data)
+        name_trigrams = trigrams(company_name or "") if fuzzy else None
+        for key in self._entries:
+            if key in stale:
+                continue
+            if all(token in text for token in key[0].split()) or (
+                fuzzy and trigram_similarity(name_trigrams, trigrams(key[0])) >= TRIGRAM_THRESHOLD
+            ):
+                stale.add(key)
+        for key in stale:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries (metrics are kept)."""
+        self.version += 1
+        self._entries.clear()
+        self._by_company.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current footprint."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _remove(self, key: tuple):
+        _, size, result = self._entries.pop(key)
+        self._bytes -= size
+        for row in _result_rows(result):
+            if isinstance(row, dict) and row.get("name"):
+                keys = self._by_company.get(row["name"])
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_company[row["name"]]
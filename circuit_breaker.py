@@ -0,0 +1,71 @@
+"""
+Circuit breaker for calls to an external dependency (the PostgreSQL pool)
+"""
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures.
+
+    While open, allow() returns False so callers fail fast (or degrade) without
+    waiting on timeouts. After `reset_timeout` seconds the breaker turns
+    half-open: exactly one caller is allowed through as a probe, and its
+    outcome closes the circuit again or re-opens it for another period. A probe
+    that never reports back (e.g. it was cancelled) is replaced by a new one
+    after another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency now."""
+        if self.state == self.CLOSED:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # OPEN long enough, or HALF_OPEN whose probe never recorded a result
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def trip(self):
+        """Open the circuit immediately (e.g. the startup probe failed)."""
+        self.failures = max(self.failures, self.failure_threshold)
+        self.record_failure()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "trips": self.trips,
+        }
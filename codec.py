@@ -0,0 +1,124 @@
+"""
+zstd storage codec for large company data documents
+"""
+import json
+from typing import Any, Iterable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency: compression stays off without it
+    zstandard = None
+
+
+# Parts of a document moved out of the queryable `data` column when it is compressed
+COLD_KEYS = ("recent_news", "data_quality")
+
+# recent_news fields kept in `data` so full-text search (headlines and summaries) and news_since filters still work
+NEWS_INDEX_KEYS = ("headline", "summary", "extracted_at")
+
+
+def _dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def index_stub(data: dict) -> dict:
+    """
+    What stays queryable in `data` for a compressed row.
+
+    Every top-level key is kept except the bulky ones: news items keep only
+    NEWS_INDEX_KEYS and data_quality loses its `sources` list.
+    """
+    stub = {key: value for key, value in data.items() if key not in COLD_KEYS}
+    news = data.get("recent_news")
+    if isinstance(news, list):
+        stub["recent_news"] = [
+            {key: item[key] for key in NEWS_INDEX_KEYS if key in item} if isinstance(item, dict) else item
+            for item in news
+        ]
+    elif "recent_news" in data:
+        stub["recent_news"] = news
+    quality = data.get("data_quality")
+    if isinstance(quality, dict):
+        stub["data_quality"] = {key: value for key, value in quality.items() if key != "sources"}
+    elif "data_quality" in data:
+        stub["data_quality"] = quality
+    return stub
+
+
+def train_dictionary(samples: Iterable[Any], size: int = 64 * 1024) -> bytes:
+    """Train a zstd dictionary on sample company documents."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is not installed (pip install zstandard)")
+    return zstandard.train_dictionary(size, [_dumps(sample) for sample in samples]).as_bytes()
+
+
+class DataCodec:
+    """
+    Compress company documents larger than `threshold` bytes.
+
+    encode() returns what goes in the (data, data_z) columns: small documents
+    are stored as-is with no blob; large ones store index_stub() in `data` and
+    the full zstd-compressed document in `data_z`. decode() reverses it.
+
+    Frames record which dictionary compressed them, so rows written with an
+    older dictionary stay readable as long as it is passed in `old_dictionaries`.
+    """
+
+    def __init__(self, enabled: bool = False, threshold: int = 4096, level: int = 3,
+                 dictionary: bytes = None, old_dictionaries: list = None):
+        self.enabled = enabled and zstandard is not None
+        if enabled and zstandard is None:
+            print("⚠️ DATA_COMPRESSION is on but zstandard is not installed; storing data uncompressed")
+        self.threshold = threshold
+        self.level = level
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._compressor = None
+        self._decompressors = {}
+        if zstandard is None:
+            return
+
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        if self.enabled:
+            self._compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+        self._decompressors[0] = zstandard.ZstdDecompressor()
+        for raw in [dictionary] + list(old_dictionaries or []):
+            if raw:
+                known = zstandard.ZstdCompressionDict(raw)
+                self._decompressors[known.dict_id()] = zstandard.ZstdDecompressor(dict_data=known)
+
+    def encode(self, data: Any) -> Tuple[Any, Optional[bytes]]:
+        """(value for `data`, value for `data_z`)"""
+        if not self.enabled or not isinstance(data, dict):
+            return data, None
+        raw = _dumps(data)
+        if len(raw) < self.threshold:
+            return data, None
+        blob = self._compressor.compress(raw)
+        self.compressed += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(blob)
+        return index_stub(data), blob
+
+    def decode(self, data: Any, blob: Optional[bytes]) -> Any:
+        """Full document from the stored (data, data_z) pair."""
+        if blob is None:
+            return data
+        if zstandard is None:
+            raise RuntimeError("Row is zstd-compressed but zstandard is not installed")
+        dict_id = zstandard.get_frame_parameters(bytes(blob)).dict_id
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            raise RuntimeError(f"Row was compressed with unknown zstd dictionary {dict_id}")
+        return json.loads(decompressor.decompress(bytes(blob)))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "compressed_writes": self.compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None,
+        }
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Compression tools for stored company data
+
+Usage:
+  python3 compress_data.py train --samples 2000 --size 65536 --out company_data.zdict
+  python3 compress_data.py migrate --batch-size 500
+  python3 compress_data.py migrate --decompress
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def train(samples: int, size: int, out: str):
+    """Train a zstd dictionary on the most recently updated companies."""
+    from database import sample_company_data, close_db
+    from codec import train_dictionary
+
+    try:
+        documents = await sample_company_data(samples)
+        if not documents:
+            print("❌ No companies stored yet; nothing to train on")
+            return
+        dictionary = train_dictionary(documents, size)
+        with open(out, "wb") as f:
+            f.write(dictionary)
+        print(f"✅ Trained {len(dictionary)} byte dictionary on {len(documents)} companies: {out}")
+        print("Set DATA_COMPRESSION_DICT in config.py to use it, then run `compress_data.py migrate`.")
+    finally:
+        await close_db()
+
+
+async def migrate(batch_size: int, decompress: bool):
+    """Re-encode every stored company with the configured codec."""
+    from database import recompress_companies, close_db
+
+    try:
+        result = await recompress_companies(batch_size=batch_size, decompress=decompress)
+        if result["status"] != "success":
+            print(f"❌ Migration failed: {result['message']}")
+            return
+        saved = result["bytes_before"] - result["bytes_after"]
+        print(f"✅ {result['changed']} of {result['rows']} companies rewritten")
+        print(f"   {result['bytes_before']} -> {result['bytes_after']} bytes ({saved:+d} saved)")
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Company data compression tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_cmd = sub.add_parser("train", help="train a zstd dictionary on stored companies")
+    train_cmd.add_argument("--samples", type=int, default=2000)
+    train_cmd.add_argument("--size", type=int, default=64 * 1024)
+    train_cmd.add_argument("--out", default="company_data.zdict")
+
+    migrate_cmd = sub.add_parser("migrate", help="compress (or --decompress) existing rows")
+    migrate_cmd.add_argument("--batch-size", type=int, default=500)
+    migrate_cmd.add_argument("--decompress", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        asyncio.run(train(args.samples, args.size, args.out))
+    elif args.command == "migrate":
+        asyncio.run(migrate(args.batch_size, args.decompress))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,128 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import Column, Integer, String, JSON, DateTime, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import (
+    Column, Integer, String, JSON, DateTime, Boolean, Float, LargeBinary, ForeignKey, Index, UniqueConstraint,
+    select, insert, update, func, text, bindparam,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base
+from sqlalchemy import inspect as sa_inspect
 from datetime import datetime
 from config import Config
+from cache import QueryCache
+from typeahead import PrefixIndex, company_aliases
+from write_behind import WriteBehindBuffer
+from codec import DataCodec, COLD_KEYS
+from pool_metrics import pool_stats
+from replicas import ReplicaRouter, CONNECTION_ERRORS
+from backends import Backend, PostgresBackend, create_backend, json_keys
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from contextvars import ContextVar
+from snapshots import content_hash, payload_hash, diff, apply_delta, describe_change
+from pubsub import ChangeHub
+import rollups
+import tracing
+from tracing import traced
+from typing import Any, Dict, List, Optional, TypedDict, Union
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
 
 Base = declarative_base()
 
-# Globals
-_engine = None
-_async_session = None
+# Backends by name ("postgresql", "sqlite"), created on first use (see get_backend)
+_backends = {}
+
+# Backend set by use_backend(); overrides Config.DB_BACKEND
+_backend_override = None
+
+# Backend picked at runtime when Config.DB_BACKEND is "auto" (None = not decided yet)
+_active_backend = None
+
+# Circuit breaker around PostgreSQL in "auto" mode (see get_breaker)
+_breaker = None
+
+# Read-through cache in front of query_db (see get_query_cache)
+_query_cache = None
+
+# Typeahead index over company names, aliases and industries (see get_suggest_index)
+_suggest_index = None
+
+# Newest last_updated the typeahead index has seen (None = never loaded; see refresh_suggest_index)
+_suggest_synced = None
+
+# Write-behind buffer for store_data when Config.WRITE_BEHIND is enabled
+_write_buffer = None
+
+# zstd codec for large data documents (see get_data_codec)
+_data_codec = None
+
+# Read replicas from Config.DB_READ_REPLICAS (see get_replica_router)
+_replica_router = None
+
+# When the current request/task last wrote (see begin_request_scope), and when anyone last wrote
+_write_scope: ContextVar = ContextVar("db_write_scope", default=None)
+_last_write_at = 0.0
+
+# Shared data version (the data_version row every company write bumps; see sync_data_version):
+# the value last read from the database, when, and versions written by this process since
+_data_version = None
+_data_version_checked = 0.0
+_local_versions = set()
+
+# Fan-out of committed company changes to /ws subscribers in this process (see get_change_hub)
+_change_hub = None
+
+# Writes performed vs skipped because the content hash was unchanged
+_write_stats = {"written": 0, "skipped": 0}
+
+# query_db page size (Config.QUERY_PAGE_SIZE) and upper bound (Config.QUERY_MAX_PAGE_SIZE)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Rows per transaction for store_many (overridable via Config.STORE_MANY_BATCH_SIZE)
+DEFAULT_BATCH_SIZE = 500
+
+# Every Nth snapshot stores the full document (overridable via Config.SNAPSHOT_CHECKPOINT_INTERVAL)
+DEFAULT_CHECKPOINT_INTERVAL = 20
+
+
+# ---------- Result Types ----------
+# Every backend returns these shapes; failures come back as ErrorResult, never raise.
+
+class CompanyRecord(TypedDict):
+    """A company as returned by query_db, filter_companies and stream_query (fields may narrow it)."""
+    name: str
+    industry: Optional[str]
+    data: Any
+    last_updated: Optional[str]
+
+
+class ErrorResult(TypedDict):
+    status: str  # "error"
+    message: str
+
+
+class WriteResult(TypedDict):
+    status: str  # "success"
+    action: str  # "inserted" | "updated" | "unchanged" | "queued"
+    company: str
+
+
+class BulkWriteResult(TypedDict):
+    status: str  # "success" | "partial" | "error"
+    written: int
+    skipped: int
+    batches: int
+    errors: List[Dict[str, Any]]
+
+
+class SearchPage(TypedDict):
+    results: List[CompanyRecord]
+    next_cursor: Optional[str]
+    etag: str  # changes whenever a row on the page (or the page boundary) changes
 
 
 class Company(Base):
@@ -17,34 +131,387 @@ class Company(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False, index=True, unique=True)
     industry = Column(String(100), index=True)
-    data = Column(JSON)
+    data = Column(JSON().with_variant(JSONB(), "postgresql"))
     last_updated = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String(64))  # payload_hash(industry, data); timestamps excluded
+    last_checked = Column(DateTime)  # last write attempt, even when nothing changed
+    data_z = Column(LargeBinary)  # zstd-compressed full document when `data` only holds its index stub
+
+
+# Columns added after the initial release, created by ensure_schema on existing tables
+UPGRADE_COLUMNS = {
+    "companies": ["content_hash", "last_checked", "data_z"],
+}
+
+
+class CompanySnapshot(Base):
+    """One version of a company's data: a full checkpoint or a delta against the previous version."""
+    __tablename__ = "company_snapshots"
+    __table_args__ = (
+        UniqueConstraint("company_id", "version", name="uq_company_snapshots_version"),
+        Index("ix_company_snapshots_created", "company_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    content_hash = Column(String(64), nullable=False)
+    is_checkpoint = Column(Boolean, nullable=False, default=False)
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"))
+
+
+class IndustryRollup(Base):
+    """Per-industry aggregates, adjusted by every company write instead of recomputed."""
+    __tablename__ = "industry_rollups"
+
+    industry = Column(String(100), primary_key=True)
+    company_count = Column(Integer, nullable=False, default=0)
+    news_count = Column(Integer, nullable=False, default=0)
+    metrics = Column(JSON)  # metric -> [sum, companies reporting it]
+    updated_sum = Column(Float, nullable=False, default=0.0)  # sum of last_updated epochs, for average age
+    newest_update = Column(DateTime)  # only moves forward; not lowered when a company leaves the industry
+    refreshed_at = Column(DateTime)
+
+
+class DataVersion(Base):
+    """Single-row counter every company write transaction increments, shared by all processes."""
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class WatchlistItem(Base):
+    """A company or industry the background monitor keeps fresh (see monitor.py)."""
+    __tablename__ = "watchlist"
+    __table_args__ = (UniqueConstraint("kind", "name", name="uq_watchlist_item"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(20), nullable=False)  # "company" | "industry"
+    name = Column(String(255), nullable=False)
+    industry = Column(String(100))  # stored with refreshed company data
+    source = Column(String(100))  # watched industry that added this company; None when watched directly
+    interval = Column(Float, nullable=False)  # seconds between refreshes, adapted to how often the data changes
+    next_due = Column(DateTime)
+    last_refreshed = Column(DateTime)
+    last_changed = Column(DateTime)
+    refreshes = Column(Integer, nullable=False, default=0)
+    changes = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)  # consecutive
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 # ---------- Engine / Session Setup ----------
 
+def _database_url(name: str) -> str:
+    """SQLAlchemy URL of the "postgresql" or "sqlite" database from Config."""
+    config = Config()
+    if name == "sqlite":
+        path = getattr(config, "DB_SQLITE_PATH", None) or os.path.join(os.path.dirname(__file__), "industry_monitoring.db")
+        return f"sqlite+aiosqlite:///{path}"
+    return f"postgresql+asyncpg://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
+
+
+def _configured_backend() -> str:
+    """Config.DB_BACKEND: "postgresql" (default), "sqlite", or "auto" (PostgreSQL, SQLite while it is down)."""
+    name = _backend_override or getattr(Config(), "DB_BACKEND", "postgresql")
+    if name not in ("postgresql", "sqlite", "auto"):
+        raise ValueError(f"Unknown DB_BACKEND: {name!r}")
+    return name
+
+
+def use_backend(name: str):
+    """Serve from `name` ("postgresql", "sqlite" or "auto") regardless of Config.DB_BACKEND."""
+    global _backend_override
+    _backend_override = name
+    _configured_backend()
+
+
+def _backend_named(name: str) -> Backend:
+    if name not in _backends:
+        # In "auto" mode an unreachable PostgreSQL must fail within DB_CONNECT_TIMEOUT to fall back quickly
+        fail_fast = name == "postgresql" and _configured_backend() == "auto"
+        _backends[name] = create_backend(_database_url(name), connect_timeout=_connect_timeout() if fail_fast else None)
+        if name == "sqlite":
+            print(f"Using SQLite database: {_database_url(name).split(':///', 1)[1]}")
+    return _backends[name]
+
+
+def get_backend() -> Backend:
+    """The backend serving requests right now."""
+    name = _configured_backend()
+    if name == "auto":
+        name = _active_backend or "postgresql"
+    return _backend_named(name)
+
+
 def get_engine():
-    """Create global async engine if not already created."""
-    global _engine
-    if _engine is None:
+    """Async engine of the current backend, created on first use."""
+    return get_backend().get_engine()
+
+
+def get_breaker() -> CircuitBreaker:
+    """Circuit breaker around PostgreSQL when Config.DB_BACKEND is "auto"."""
+    global _breaker
+    if _breaker is None:
         config = Config()
-        _engine = create_async_engine(
-            f"postgresql+asyncpg://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}",
-            echo=False,
-            pool_size=10,
-            max_overflow=20,
-            future=True,
+        _breaker = CircuitBreaker(
+            failure_threshold=getattr(config, "DB_BREAKER_FAILURES", 3),
+            reset_timeout=getattr(config, "DB_BREAKER_RESET", 30.0),
+        )
+    return _breaker
+
+
+def _connect_timeout() -> float:
+    return getattr(Config(), "DB_CONNECT_TIMEOUT", 2.0)
+
+
+async def select_backend() -> str:
+    """
+    Pick the backend at startup. In "auto" mode PostgreSQL is probed with
+    DB_CONNECT_TIMEOUT; if it does not answer the circuit opens and SQLite serves.
+    """
+    global _active_backend
+    name = _configured_backend()
+    if name != "auto":
+        return name
+    breaker = get_breaker()
+    if await _backend_named("postgresql").probe(_connect_timeout()):
+        breaker.record_success()
+        _active_backend = "postgresql"
+        print("Using PostgreSQL database")
+    else:
+        breaker.trip()
+        _active_backend = "sqlite"
+        print("PostgreSQL not available, falling back to SQLite")
+    return _active_backend
+
+
+async def _check_primary():
+    """
+    "auto" mode: once the open circuit's reset timeout has passed, probe
+    PostgreSQL and switch back to it if it answers. Raises CircuitOpenError
+    while it is down and Config.DB_FALLBACK_TO_SQLITE is False.
+    """
+    if _configured_backend() != "auto" or get_breaker().state == CircuitBreaker.CLOSED:
+        return
+    breaker = get_breaker()
+    if breaker.allow():
+        try:
+            recovered = await _backend_named("postgresql").probe(_connect_timeout())
+        except BaseException:
+            breaker.record_failure()  # cancelled probe: keep the breaker moving
+            raise
+        if recovered:
+            breaker.record_success()
+            _switch_backend("postgresql")
+            print("✅ PostgreSQL is back, switching from SQLite")
+            return
+        breaker.record_failure()
+    if not getattr(Config(), "DB_FALLBACK_TO_SQLITE", True):
+        raise CircuitOpenError("PostgreSQL unavailable (circuit open)")
+
+
+def _switch_backend(name: str):
+    """Serve from `name` in "auto" mode; cached results came from the other database."""
+    global _active_backend
+    _active_backend = name
+    _reset_data_version()
+    if _query_cache is not None:
+        _query_cache.clear()
+
+
+def _note_failure(error: Exception):
+    """Count a PostgreSQL connection failure against the "auto" circuit; switch to SQLite when it opens."""
+    if _configured_backend() != "auto" or get_backend().name != "postgresql":
+        return
+    if not isinstance(error, CONNECTION_ERRORS):
+        return
+    breaker = get_breaker()
+    breaker.record_failure()
+    if breaker.state == CircuitBreaker.OPEN and getattr(Config(), "DB_FALLBACK_TO_SQLITE", True):
+        _switch_backend("sqlite")
+        print(f"⚠️ PostgreSQL unavailable ({error!r}), serving from SQLite")
+
+
+def get_backend_status() -> dict:
+    """Current backend, plus circuit breaker counters in "auto" mode."""
+    status = {"backend": get_backend().name, "configured": _configured_backend()}
+    if status["configured"] == "auto":
+        status.update(get_breaker().stats())
+    return status
+
+
+def get_replica_router():
+    """Return the read-replica router, or None unless Config.DB_READ_REPLICAS lists replica URLs."""
+    global _replica_router
+    config = Config()
+    urls = getattr(config, "DB_READ_REPLICAS", [])
+    if _replica_router is None and urls:
+        _replica_router = ReplicaRouter(
+            [PostgresBackend(url).create_engine() for url in urls],
+            reset_timeout=getattr(config, "DB_REPLICA_RETRY", 10.0),
         )
-    return _engine
+    return _replica_router
+
+
+def begin_request_scope():
+    """
+    Start a read-your-writes scope for the current request.
+
+    Tasks spawned afterwards share it, so a write made by one agent tool keeps
+    the request's later reads on the primary for DB_READ_AFTER_WRITE_WINDOW.
+    """
+    _write_scope.set({"wrote_at": None})
+
+
+def _note_write(version: Optional[int] = None):
+    """Record a committed company write; `version` is the data_version its transaction produced."""
+    global _last_write_at
+    _last_write_at = time.monotonic()
+    if version is not None and (_data_version is None or version > _data_version):
+        _local_versions.add(version)
+    scope = _write_scope.get()
+    if scope is None:
+        scope = {}
+        _write_scope.set(scope)
+    scope["wrote_at"] = _last_write_at
+
+
+async def _bump_data_version(session: AsyncSession) -> Optional[int]:
+    """Increment the shared data version inside a company write's transaction; returns the new value."""
+    await session.execute(update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1))
+    return await session.scalar(select(DataVersion.version).where(DataVersion.id == 1))
+
+
+def _reset_data_version():
+    global _data_version, _data_version_checked
+    _data_version = None
+    _data_version_checked = 0.0
+    _local_versions.clear()
+
+
+def get_data_version() -> str:
+    """
+    Token that changes whenever company data may have changed, in any process:
+    answers derived from the data (e.g. the /chat cache) can key on it.
+    Writes by other processes show up after sync_data_version().
+    """
+    known = max([_data_version or 0] + list(_local_versions))
+    return f"{get_backend().name}:{known}"
+
+
+async def sync_data_version(max_age: float = None) -> str:
+    """
+    Re-read the shared data version if the last read is older than `max_age`
+    seconds (default Config.DATA_VERSION_CHECK_INTERVAL). When another process
+    (or a write that bypassed store_data) has changed company data since, the
+    query cache is cleared: which companies changed is not known here.
+    Returns get_data_version().
+    """
+    global _data_version, _data_version_checked
+    if max_age is None:
+        max_age = getattr(Config(), "DATA_VERSION_CHECK_INTERVAL", 1.0)
+    if _data_version is not None and time.monotonic() - _data_version_checked < max_age:
+        return get_data_version()
+    try:
+        # The primary, not a replica: a lagging replica would report an older version
+        async with get_engine().connect() as conn:
+            version = await conn.scalar(select(DataVersion.version).where(DataVersion.id == 1))
+    except Exception as e:
+        _note_failure(e)
+        print(f"⚠️ Data version check failed: {e}")
+        return get_data_version()
+    if version is None:
+        return get_data_version()
+    if _data_version is not None and any(v not in _local_versions for v in range(_data_version + 1, version + 1)):
+        # Versions this process did not write (or has not seen the result of yet)
+        if _query_cache is not None:
+            _query_cache.clear()
+    _data_version = version
+    _data_version_checked = time.monotonic()
+    _local_versions.difference_update([v for v in _local_versions if v <= version])
+    return get_data_version()
+
+
+def _read_window() -> float:
+    return getattr(Config(), "DB_READ_AFTER_WRITE_WINDOW", 0.0)
+
+
+def _stick_to_primary() -> bool:
+    """Whether this caller wrote recently enough that replicas may not have its write yet."""
+    scope = _write_scope.get()
+    wrote_at = scope.get("wrote_at") if scope else None
+    return wrote_at is not None and time.monotonic() - wrote_at < _read_window()
+
+
+async def _read_engine():
+    """(engine, breaker) to read from: a healthy replica, or the primary with breaker None."""
+    await _check_primary()
+    router = get_replica_router()
+    if router is not None and get_backend().name == "postgresql" and not _stick_to_primary():
+        engine, breaker = await router.pick()
+        if engine is not None:
+            return engine, breaker
+    return get_engine(), None
+
+
+@traced("db.read")
+async def _run_read(operation):
+    """
+    Run `operation(session)` as a read-only query on a replica, or on the primary.
+
+    A replica that fails to connect is taken out of rotation and the read is
+    retried on the primary.
+    """
+    engine, breaker = await _read_engine()
+    current = tracing.current_span()
+    if current is not None:
+        current.set(backend=get_backend().name, replica=breaker is not None)
+    if breaker is not None:
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)() as session:
+                return await operation(session)
+        except CONNECTION_ERRORS as e:
+            get_replica_router().mark_failed(breaker, engine, e)
+    try:
+        async with get_session_maker()() as session:
+            return await operation(session)
+    except Exception as e:
+        _note_failure(e)
+        raise
+
+
+def _replica_results_cacheable() -> bool:
+    """Replica results right after a write may lag the primary; don't cache them for the read window."""
+    return get_replica_router() is None or time.monotonic() - _last_write_at >= _read_window()
+
+
+def get_pool_stats() -> dict:
+    """Connections in use/idle/overflow and checkout wait times for the engine's pool."""
+    return pool_stats(get_engine().pool)
 
 
 def get_session_maker():
-    """Return async session maker bound to engine."""
-    global _async_session
-    if _async_session is None:
-        engine = get_engine()
-        _async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-    return _async_session
+    """Return async session maker bound to the current backend's engine."""
+    return get_backend().get_session_maker()
+
+
+@traced("db.write")
+async def _run_write(job):
+    """
+    Run `job(session)` in a committed write transaction on the current backend
+    (through the group-commit writer on SQLite's production profile).
+    """
+    current = tracing.current_span()
+    if current is not None:
+        current.set(backend=get_backend().name)
+    try:
+        return await get_backend().run_write(job)
+    except Exception as e:
+        _note_failure(e)
+        raise
 
 
 async def get_db_session() -> AsyncSession:
@@ -52,88 +519,1298 @@ async def get_db_session() -> AsyncSession:
     return get_session_maker()()
 
 
+def get_query_cache() -> QueryCache:
+    """Return the process-wide query_db cache, sized from Config."""
+    global _query_cache
+    if _query_cache is None:
+        config = Config()
+        _query_cache = QueryCache(
+            ttl=getattr(config, "QUERY_CACHE_TTL", 60),
+            max_entries=getattr(config, "QUERY_CACHE_MAX_ENTRIES", 256),
+            max_bytes=getattr(config, "QUERY_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+        )
+    return _query_cache
+
+
+def get_suggest_index() -> PrefixIndex:
+    """Return the process-wide typeahead index; load_suggest_index() fills it from the database."""
+    global _suggest_index
+    if _suggest_index is None:
+        _suggest_index = PrefixIndex()
+    return _suggest_index
+
+
+def get_change_hub() -> ChangeHub:
+    """Return the process-wide hub store_data/store_many publish change events to."""
+    global _change_hub
+    if _change_hub is None:
+        _change_hub = ChangeHub(max_queue=getattr(Config(), "WS_QUEUE_SIZE", 100))
+    return _change_hub
+
+
+def _describe_for_subscribers(old_industry, old_data, industry, data) -> Optional[dict]:
+    """describe_change for a write, or None (skipping the comparison) when nobody is subscribed."""
+    if _change_hub is None or not len(_change_hub):
+        return None
+    return describe_change(old_industry, old_data, industry, data)
+
+
+async def _suggest_rows(since: Optional[datetime] = None, batch_size: int = 1000) -> list:
+    """(name, industry, {"aliases": ...}, last_updated) for companies updated at or after `since`."""
+    statement = select(Company.name, Company.industry, Company.data, Company.last_updated)
+    if since is not None:
+        statement = statement.where(Company.last_updated >= since)
+    rows = []
+    async with get_engine().connect() as conn:
+        result = await conn.stream(statement.execution_options(yield_per=batch_size))
+        # data is enough for aliases: compressed rows keep every top-level key there
+        async for name, industry, data, last_updated in result:
+            rows.append((name, industry, {"aliases": company_aliases(data)}, last_updated))
+    return rows
+
+
+def _advance_suggest_sync(rows: list):
+    global _suggest_synced
+    stamps = [row[3] for row in rows if row[3] is not None]
+    _suggest_synced = max(stamps + [_suggest_synced or datetime.min])
+
+
+async def load_suggest_index(batch_size: int = 1000) -> int:
+    """Index every stored company for /suggest; returns how many were loaded."""
+    global _suggest_index, _suggest_synced
+    _suggest_synced = None
+    rows = await _suggest_rows(batch_size=batch_size)
+    index = PrefixIndex()
+    index.load(rows)
+    _suggest_index = index
+    _advance_suggest_sync(rows)
+    return len(rows)
+
+
+async def refresh_suggest_index() -> int:
+    """
+    Index companies written since the last load or refresh, e.g. by another web
+    worker process; returns how many were (re)indexed. Loads everything the first time.
+    """
+    if _suggest_synced is None:
+        return await load_suggest_index()
+    rows = await _suggest_rows(since=_suggest_synced)
+    index = get_suggest_index()
+    for row in rows:
+        index.add_company(*row)
+    _advance_suggest_sync(rows)
+    return len(rows)
+
+
+def get_data_codec() -> DataCodec:
+    """Return the Company.data codec; compression is opt-in via Config.DATA_COMPRESSION."""
+    global _data_codec
+    if _data_codec is None:
+        config = Config()
+
+        def read(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        dictionary = getattr(config, "DATA_COMPRESSION_DICT", None)
+        _data_codec = DataCodec(
+            enabled=getattr(config, "DATA_COMPRESSION", False),
+            threshold=getattr(config, "DATA_COMPRESSION_THRESHOLD", 4096),
+            level=getattr(config, "DATA_COMPRESSION_LEVEL", 3),
+            dictionary=read(dictionary) if dictionary else None,
+            old_dictionaries=[read(path) for path in getattr(config, "DATA_COMPRESSION_OLD_DICTS", [])],
+        )
+    return _data_codec
+
+
+def _full_data(data, data_z):
+    """The complete document of a companies row, decompressing data_z if present."""
+    return get_data_codec().decode(data, data_z)
+
+
+def get_write_buffer():
+    """Return the write-behind buffer, or None unless Config.WRITE_BEHIND is set."""
+    global _write_buffer
+    config = Config()
+    if _write_buffer is None and getattr(config, "WRITE_BEHIND", False):
+        _write_buffer = WriteBehindBuffer(
+            store_many,
+            max_pending=getattr(config, "WRITE_BEHIND_MAX_PENDING", 10000),
+            batch_size=getattr(config, "WRITE_BEHIND_BATCH_SIZE", 500),
+            interval=getattr(config, "WRITE_BEHIND_INTERVAL", 0.5),
+            max_attempts=getattr(config, "WRITE_BEHIND_MAX_ATTEMPTS", 3),
+        )
+    return _write_buffer
+
+
+async def _flush_pending(query: str = None):
+    """Read-your-writes: commit buffered writes a read (for `query`, or any read) could observe."""
+    if _write_buffer is not None and _write_buffer.has_pending(query, fuzzy=get_backend().trigram):
+        await _write_buffer.flush()
+
+
 # ---------- DB Lifecycle ----------
 
 async def init_db():
-    """Create all tables if they don’t exist."""
-    engine = get_engine()
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """Pick the backend and create all tables if they don’t exist."""
+    await select_backend()
+    await ensure_schema()
+    await ensure_jsonb_storage()
+    await ensure_search_index()
+    await ensure_industry_rollups()
+    if getattr(Config(), "SUGGEST_INDEX", True):
+        if _suggest_synced is None:
+            print(f"🔎 Typeahead index loaded ({await load_suggest_index()} companies)")
+        else:
+            # Preloaded before fork (see preload_shared_state): only catch up
+            print(f"🔎 Typeahead index refreshed ({await refresh_suggest_index()} companies changed)")
     print("✅ Database initialized and tables ready.")
 
 
+async def warm_pool(connections: int) -> int:
+    """Open `connections` pooled connections at once so early requests don't each pay for a connect."""
+    engine = get_engine()
+    opened = await asyncio.gather(*(engine.connect().start() for _ in range(connections)))
+    await asyncio.gather(*(conn.close() for conn in opened))
+    return len(opened)
+
+
+async def preload_shared_state() -> dict:
+    """
+    Build the read-only state forked web workers can share copy-on-write: the
+    schema check, the typeahead index and the data codec (with its zstd
+    dictionaries). Connections do not survive fork, so they are closed again.
+    """
+    await init_db()
+    get_data_codec()
+    await close_db()
+    return {"suggest": get_suggest_index().stats()}
+
+
 async def close_db():
     """Dispose engine + reset session maker."""
-    global _engine, _async_session
-    if _engine:
-        await _engine.dispose()
-        _engine = None
-        _async_session = None
+    global _write_buffer, _replica_router, _active_backend
+    if _write_buffer is not None:
+        await _write_buffer.close()
+        _write_buffer = None
+    if _replica_router is not None:
+        await _replica_router.dispose()
+        _replica_router = None
+    if _backends:
+        for backend in _backends.values():
+            await backend.dispose()
+        _backends.clear()
+        _active_backend = None
+        _reset_data_version()
+        if _query_cache is not None:
+            _query_cache.clear()
         print("🛑 Database connections closed.")
 
 
+def _missing_columns(sync_conn) -> list:
+    """(table, column) pairs from UPGRADE_COLUMNS that the live tables lack."""
+    inspector = sa_inspect(sync_conn)
+    missing = []
+    for table, columns in UPGRADE_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        missing += [(table, column) for column in columns if column not in existing]
+    return missing
+
+
+async def ensure_schema():
+    """Create missing tables (and the data_version row) and add UPGRADE_COLUMNS to older tables, once per backend."""
+    await _check_primary()
+    backend = get_backend()
+    if backend.schema_ready:
+        return
+    engine = backend.get_engine()
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for table, column in await conn.run_sync(_missing_columns):
+                column_type = Base.metadata.tables[table].c[column].type.compile(dialect=engine.dialect)
+                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        async with async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)() as session:
+            await backend.insert_missing(session, DataVersion, [{"id": 1, "version": 0}], "id")
+            await session.commit()
+    except Exception as e:
+        _note_failure(e)
+        raise
+    backend.schema_ready = True
+
+
+def get_write_stats() -> dict:
+    """How many company writes were applied vs skipped as unchanged."""
+    total = _write_stats["written"] + _write_stats["skipped"]
+    return {
+        **_write_stats,
+        "skip_rate": round(_write_stats["skipped"] / total, 4) if total else 0.0,
+    }
+
+
+# ---------- JSONB Storage ----------
+
+async def ensure_jsonb_storage():
+    """
+    Backend-specific storage setup. On PostgreSQL: migrate companies.data to
+    JSONB with a jsonb_path_ops GIN index and expression indexes on hot keys.
+    """
+    try:
+        async with get_engine().begin() as conn:
+            await get_backend().prepare_storage(conn)
+    except Exception as e:
+        print(f"⚠️ JSONB index creation failed: {e}")
+
+
+# ---------- Search Index ----------
+
+async def ensure_search_index() -> bool:
+    """
+    Install the current backend's search index once.
+
+    PostgreSQL gets a GIN tsvector expression index (plus pg_trgm GIN indexes
+    on name/industry where the extension is available); SQLite gets an FTS5
+    table kept in sync by triggers.
+    Returns False (and query_db falls back to LIKE scans) if that fails.
+    """
+    await ensure_schema()
+    backend = get_backend()
+    if backend.search_ready is not None:
+        return backend.search_ready
+
+    try:
+        async with backend.get_engine().begin() as conn:
+            backend.search_ready = await backend.install_search_index(conn)
+    except CONNECTION_ERRORS as e:
+        # Unreachable, not unsupported: try again on the next search
+        _note_failure(e)
+        raise
+    except Exception as e:
+        print(f"⚠️ Search index unavailable, falling back to ILIKE scans: {e}")
+        backend.search_ready = False
+    return backend.search_ready
+
+
+def _projection_sql(backend: Backend, fields: list) -> str:
+    """Columns selected by a search; `fields` limits which parts of `data` leave the database."""
+    columns = ["companies.name", "companies.industry", "companies.last_updated", "companies.content_hash"]
+    # Compressed rows keep the full document (and the cold keys) only in data_z
+    if fields is None or any(field == "data" or field in COLD_KEYS for field in fields):
+        columns.append("companies.data_z")
+    if fields is None:
+        columns.append(backend.data_column())
+        return ", ".join(columns)
+
+    for field in fields:
+        if field in ("name", "industry", "last_updated"):
+            continue
+        if field == "data":
+            columns.append(backend.data_column())
+            continue
+        if "." in field:
+            raise ValueError(f"Only top-level data fields can be projected: {field!r}")
+        columns.append(backend.project_field(json_keys(field)[0]))
+    return ", ".join(columns)
+
+
+def _encode_cursor(rank: float, name: str) -> str:
+    """Opaque keyset cursor for the row after (rank, name)."""
+    return base64.urlsafe_b64encode(json.dumps([rank, name]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        rank, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), str(name)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def _search_sql(backend: Backend, query: str, indexed: bool, fields: list = None,
+                limit: int = None, after: str = None):
+    """
+    Keyset-paginated search statement ordered by relevance, then name.
+
+    Rows come back with `rank` so the caller can build the next cursor.
+    """
+    source, rank, direction, params = backend.ranked_search(query, indexed)
+    sql = f"SELECT * FROM (SELECT {_projection_sql(backend, fields)}, {rank} AS rank {source}) AS ranked"
+    if after:
+        params["after_rank"], params["after_name"] = _decode_cursor(after)
+        beyond = "<" if direction == "DESC" else ">"
+        sql += (
+            f" WHERE rank {beyond} :after_rank "
+            "OR (rank = :after_rank AND name > :after_name)"
+        )
+    sql += f" ORDER BY rank {direction}, name"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return text(sql).bindparams(**params).columns(last_updated=DateTime)
+
+
+def _search_row_to_dict(row, fields: list = None) -> dict:
+    """Serialize a search row: the query_db shape, or only `fields` when projecting."""
+    mapping = row._mapping
+    last_updated = mapping["last_updated"]
+    blob = mapping.get("data_z")
+    full = _full_data(None, blob) if blob is not None else None
+    if fields is None:
+        return {
+            "name": mapping["name"],
+            "industry": mapping["industry"],
+            "data": full if blob is not None else json.loads(mapping["data"]) if mapping["data"] is not None else None,
+            "last_updated": last_updated.isoformat() if last_updated else None,
+        }
+
+    item = {"name": mapping["name"]}
+    for field in fields:
+        if field == "industry":
+            item["industry"] = mapping["industry"]
+        elif field == "last_updated":
+            item["last_updated"] = last_updated.isoformat() if last_updated else None
+        elif full is not None and field != "name":
+            item[field] = full if field == "data" else full.get(field)
+        elif field == "data":
+            item["data"] = json.loads(mapping["data"]) if mapping["data"] is not None else None
+        elif field != "name":
+            value = mapping[f"f_{field}"]
+            item[field] = json.loads(value) if value is not None else None
+    return item
+
+
+def _page_etag(rows: list, next_cursor: str = None, fields: list = None) -> str:
+    """Validator for a search page: its rows' content hashes and last_updated, plus the page boundary."""
+    digest = hashlib.sha1()
+    digest.update(f"{next_cursor}|{','.join(fields) if fields is not None else '*'}".encode())
+    for row in rows:
+        digest.update(f"|{row.name}:{row.content_hash}:{row.last_updated}".encode())
+    return digest.hexdigest()
+
+
+def _page_limit(limit: int = None) -> int:
+    """Clamp a requested page size to Config.QUERY_MAX_PAGE_SIZE (default page: QUERY_PAGE_SIZE)."""
+    config = Config()
+    if limit is None:
+        limit = getattr(config, "QUERY_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    return max(1, min(int(limit), getattr(config, "QUERY_MAX_PAGE_SIZE", MAX_PAGE_SIZE)))
+
+
 # ---------- CRUD Operations ----------
 
-async def store_data(company_name: str, industry: str, data: dict) -> dict:
+@traced("db.store_data", record=("company_name", "industry"))
+async def store_data(company_name: str, industry: str, data: dict) -> Union[WriteResult, ErrorResult]:
     """Insert or update company record asynchronously, auto-creating table if needed."""
+    buffer = get_write_buffer()
+    if buffer is not None:
+        await buffer.put(company_name, industry, data)
+        get_query_cache().invalidate_company(company_name, industry, data, fuzzy=get_backend().trigram)
+        return {"status": "success", "action": "queued", "company": company_name}
+
+    try:
+        # Ensure table exists
+        await ensure_schema()
+        action, changes, version = await _run_write(
+            lambda session: _store_company(session, company_name, industry, data)
+        )
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+    if action == "unchanged":
+        _write_stats["skipped"] += 1
+    else:
+        _note_write(version)
+        _write_stats["written"] += 1
+        get_query_cache().invalidate_company(company_name, industry, data, fuzzy=get_backend().trigram)
+        get_suggest_index().add_company(company_name, industry, data, datetime.utcnow())
+        if changes:
+            get_change_hub().publish(company_name, industry, action, changes)
+    return {"status": "success", "action": action, "company": company_name}
+
+
+async def _store_company(session: AsyncSession, company_name: str, industry: str, data: dict) -> tuple:
+    """
+    store_data's write inside the caller's transaction; returns (action taken,
+    describe_change of the write or None when nobody is subscribed, the new
+    data version or None when unchanged).
+    """
+    # Check if company exists; locked, since the rollups subtract exactly this row
+    await get_backend().lock_companies(session, [company_name])
+    stmt = select(Company).filter_by(name=company_name).with_for_update()
+    result = await session.execute(stmt)
+    company = result.scalar_one_or_none()
+
+    now = datetime.utcnow()
+    digest = payload_hash(industry, data)
+    if company and company.content_hash == digest:
+        # Same content: only record that we checked
+        company.last_checked = now
+        return "unchanged", None, None
+
+    stored, blob = get_data_codec().encode(data)
+    if company:
+        previous = _full_data(company.data, company.data_z)
+        rollup_change = ((company.industry, previous, company.last_updated), (industry, data, now))
+        changes = _describe_for_subscribers(company.industry, previous, industry, data)
+        company.industry = industry
+        company.data = stored
+        company.data_z = blob
+        company.last_updated = now
+        company.content_hash = digest
+        company.last_checked = now
+        action = "updated"
+    else:
+        previous = None
+        rollup_change = (None, (industry, data, now))
+        changes = _describe_for_subscribers(None, None, industry, data)
+        company = Company(
+            name=company_name,
+            industry=industry,
+            data=stored,
+            data_z=blob,
+            last_updated=now,
+            content_hash=digest,
+            last_checked=now,
+        )
+        session.add(company)
+        await session.flush()
+        action = "inserted"
+
+    await _record_snapshots(session, [(company.id, previous, data, now)])
+    await _update_rollups(session, [rollup_change])
+    # Last: the version row is every writer's last lock, held only until commit
+    return action, changes, await _bump_data_version(session)
+
+
+@traced("db.query_db", record=("query", "limit"))
+async def query_db(query: str, limit: Optional[int] = None,
+                   fields: Optional[List[str]] = None) -> Union[List[CompanyRecord], ErrorResult]:
+    """
+    Search companies by name, industry, summary and news, most relevant first.
+
+    Returns at most `limit` companies (an empty list when nothing matches).
+    `fields` (e.g. ["industry", "summary"]) returns only those fields instead
+    of the full data blob.
+    """
+    page = await query_page(query, limit=limit, fields=fields)
+    if "results" not in page:
+        return page
+    return page["results"]
+
+
+@traced("db.query_page", record=("query", "limit", "after"))
+async def query_page(query: str, limit: int = None, after: str = None,
+                     fields: list = None) -> Union[SearchPage, ErrorResult]:
+    """
+    One keyset page of query_db results.
+
+    Returns {"results": [...], "next_cursor": str | None, "etag": str}; pass
+    `next_cursor` back as `after` to fetch the following page.
+    """
+    await _flush_pending(query)
+    try:
+        await _check_primary()
+    except CircuitOpenError as e:
+        return {"status": "error", "message": str(e)}
+    # Drops cached pages when another worker has written since
+    await sync_data_version()
+    limit = _page_limit(limit)
+    variant = f"{limit}|{after or ''}|{','.join(fields) if fields is not None else '*'}"
+    cache = get_query_cache()
+    cached = cache.get(query, variant)
+    if cached is not None:
+        return cached
+
+    version = cache.version
+    page = await _search_companies(query, limit, after, fields)
+    if "results" in page and _replica_results_cacheable():
+        cache.put(query, page, version, variant)
+    return page
+
+
+async def _search_companies(query: str, limit: int, after: str = None, fields: list = None) -> dict:
+    """Run one page of the query_db search against the database (no caching)."""
+    async def search(session):
+        rows = (await session.execute(stmt)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1].rank, rows[-1].name)
+
+        return {
+            "results": [_search_row_to_dict(row, fields) for row in rows],
+            "next_cursor": next_cursor,
+            "etag": _page_etag(rows, next_cursor, fields),
+        }
+
+    try:
+        indexed = await ensure_search_index()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    # Outside the try: a bad cursor or projection raises ValueError for the caller (a 400 in /query)
+    # Fetch one extra row to learn whether another page exists
+    stmt = _search_sql(get_backend(), query, indexed, fields, limit + 1, after)
+    try:
+        return await _run_read(search)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+async def stream_query(query: str, fields: list = None, batch_size: int = 100, after: str = None):
+    """
+    Yield every query_db match (after the `after` cursor), most relevant first,
+    without materializing the result.
+
+    Rows are read through a server-side cursor `batch_size` at a time, so memory
+    stays bounded regardless of how many companies match. Invalid `fields` or
+    `after` raise ValueError before the first row.
+    """
+    await _flush_pending(query)
+    indexed = await ensure_search_index()
+    engine, _ = await _read_engine()
+    stmt = _search_sql(get_backend(), query, indexed, fields, after=after)
+
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=batch_size))
+        async for row in result:
+            yield _search_row_to_dict(row, fields)
+
+
+async def filter_companies(
+    industry: str = None,
+    contains: dict = None,
+    has: list = None,
+    where: dict = None,
+    updated_since: datetime = None,
+    news_since: datetime = None,
+    limit: int = 100,
+):
+    """
+    Filter companies on fields inside `data`, evaluated by the database.
+
+    - contains: sub-document the data must contain, e.g. {"company_info": {"industry": "Energy"}}
+    - has: dotted paths that must be present, e.g. ["key_metrics.market_cap"]
+    - where: dotted path -> exact value, e.g. {"key_metrics.revenue": "$5 billion"}
+    - updated_since: minimum data_quality.last_updated
+    - news_since: at least one recent_news item extracted at or after this time
+    """
+    await _flush_pending()
+    await ensure_schema()
+    backend = get_backend()
+
+    async def run(session):
+        stmt = select(Company)
+        if industry:
+            stmt = stmt.filter(Company.industry == industry)
+        for condition in backend.json_filters(contains, has, where, updated_since, news_since):
+            stmt = stmt.filter(condition)
+        stmt = stmt.order_by(Company.name).limit(limit)
+
+        result = await session.execute(stmt)
+        return [_company_to_dict(c) for c in result.scalars().all()]
+
+    try:
+        return await _run_read(run)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def _company_to_dict(c: Company) -> dict:
+    """Serialize a Company row the way query_db returns it."""
+    return {
+        "name": c.name,
+        "industry": c.industry,
+        "data": _full_data(c.data, c.data_z),
+        "last_updated": c.last_updated.isoformat() if c.last_updated else None,
+    }
+
+
+async def get_content_hash(company_name: str) -> Optional[str]:
+    """payload_hash of the company's stored content, or None when it is not stored."""
+    await _flush_pending(company_name)
+    await ensure_schema()
+
+    async def lookup(session):
+        return await session.scalar(select(Company.content_hash).filter_by(name=company_name))
+
+    return await _run_read(lookup)
+
+
+# ---------- Snapshot History ----------
+
+async def _record_snapshots(session: AsyncSession, changes: list):
+    """
+    Append a snapshot for every (company_id, previous_data, data, timestamp) whose content changed.
+
+    Unchanged content (same hash as the latest snapshot) writes nothing. Every
+    SNAPSHOT_CHECKPOINT_INTERVAL versions, or whenever the previous data does not
+    match the latest snapshot, the full document is stored; otherwise only the delta.
+    """
+    if not changes:
+        return
+    interval = getattr(Config(), "SNAPSHOT_CHECKPOINT_INTERVAL", DEFAULT_CHECKPOINT_INTERVAL)
+    company_ids = [change[0] for change in changes]
+
+    newest = (
+        select(CompanySnapshot.company_id, func.max(CompanySnapshot.version).label("version"))
+        .filter(CompanySnapshot.company_id.in_(company_ids))
+        .group_by(CompanySnapshot.company_id)
+        .subquery()
+    )
+    latest = {
+        company_id: (version, digest)
+        for company_id, version, digest in (await session.execute(
+            select(CompanySnapshot.company_id, CompanySnapshot.version, CompanySnapshot.content_hash)
+            .join(newest, (CompanySnapshot.company_id == newest.c.company_id)
+                  & (CompanySnapshot.version == newest.c.version))
+        )).all()
+    }
+
+    rows = []
+    for company_id, previous, data, created_at in changes:
+        digest = content_hash(data)
+        last_version, last_digest = latest.get(company_id, (0, None))
+        if digest == last_digest:
+            continue
+        version = last_version + 1
+        checkpoint = (
+            (version - 1) % interval == 0
+            or previous is None
+            or content_hash(previous) != last_digest
+        )
+        rows.append({
+            "company_id": company_id,
+            "version": version,
+            "created_at": created_at,
+            "content_hash": digest,
+            "is_checkpoint": checkpoint,
+            "payload": data if checkpoint else diff(previous, data),
+        })
+        latest[company_id] = (version, digest)
+
+    if rows:
+        await session.execute(insert(CompanySnapshot), rows)
+
+
+async def _replay(session: AsyncSession, company_id: int, first: int, last: int):
+    """Yield (snapshot, data) for versions first..last, starting from the checkpoint at or before `first`."""
+    checkpoint = await session.scalar(
+        select(func.max(CompanySnapshot.version)).filter(
+            CompanySnapshot.company_id == company_id,
+            CompanySnapshot.is_checkpoint.is_(True),
+            CompanySnapshot.version <= first,
+        )
+    )
+    result = await session.execute(
+        select(CompanySnapshot)
+        .filter(
+            CompanySnapshot.company_id == company_id,
+            CompanySnapshot.version >= (checkpoint or 1),
+            CompanySnapshot.version <= last,
+        )
+        .order_by(CompanySnapshot.version)
+    )
+    data = None
+    for snapshot in result.scalars():
+        data = snapshot.payload if snapshot.is_checkpoint else apply_delta(data, snapshot.payload)
+        if snapshot.version >= first:
+            yield snapshot, data
+
+
+def _snapshot_to_dict(company_name: str, snapshot: CompanySnapshot, data) -> dict:
+    return {
+        "company": company_name,
+        "version": snapshot.version,
+        "created_at": snapshot.created_at.isoformat(),
+        "content_hash": snapshot.content_hash,
+        "data": data,
+    }
+
+
+async def get_company_version(company_name: str, version: int = None, at: datetime = None):
+    """
+    Rebuild one stored version of a company's data.
+
+    Pass `version`, or `at` for the version current at that time; the latest
+    version otherwise. Returns None if there is no such version.
+    """
+    await _flush_pending(company_name)
     session_maker = get_session_maker()
 
     async with session_maker() as session:
-        try:
-            # Ensure table exists
-            engine = get_engine()
-            async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-
-            # Check if company exists
-            stmt = select(Company).filter_by(name=company_name)
-            result = await session.execute(stmt)
-            company = result.scalar_one_or_none()
-
-            if company:
-                company.industry = industry
-                company.data = data
-                company.last_updated = datetime.utcnow()
-                action = "updated"
-            else:
-                company = Company(
-                    name=company_name,
-                    industry=industry,
-                    data=data,
-                    last_updated=datetime.utcnow(),
-                )
-                session.add(company)
-                action = "inserted"
+        company_id = await session.scalar(select(Company.id).filter_by(name=company_name))
+        if company_id is None:
+            return None
 
-            await session.commit()
-            return {"status": "success", "action": action, "company": company_name}
+        stmt = select(func.max(CompanySnapshot.version)).filter(CompanySnapshot.company_id == company_id)
+        if version is not None:
+            stmt = stmt.filter(CompanySnapshot.version <= version)
+        if at is not None:
+            stmt = stmt.filter(CompanySnapshot.created_at <= at)
+        target = await session.scalar(stmt)
+        if target is None or (version is not None and target != version):
+            return None
 
-        except Exception as e:
-            await session.rollback()
-            return {"status": "error", "message": str(e)}
+        replayed = [item async for item in _replay(session, company_id, target, target)]
+        return _snapshot_to_dict(company_name, *replayed[-1]) if replayed else None
 
 
-async def query_db(query: str):
-    """Search companies by name or industry (case-insensitive)."""
+async def get_company_history(company_name: str, start: datetime = None, end: datetime = None) -> list:
+    """Every version of a company's data created between `start` and `end` (inclusive), oldest first."""
+    await _flush_pending(company_name)
     session_maker = get_session_maker()
 
     async with session_maker() as session:
-        try:
-            stmt = select(Company).filter(
-                (Company.name.ilike(f"%{query}%")) | (Company.industry.ilike(f"%{query}%"))
+        company_id = await session.scalar(select(Company.id).filter_by(name=company_name))
+        if company_id is None:
+            return []
+
+        bounds = select(func.min(CompanySnapshot.version), func.max(CompanySnapshot.version)).filter(
+            CompanySnapshot.company_id == company_id
+        )
+        if start is not None:
+            bounds = bounds.filter(CompanySnapshot.created_at >= start)
+        if end is not None:
+            bounds = bounds.filter(CompanySnapshot.created_at <= end)
+        first, last = (await session.execute(bounds)).one()
+        if first is None:
+            return []
+
+        return [
+            _snapshot_to_dict(company_name, snapshot, data)
+            async for snapshot, data in _replay(session, company_id, first, last)
+        ]
+
+
+# ---------- Industry Rollups ----------
+
+def _rollup_deltas(changes: list) -> dict:
+    """industry -> net change from (previous, current) pairs of (industry, data, last_updated)."""
+    deltas = {}
+    for previous, current in changes:
+        for state, sign in ((previous, -1), (current, 1)):
+            if state is None or not state[0]:
+                continue
+            industry, data, last_updated = state
+            rollups.add(deltas.setdefault(industry, rollups.empty_delta()),
+                        rollups.contribution(data, last_updated), sign)
+    return deltas
+
+
+async def _update_rollups(session: AsyncSession, changes: list):
+    """
+    Adjust industry_rollups for company writes inside the caller's transaction.
+
+    `changes` holds (previous, current) pairs of (industry, data, last_updated);
+    previous is None for new companies. The old contribution is subtracted and
+    the new one added, so only the touched industries' rows are read and written.
+    """
+    deltas = _rollup_deltas(changes)
+    if not deltas:
+        return
+    industries = sorted(deltas)
+    seed = [{"industry": industry, "company_count": 0, "news_count": 0, "metrics": {}, "updated_sum": 0.0}
+            for industry in industries]
+    await get_backend().insert_missing(session, IndustryRollup, seed, "industry")
+
+    # Lock rows in a fixed order so concurrent writers cannot deadlock
+    result = await session.execute(
+        select(IndustryRollup).filter(IndustryRollup.industry.in_(industries))
+        .order_by(IndustryRollup.industry).with_for_update()
+    )
+    stored = {row.industry: row for row in result.scalars()}
+    now = datetime.utcnow()
+    for industry in industries:
+        delta = deltas[industry]
+        row = stored[industry]
+        row.company_count += delta["companies"]
+        row.news_count += delta["news"]
+        row.updated_sum += delta["updated"]
+        row.metrics = rollups.merge_metrics(row.metrics, delta["metrics"])
+        if delta["last_updated"] and (row.newest_update is None or delta["last_updated"] > row.newest_update):
+            row.newest_update = delta["last_updated"]
+        row.refreshed_at = now
+
+
+def _rollup_to_dict(industry: str, row: IndustryRollup = None) -> dict:
+    if row is None:
+        return rollups.summarize(industry, 0, 0, {}, 0.0, None, None)
+    return rollups.summarize(row.industry, row.company_count, row.news_count, row.metrics,
+                             row.updated_sum, row.newest_update, row.refreshed_at)
+
+
+async def rebuild_industry_rollups() -> int:
+    """Recompute industry_rollups from every company (backfill / repair); returns the number of industries."""
+    await ensure_schema()
+    session_maker = get_session_maker()
+    async with session_maker() as session:
+        deltas = {}
+        result = await session.stream(
+            select(Company.industry, Company.data, Company.last_updated).execution_options(yield_per=500)
+        )
+        async for industry, data, last_updated in result:
+            if industry:
+                rollups.add(deltas.setdefault(industry, rollups.empty_delta()),
+                            rollups.contribution(data, last_updated))
+        await session.execute(IndustryRollup.__table__.delete())
+        now = datetime.utcnow()
+        for industry, delta in deltas.items():
+            session.add(IndustryRollup(
+                industry=industry,
+                company_count=delta["companies"],
+                news_count=delta["news"],
+                metrics=rollups.merge_metrics({}, delta["metrics"]),
+                updated_sum=delta["updated"],
+                newest_update=delta["last_updated"],
+                refreshed_at=now,
+            ))
+        await session.commit()
+    return len(deltas)
+
+
+async def ensure_industry_rollups():
+    """Backfill industry_rollups once when companies exist but no rollups do (e.g. after upgrading)."""
+    await ensure_schema()
+    session_maker = get_session_maker()
+    async with session_maker() as session:
+        has_rollups = await session.scalar(select(IndustryRollup.industry).limit(1))
+        has_companies = await session.scalar(select(Company.id).limit(1))
+    if has_companies is not None and has_rollups is None:
+        count = await rebuild_industry_rollups()
+        print(f"📊 Built rollups for {count} industries")
+
+
+@traced("db.industry_rollup", record=("industry",))
+async def get_industry_rollup(industry: str) -> dict:
+    """
+    Aggregates for one industry: company count, per-metric sum/avg (revenue,
+    employees, market_cap...), news volume and data freshness.
+
+    Use this for sector-level questions instead of fetching every company.
+    """
+    await _flush_pending()
+    await ensure_schema()
+
+    async def lookup(session):
+        row = await session.get(IndustryRollup, industry)
+        if row is None:
+            # Small table (one row per industry): a case-insensitive scan stays cheap
+            row = await session.scalar(
+                select(IndustryRollup).filter(func.lower(IndustryRollup.industry) == industry.lower())
+            )
+        return _rollup_to_dict(industry, row)
+
+    return await _run_read(lookup)
+
+
+async def list_industry_rollups() -> list:
+    """Rollups for every industry, largest first."""
+    await _flush_pending()
+    await ensure_schema()
+
+    async def run(session):
+        result = await session.execute(
+            select(IndustryRollup).filter(IndustryRollup.company_count > 0)
+            .order_by(IndustryRollup.company_count.desc(), IndustryRollup.industry)
+        )
+        return [_rollup_to_dict(row.industry, row) for row in result.scalars()]
+
+    return await _run_read(run)
+
+
+# ---------- Watchlist ----------
+
+WATCH_KINDS = ("company", "industry")
+
+# Watched data counts as fresh until this many refresh intervals have passed
+WATCH_FRESH_INTERVALS = 1.5
+
+# Refresh state of a watchlist row, as list_watchlist returns it and save_watch takes it back
+WATCH_FIELDS = ("interval", "next_due", "last_refreshed", "last_changed", "refreshes", "changes", "failures")
+
+
+def _watch_to_dict(row: WatchlistItem) -> dict:
+    item = {"id": row.id, "kind": row.kind, "name": row.name, "industry": row.industry, "source": row.source,
+            "created_at": row.created_at}
+    item.update({field: getattr(row, field) for field in WATCH_FIELDS})
+    return item
+
+
+def _watch_is_fresh(item: dict, now: datetime) -> bool:
+    refreshed = item["last_refreshed"]
+    return refreshed is not None and (now - refreshed).total_seconds() <= item["interval"] * WATCH_FRESH_INTERVALS
+
+
+async def add_watch(kind: str, name: str, interval: float = None) -> dict:
+    """
+    Watch a company or industry: the monitor refreshes it from the web, soonest
+    first. Watching an industry watches every company stored in it.
+    """
+    if kind not in WATCH_KINDS:
+        return {"status": "error", "message": f"kind must be one of {', '.join(WATCH_KINDS)}"}
+    if not name.strip():
+        return {"status": "error", "message": "name cannot be empty"}
+    await ensure_schema()
+    now = datetime.utcnow()
+
+    async def job(session):
+        row = await session.scalar(select(WatchlistItem).filter_by(kind=kind, name=name))
+        if row is None:
+            industry = name if kind == "industry" else await session.scalar(
+                select(Company.industry).filter_by(name=name))
+            row = WatchlistItem(
+                kind=kind, name=name, industry=industry, created_at=now, next_due=now,
+                interval=interval or getattr(Config(), "MONITOR_DEFAULT_INTERVAL", 3600),
+                refreshes=0, changes=0, failures=0,
+            )
+            session.add(row)
+            action = "added"
+        else:
+            row.source = None  # watched in its own right now
+            if interval:
+                row.interval = interval
+            action = "updated"
+        await session.flush()
+        return {"status": "success", "action": action, "item": _watch_to_dict(row)}
+
+    try:
+        return await _run_write(job)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+async def remove_watch(kind: str, name: str) -> dict:
+    """Stop watching; an industry takes the companies it added along with it."""
+    await ensure_schema()
+
+    async def job(session):
+        table = WatchlistItem.__table__
+        result = await session.execute(table.delete().where(table.c.kind == kind, table.c.name == name))
+        removed = result.rowcount
+        if kind == "industry" and removed:
+            removed += (await session.execute(table.delete().where(table.c.source == name))).rowcount
+        return removed
+
+    try:
+        removed = await _run_write(job)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    if not removed:
+        return {"status": "error", "message": f"{kind} {name!r} is not watched"}
+    return {"status": "success", "removed": removed}
+
+
+async def list_watchlist() -> list:
+    """Every watched item with its refresh state (read from the primary: the monitor writes it)."""
+    await ensure_schema()
+    async with get_session_maker()() as session:
+        result = await session.execute(select(WatchlistItem).order_by(WatchlistItem.kind, WatchlistItem.name))
+        return [_watch_to_dict(row) for row in result.scalars()]
+
+
+async def sync_industry_watches() -> int:
+    """Watch companies stored in watched industries that are not watched yet; returns how many were added."""
+    await ensure_schema()
+    now = datetime.utcnow()
+
+    async def job(session):
+        industries = {row.name: row.interval for row in (await session.execute(
+            select(WatchlistItem).filter_by(kind="industry"))).scalars()}
+        if not industries:
+            return 0
+        watched = set((await session.execute(
+            select(WatchlistItem.name).filter_by(kind="company"))).scalars())
+        members = (await session.execute(
+            select(Company.name, Company.industry).filter(Company.industry.in_(list(industries))))).all()
+        added = 0
+        for name, industry in members:
+            if name not in watched:
+                session.add(WatchlistItem(
+                    kind="company", name=name, industry=industry, source=industry, interval=industries[industry],
+                    next_due=now, created_at=now, refreshes=0, changes=0, failures=0,
+                ))
+                added += 1
+        return added
+
+    return await _run_write(job)
+
+
+async def save_watch(item: dict):
+    """Persist the refresh state (WATCH_FIELDS) of an item from list_watchlist."""
+    table = WatchlistItem.__table__
+
+    async def job(session):
+        await session.execute(
+            table.update().where(table.c.id == item["id"]).values({field: item[field] for field in WATCH_FIELDS})
+        )
+
+    await _run_write(job)
+
+
+async def watch_freshness(entities: list) -> dict:
+    """
+    (kind, name) -> whether the monitor has refreshed it recently, for the given
+    entities (False when not watched). A watched industry is fresh when every
+    watched company in it is.
+    """
+    if not entities:
+        return {}
+    await ensure_schema()
+    now = datetime.utcnow()
+    names = [name for _, name in entities]
+    async with get_session_maker()() as session:
+        rows = (await session.execute(select(WatchlistItem).filter(
+            (WatchlistItem.name.in_(names)) | (WatchlistItem.industry.in_(names))
+        ))).scalars().all()
+    items = [_watch_to_dict(row) for row in rows]
+    freshness = {}
+    for kind, name in entities:
+        if kind == "company":
+            freshness[(kind, name)] = any(
+                item["kind"] == "company" and item["name"] == name and _watch_is_fresh(item, now) for item in items)
+        elif kind == "industry":
+            members = [item for item in items if item["kind"] == "company" and item["industry"] == name]
+            watched = any(item["kind"] == "industry" and item["name"] == name for item in items)
+            freshness[(kind, name)] = watched and bool(members) and all(_watch_is_fresh(m, now) for m in members)
+        else:
+            freshness[(kind, name)] = False
+    return freshness
+
+
+# ---------- Data Compression ----------
+
+async def recompress_companies(batch_size: int = 500, decompress: bool = False) -> dict:
+    """
+    Re-encode stored company documents with the current codec settings.
+
+    Migrates existing rows after turning on DATA_COMPRESSION (or changing the
+    threshold/dictionary); with `decompress` every row is stored plain again.
+    Content, hashes, timestamps and history are untouched.
+    """
+    await _flush_pending()
+    await ensure_schema()
+    codec = get_data_codec()
+    if not decompress and not codec.enabled:
+        return {"status": "error", "message": "DATA_COMPRESSION is off (or zstandard is not installed)"}
+
+    session_maker = get_session_maker()
+    rows = changed = bytes_before = bytes_after = 0
+    last_id = 0
+    while True:
+        async with session_maker() as session:
+            try:
+                batch = (await session.execute(
+                    select(Company.id, Company.data, Company.data_z)
+                    .filter(Company.id > last_id).order_by(Company.id).limit(batch_size)
+                )).all()
+                if not batch:
+                    break
+                updates = []
+                for company_id, data, data_z in batch:
+                    full = _full_data(data, data_z)
+                    stored, blob = (full, None) if decompress else codec.encode(full)
+                    before = len(json.dumps(data, default=str)) + len(data_z or b"")
+                    after = len(json.dumps(stored, default=str)) + len(blob or b"")
+                    bytes_before += before
+                    bytes_after += after
+                    # Also rewrites rows whose stub predates the current NEWS_INDEX_KEYS
+                    if blob != (bytes(data_z) if data_z is not None else None) or stored != data:
+                        updates.append({"row_id": company_id, "data": stored, "data_z": blob})
+                if updates:
+                    table = Company.__table__
+                    await session.execute(
+                        table.update().where(table.c.id == bindparam("row_id"))
+                        .values(data=bindparam("data"), data_z=bindparam("data_z")),
+                        updates,
+                    )
+                await session.commit()
+                rows += len(batch)
+                changed += len(updates)
+                last_id = batch[-1][0]
+            except Exception as e:
+                await session.rollback()
+                return {"status": "error", "message": str(e), "rows": rows, "changed": changed}
+
+    get_query_cache().clear()
+    return {
+        "status": "success",
+        "rows": rows,
+        "changed": changed,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+    }
+
+
+async def sample_company_data(limit: int = 1000) -> list:
+    """Full documents of up to `limit` companies, e.g. for training a compression dictionary."""
+    await ensure_schema()
+    session_maker = get_session_maker()
+    async with session_maker() as session:
+        result = await session.execute(
+            select(Company.data, Company.data_z).order_by(Company.last_updated.desc()).limit(limit)
+        )
+        return [_full_data(data, data_z) for data, data_z in result.all()]
+
+
+# ---------- Bulk Operations ----------
+
+def _batched(records: list, batch_size: int):
+    """Yield successive slices of `records` of at most `batch_size` items."""
+    for start in range(0, len(records), batch_size):
+        yield records[start:start + batch_size]
+
+
+def _normalize_records(batch: list, now: datetime) -> list:
+    """Turn store_many input dicts into column rows, keeping the last entry per company."""
+    rows = {}
+    for record in batch:
+        name = record.get("company_name") or record.get("name")
+        if not name:
+            raise ValueError(f"Record without company_name: {record!r}")
+        industry = record.get("industry")
+        data = record.get("data") or {}
+        rows[name] = {
+            "name": name,
+            "industry": industry,
+            "data": data,
+            "last_updated": now,
+            "content_hash": payload_hash(industry, data),
+            "last_checked": now,
+        }
+    return list(rows.values())
+
+
+def _stored_row(row: dict) -> dict:
+    """Column values for a normalized record, with `data` encoded by the codec."""
+    stored, blob = get_data_codec().encode(row["data"])
+    return {**row, "data": stored, "data_z": blob}
+
+
+async def _store_batch(session: AsyncSession, backend: Backend, batch: list) -> tuple:
+    """
+    One store_many batch inside the caller's transaction; returns (written
+    rows, unchanged names, the new data version or None when nothing was
+    written). Each written row carries its "action" and its describe_change
+    (None when nobody is subscribed) under "changes".
+    """
+    now = datetime.utcnow()
+    rows = _normalize_records(batch, now)
+    names = [row["name"] for row in rows]
+    # Locked like _store_company: the rollups subtract exactly these rows
+    await backend.lock_companies(session, names)
+    existing = {
+        name: (_full_data(data, data_z), digest, industry, last_updated)
+        for name, data, data_z, digest, industry, last_updated in (await session.execute(
+            select(Company.name, Company.data, Company.data_z, Company.content_hash,
+                   Company.industry, Company.last_updated)
+            .filter(Company.name.in_(names))
+            .order_by(Company.name)
+            .with_for_update()
+        )).all()
+    }
+
+    # Same content as stored: only touch last_checked
+    unchanged = [
+        row["name"] for row in rows
+        if row["name"] in existing and existing[row["name"]][1] == row["content_hash"]
+    ]
+    rows = [row for row in rows if row["name"] not in unchanged]
+    if unchanged:
+        await session.execute(
+            Company.__table__.update()
+            .where(Company.name.in_(unchanged))
+            .values(last_checked=now)
+        )
+
+    if rows:
+        await backend.upsert_companies(session, Company, [_stored_row(row) for row in rows])
+        ids = dict((await session.execute(
+            select(Company.name, Company.id).filter(Company.name.in_([row["name"] for row in rows]))
+        )).all())
+        await _record_snapshots(session, [
+            (ids[row["name"]], existing.get(row["name"], (None, None))[0], row["data"], row["last_updated"])
+            for row in rows
+        ])
+        await _update_rollups(session, [
+            (
+                (existing[row["name"]][2], existing[row["name"]][0], existing[row["name"]][3])
+                if row["name"] in existing else None,
+                (row["industry"], row["data"], row["last_updated"]),
             )
-            result = await session.execute(stmt)
-            companies = result.scalars().all()
-
-            return [
-                {
-                    "name": c.name,
-                    "industry": c.industry,
-                    "data": c.data,
-                    "last_updated": c.last_updated.isoformat() if c.last_updated else None,
-                }
-                for c in companies
-            ]
+            for row in rows
+        ])
+        for row in rows:
+            old_data, _, old_industry, _ = existing.get(row["name"], (None, None, None, None))
+            row["action"] = "updated" if row["name"] in existing else "inserted"
+            row["changes"] = _describe_for_subscribers(old_industry, old_data, row["industry"], row["data"])
+        return rows, unchanged, await _bump_data_version(session)
+    return rows, unchanged, None
+
+
+@traced("db.store_many")
+async def store_many(records: list, batch_size: int = None) -> BulkWriteResult:
+    """
+    Bulk insert or update companies, one transaction per batch.
+
+    Each record is a dict with `company_name` (or `name`), `industry` and `data`.
+    A failing batch is rolled back and reported in `errors`; later batches still run.
+    """
+    records = list(records)
+    if batch_size is None:
+        batch_size = getattr(Config(), "STORE_MANY_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
 
+    written = 0
+    skipped = 0
+    errors = []
+
+    for index, batch in enumerate(_batched(records, batch_size)):
+        try:
+            # Per batch: in "auto" mode the backend can fail over (or back) between batches
+            await ensure_schema()
+            backend = get_backend()
+            rows, unchanged, version = await _run_write(lambda session: _store_batch(session, backend, batch))
         except Exception as e:
-            return {"status": "error", "message": str(e)}
\ No newline at end of file
+            errors.append({
+                "batch": index,
+                "size": len(batch),
+                "companies": [r.get("company_name") or r.get("name") for r in batch],
+                "message": str(e),
+            })
+            continue
+
+        # Committed: what follows cannot fail the batch
+        if rows:
+            _note_write(version)
+        written += len(rows)
+        skipped += len(unchanged)
+        _write_stats["written"] += len(rows)
+        _write_stats["skipped"] += len(unchanged)
+        cache = get_query_cache()
+        suggest = get_suggest_index()
+        for row in rows:
+            try:
+                cache.invalidate_company(row["name"], row["industry"], row["data"], fuzzy=backend.trigram)
+                suggest.add_company(row["name"], row["industry"], row["data"], row["last_updated"])
+                if row["changes"]:
+                    get_change_hub().publish(row["name"], row["industry"], row["action"], row["changes"])
+            except Exception as e:
+                cache.clear()  # whatever this row left cached may be stale
+                print(f"⚠️ Stored {row['name']}, but updating caches or subscribers failed: {e!r}")
+
+    if not errors:
+        status = "success"
+    elif written:
+        status = "partial"
+    else:
+        status = "error"
+
+    return {
+        "status": status,
+        "written": written,
+        "skipped": skipped,
+        "batches": -(-len(records) // batch_size),
+        "errors": errors,
+    }
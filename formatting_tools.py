@@ -6,6 +6,8 @@ import re
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+from tracing import traced
+
 
 async def format_company_data(raw_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -290,6 +292,7 @@ def calculate_completeness(data: Dict[str, Any]) -> float:
 
 
 # Tool function for the formatting agent
+@traced("tool.format_web_data")
 async def format_web_data(raw_data: str) -> dict:
     """
     Tool function for formatting raw web data
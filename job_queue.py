@@ -0,0 +1,180 @@
+"""
+Bounded priority job queue for agent runs
+"""
+import asyncio
+import contextvars
+import itertools
+import math
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Lower runs first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the queue is at capacity; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: int, depth: int):
+        super().__init__(f"Job queue is full ({depth} jobs waiting)")
+        self.retry_after = retry_after
+        self.depth = depth
+
+
+class Job:
+    def __init__(self, payload: Any, priority: str):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.priority = priority
+        self.status = "queued"  # queued -> running -> done | error
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+        # The submitter's context variables (e.g. its trace), which the handler runs with
+        self.context = contextvars.copy_context()
+
+    def to_dict(self) -> dict:
+        item = {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            item["result"] = self.result
+        elif self.status == "error":
+            item["error"] = self.error
+        return item
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on `workers` concurrent tasks, highest priority first.
+
+    `handler(payload, worker)` does the work; `worker` is the index of the task
+    running it, so callers can give each worker its own non-shareable resources.
+    At most `max_depth` jobs wait at once: beyond that submit() raises
+    QueueFullError with a Retry-After estimate instead of queueing more work
+    than the workers can drain. Finished jobs are kept for `result_ttl` seconds.
+    """
+
+    def __init__(self, handler: Callable[[Any, int], Awaitable[Any]], workers: int = 4,
+                 max_depth: int = 100, result_ttl: float = 600.0):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self._handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()  # FIFO within a priority
+        self._jobs: Dict[str, Job] = {}
+        self._tasks = []
+        self.depth = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._run_time = 0.0
+
+    def _start(self):
+        if not self._tasks:
+            self._queue = asyncio.PriorityQueue()
+            self._tasks = [asyncio.create_task(self._work(worker)) for worker in range(self.workers)]
+
+    def _avg_run_time(self) -> float:
+        finished = self.completed + self.failed
+        return self._run_time / finished if finished else 30.0
+
+    def retry_after(self) -> int:
+        """Seconds until the workers should have drained the current backlog, at the average run time so far."""
+        return max(1, math.ceil(self._avg_run_time() * (self.depth + self.running) / self.workers))
+
+    def submit(self, payload: Any, priority: str = "normal") -> Job:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+        self._purge()
+        if self.depth >= self.max_depth:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after(), self.depth)
+        self._start()
+        job = Job(payload, priority)
+        self._jobs[job.id] = job
+        self.depth += 1
+        self._queue.put_nowait((PRIORITIES[priority], next(self._seq), job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, timeout: float = None) -> Job:
+        """Wait up to `timeout` seconds (forever if None) for `job` to finish."""
+        try:
+            await asyncio.wait_for(asyncio.shield(job.done.wait()), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def _work(self, worker: int):
+        while True:
+            _, _, job = await self._queue.get()
+            self.depth -= 1
+            self.running += 1
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await asyncio.create_task(self._handler(job.payload, worker), context=job.context)
+                job.status = "done"
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.status = "error"
+                job.error = "Job cancelled at shutdown"
+                raise
+            except Exception as e:
+                job.status = "error"
+                job.error = str(e)
+                self.failed += 1
+            finally:
+                job.finished_at = time.time()
+                self._run_time += job.finished_at - job.started_at
+                self.running -= 1
+                job.done.set()
+
+    def _purge(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.depth,
+            "running": self.running,
+            "max_depth": self.max_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_run_seconds": round(self._avg_run_time(), 3) if self.completed + self.failed else None,
+        }
+
+    async def close(self):
+        """Cancel the workers; queued and running jobs end with status "error"."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            job.status = "error"
+            job.error = "Job cancelled at shutdown"
+            job.finished_at = time.time()
+            job.done.set()
+        self.depth = 0
@@ -0,0 +1,211 @@
+"""
+Background watchlist monitor: keeps watched companies fresh without waiting for a user to ask
+"""
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from database import (
+    list_watchlist, save_watch, sync_industry_watches, store_data, get_suggest_index, get_write_buffer,
+    get_content_hash,
+)
+from formatting_tools import format_web_data
+from snapshots import payload_hash
+from tools import search_web
+from tracing import span
+
+# How a refresh outcome scales the item's interval: changed data is checked sooner, stable data later
+CHANGED_FACTOR = 0.5
+UNCHANGED_FACTOR = 1.5
+
+# Ticks between expansions of watched industries into their companies
+SYNC_EVERY = 10
+
+
+async def refresh_company(item: dict) -> str:
+    """search_web -> format_web_data -> store_data for one watched company; returns store_data's action."""
+    formatted = await format_web_data(await search_web(item["name"]))
+    if "error" in formatted:
+        raise RuntimeError(formatted["error"])
+    industry = item["industry"] or (formatted.get("company_info") or {}).get("industry") or "Unknown"
+    # With WRITE_BEHIND, store_data only queues the write ("queued"): tell a change from the stored hash
+    previous = await get_content_hash(item["name"]) if get_write_buffer() is not None else None
+    result = await store_data(item["name"], industry, formatted)
+    if result["status"] != "success":
+        raise RuntimeError(result["message"])
+    if result["action"] == "queued":
+        if previous is None:
+            return "inserted"
+        return "unchanged" if payload_hash(industry, formatted) == previous else "updated"
+    return result["action"]
+
+
+class RateBudget:
+    """Token bucket: `per_minute` refreshes a minute on average, in bursts of at most `burst` (a minute's worth)."""
+
+    def __init__(self, per_minute: float, burst: int = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, math.ceil(per_minute))
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class WatchlistMonitor:
+    """
+    Refreshes due watchlist companies every `tick` seconds, most urgent first,
+    `concurrency` at a time.
+
+    Urgency is staleness (time since the last refresh, in refresh intervals)
+    weighted by popularity (searches of the company via /query) and
+    volatility (how often its refreshes found changed data). The global
+    `budget` caps web searches; due items it cannot cover wait for the next
+    tick, still first in line. After each refresh the item's interval shrinks
+    when the data changed and grows when it did not, between `min_interval`
+    and `max_interval`, so searches go where the data actually moves.
+    """
+
+    def __init__(self, refresh: Callable[[dict], Awaitable[str]] = refresh_company,
+                 budget: RateBudget = None, tick: float = 30.0, concurrency: int = 2,
+                 min_interval: float = 900.0, max_interval: float = 86400.0,
+                 popularity: Optional[Callable[[dict], int]] = None):
+        self._refresh = refresh
+        self.budget = budget or RateBudget(10)
+        self.tick = tick
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._popularity = popularity or (lambda item: get_suggest_index().hits("company", item["name"]))
+        self._task = None
+        self._wake = asyncio.Event()
+        self._resync = True
+        self.ticks = 0
+        self.due = 0
+        self.refreshed = 0
+        self.changed = 0
+        self.failed = 0
+        self.deferred = 0
+        self.last_error = None
+
+    def priority(self, item: dict, now: datetime) -> float:
+        """Higher refreshes sooner: staleness x (1 + log popularity) x volatility."""
+        if item["last_refreshed"] is None:
+            staleness = 1e6  # never fetched: ahead of everything already known
+        else:
+            staleness = (now - item["last_refreshed"]).total_seconds() / item["interval"]
+        popularity = 1 + math.log1p(self._popularity(item))
+        volatility = 0.5 + (item["changes"] + 1) / (item["refreshes"] + 2)  # Laplace-smoothed change rate
+        return staleness * popularity * volatility
+
+    def adapt(self, item: dict, changed: bool, now: datetime):
+        """Record a successful refresh and move the item's interval toward how often its data changes."""
+        factor = CHANGED_FACTOR if changed else UNCHANGED_FACTOR
+        item["interval"] = min(self.max_interval, max(self.min_interval, item["interval"] * factor))
+        item["refreshes"] += 1
+        item["failures"] = 0
+        item["last_refreshed"] = now
+        if changed:
+            item["changes"] += 1
+            item["last_changed"] = now
+        item["next_due"] = now + timedelta(seconds=item["interval"])
+
+    async def _refresh_item(self, item: dict):
+        try:
+            # Each refresh is a trace of its own: there is no request to hang it on
+            with span("monitor.refresh", root=True, company=item["name"]) as current:
+                action = await self._refresh(item)
+                if current is not None:
+                    current.set(action=action)
+            now = datetime.utcnow()
+            self.adapt(item, action in ("inserted", "updated"), now)
+            self.refreshed += 1
+            self.changed += action in ("inserted", "updated")
+        except Exception as e:
+            # Retry with backoff, but never later than the regular interval
+            now = datetime.utcnow()
+            item["failures"] += 1
+            retry = min(item["interval"], self.min_interval * 2 ** (item["failures"] - 1))
+            item["next_due"] = now + timedelta(seconds=retry)
+            self.failed += 1
+            self.last_error = f"{item['name']}: {e}"
+            print(f"⚠️ Watchlist refresh failed for {item['name']}: {e}")
+        await save_watch(item)
+
+    async def run_once(self) -> int:
+        """Refresh as many due companies as the budget allows, most urgent first; returns how many ran."""
+        if self._resync or self.ticks % SYNC_EVERY == 0:
+            self._resync = False
+            await sync_industry_watches()
+        self.ticks += 1
+        now = datetime.utcnow()
+        due = [item for item in await list_watchlist()
+               if item["kind"] == "company" and (item["next_due"] is None or item["next_due"] <= now)]
+        due.sort(key=lambda item: self.priority(item, now), reverse=True)
+        self.due = len(due)
+
+        selected = []
+        for item in due:
+            if not self.budget.take():
+                break
+            selected.append(item)
+        self.deferred += len(due) - len(selected)
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def refresh(item):
+            async with slots:
+                await self._refresh_item(item)
+
+        await asyncio.gather(*(refresh(item) for item in selected))
+        return len(selected)
+
+    def wake(self):
+        """Run the next tick now, re-expanding watched industries (e.g. after the watchlist changed)."""
+        self._resync = True
+        self._wake.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ Watchlist monitor tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "ticks": self.ticks,
+            "due": self.due,
+            "refreshed": self.refreshed,
+            "changed": self.changed,
+            "failed": self.failed,
+            "deferred_by_budget": self.deferred,
+            "budget_tokens": round(self.budget.tokens, 2),
+            "last_error": self.last_error,
+        }
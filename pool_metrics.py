@@ -0,0 +1,88 @@
+"""
+Connection pool instrumented with checkout-wait metrics
+"""
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    """Checkout counters shared by a pool and the pools it is recreated as."""
+
+    def __init__(self, warn_after: float = 0.1, warn_interval: float = 10.0):
+        self.warn_after = warn_after  # seconds a queued checkout may wait before warning
+        self.warn_interval = warn_interval
+        self.checkouts = 0
+        self.queued = 0  # checkouts that found every connection (incl. overflow) in use
+        self.waiting = 0  # callers queued right now
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._last_warning = 0.0
+
+    def record(self, wait: float, queued: bool, pool):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if not queued:
+            return
+        self.queued += 1
+        now = time.monotonic()
+        if wait >= self.warn_after and now - self._last_warning >= self.warn_interval:
+            self._last_warning = now
+            print(
+                f"⚠️ Waited {wait * 1000:.0f} ms for a database connection "
+                f"({pool.size()} + {max(pool._max_overflow, 0)} overflow in use, {self.waiting} still waiting); "
+                "consider raising DB_POOL_SIZE / DB_MAX_OVERFLOW"
+            )
+
+    def stats(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "queued_checkouts": self.queued,
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class MonitoredPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times every checkout and warns when callers queue for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        queued = self._max_overflow >= 0 and self.checkedout() >= self.size() + self._max_overflow
+        self.metrics.waiting += queued
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.waiting -= queued
+            self.metrics.record(time.perf_counter() - start, queued, self)
+
+
+def pool_stats(pool) -> dict:
+    """Occupancy of a QueuePool plus its wait metrics, when it has them."""
+    stats = {}
+    for key, method in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin")):
+        if hasattr(pool, method):
+            stats[key] = getattr(pool, method)()
+    if hasattr(pool, "overflow"):
+        # QueuePool counts overflow from -pool_size until the pool is full
+        stats["overflow"] = max(pool.overflow(), 0)
+    if isinstance(pool, MonitoredPool):
+        stats.update(pool.metrics.stats())
+    return stats
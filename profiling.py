@@ -0,0 +1,254 @@
+"""
+Sampling profiler for single requests and a watchdog for event-loop blocking
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def folded_stack(frame) -> str:
+    """A frame's call stack, outermost first, as one line of the folded format flamegraph tools read."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def thread_stack(thread_id: int) -> Optional[str]:
+    frame = sys._current_frames().get(thread_id)
+    return folded_stack(frame) if frame is not None else None
+
+
+class StackSampler:
+    """
+    Samples one thread's stack every `interval` seconds from a background thread.
+
+    Pure Python (sys._current_frames), so it needs no extra packages and sees
+    whatever the thread runs: our code, regexes, json, SQLAlchemy (including
+    its greenlet-based async bridge). It cannot see into C functions, which
+    show up as the Python line that called them.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stack = thread_stack(self.thread_id)
+            if stack:
+                self.samples[stack] += 1
+
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")[:60] or "root"
+
+
+class RequestProfiler:
+    """
+    Profiles a sample of requests (`sample_rate`, or any carrying `header`)
+    with a StackSampler on the event loop thread, `max_concurrent` at a time.
+
+    Each profile is written to `directory` as a .folded file (one "stack count"
+    line per distinct stack, for flamegraph.pl, speedscope or inferno) and
+    listed in index.jsonl with its path, status and duration. Requests that run
+    concurrently on the same loop show up in each other's profiles.
+    """
+
+    def __init__(self, directory: str = "profiles", sample_rate: float = 0.0, header: str = "x-profile",
+                 interval: float = 0.005, max_concurrent: int = 2):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.header = header.lower()
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.profiled = 0
+        self.skipped = 0  # selected but over max_concurrent
+        self._seen = 0
+
+    def wanted(self, headers) -> bool:
+        """Whether to profile a request: it asked to, or it falls in the sample."""
+        if self.header and headers.get(self.header, "").lower() in ("1", "true", "yes"):
+            return True
+        if self.sample_rate <= 0:
+            return False
+        # Deterministic sampling: every request that pushes seen * rate past a whole number
+        self._seen += 1
+        return int(self._seen * self.sample_rate) > int((self._seen - 1) * self.sample_rate)
+
+    def begin(self, method: str, path: str) -> Optional[dict]:
+        """Start sampling the current (event loop) thread; None when max_concurrent profiles run already."""
+        if self.active >= self.max_concurrent:
+            self.skipped += 1
+            return None
+        self.active += 1
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        return {
+            "sampler": sampler,
+            "file": f"{stamp}-{method.lower()}-{_slug(path)}.folded",
+            "method": method,
+            "path": path,
+            "started": time.perf_counter(),
+        }
+
+    async def finish(self, profile: dict, status: int):
+        """Stop sampling and write the profile (in a thread: the loop is what we are measuring)."""
+        samples = await asyncio.to_thread(profile["sampler"].stop)
+        self.active -= 1
+        self.profiled += 1
+        entry = {
+            "file": profile["file"],
+            "method": profile["method"],
+            "path": profile["path"],
+            "status": status,
+            "ms": round((time.perf_counter() - profile["started"]) * 1000, 1),
+            "samples": sum(samples.values()),
+            "at": datetime.utcnow().isoformat(),
+        }
+        await asyncio.to_thread(self._write, entry, samples)
+        return entry
+
+    def _write(self, entry: dict, samples: Counter):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, entry["file"]), "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.directory, "index.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def stats(self) -> dict:
+        return {
+            "directory": os.path.abspath(self.directory),
+            "sample_rate": self.sample_rate,
+            "active": self.active,
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+        }
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and catches callbacks that block the loop.
+
+    A heartbeat task sleeps `interval` seconds at a time; how late it wakes up
+    is the loop's lag. A watchdog thread checks the heartbeat, and once it is
+    more than `block_threshold` seconds overdue samples the loop thread's stack
+    until the loop comes back. Each such block is kept (the last `keep`) with
+    its duration and the stack seen most often while blocked: the culprit.
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.1, keep: int = 50,
+                 sample_interval: float = 0.01):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.sample_interval = sample_interval
+        self.lags = deque(maxlen=600)  # last minute at the default interval
+        self.max_lag = 0.0
+        self.blocks = deque(maxlen=keep)
+        self.blocked_total = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    async def _beat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._heartbeat = now
+
+    def _watch(self):
+        samples = None
+        blocked_since = None
+        while not self._stop.wait(self.sample_interval):
+            overdue = time.monotonic() - self._heartbeat - self.interval
+            if overdue > self.block_threshold:
+                if samples is None:
+                    samples = Counter()
+                    blocked_since = self._heartbeat + self.interval
+                stack = thread_stack(self._loop_thread)
+                if stack:
+                    samples[stack] += 1
+            elif samples is not None:
+                self._record_block(blocked_since, samples)
+                samples = None
+
+    def _record_block(self, blocked_since: float, samples: Counter):
+        # The heartbeat has just resumed: it is the end of the block
+        seconds = self._heartbeat - blocked_since
+        stack, _ = samples.most_common(1)[0] if samples else ("", 0)
+        culprit = stack.rsplit(";", 1)[-1]
+        self.blocked_total += 1
+        self.blocks.append({
+            "at": datetime.utcnow().isoformat(),
+            "ms": round(seconds * 1000, 1),
+            "culprit": culprit,
+            "stack": stack.split(";") if stack else [],
+            "samples": sum(samples.values()),
+        })
+        print(f"⚠️ Event loop blocked for {seconds * 1000:.0f} ms in {culprit or 'unknown'}")
+
+    def start(self):
+        """Start monitoring the running loop (call from a coroutine on that loop)."""
+        if self._task is None:
+            self._loop_thread = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._stop.clear()
+            self._task = asyncio.create_task(self._beat())
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stop.set()
+            await asyncio.to_thread(self._watchdog.join)
+
+    def stats(self, blocks: int = 5) -> dict:
+        lags = sorted(self.lags)
+        return {
+            "lag_ms": {
+                "last": round(self.lags[-1] * 1000, 2) if lags else None,
+                "avg": round(sum(lags) / len(lags) * 1000, 2) if lags else None,
+                "p99": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else None,
+                "max": round(self.max_lag * 1000, 2),
+            },
+            "blocked": self.blocked_total,
+            "recent_blocks": list(self.blocks)[-blocks:] if blocks else [],
+        }
@@ -0,0 +1,137 @@
+"""
+In-process fan-out of company change events to subscribers (the /ws WebSocket)
+"""
+import asyncio
+from datetime import datetime
+from typing import Iterable, Optional
+
+from cache import normalize_query
+from snapshots import CHANGE_KINDS
+
+
+class Subscription:
+    """
+    One subscriber's filter and bounded queue of pending events.
+
+    The filter matches events for any of `companies` or any of `industries`
+    (either empty = no restriction on that side; both empty = everything) and
+    keeps only the change kinds in `changes` (empty = all of CHANGE_KINDS).
+    A slow consumer never blocks publish(): when its queue is full the oldest
+    event is dropped, and the next get() returns a {"type": "lagged"} notice
+    with the number dropped so the client knows to re-fetch.
+    """
+
+    def __init__(self, max_queue: int = 100, companies: Iterable[str] = (), industries: Iterable[str] = (),
+                 changes: Iterable[str] = ()):
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.set_filter(companies, industries, changes)
+        self.lagged = 0  # dropped since the last lagged notice
+        self.dropped = 0
+        self.delivered = 0
+
+    def set_filter(self, companies: Iterable[str] = (), industries: Iterable[str] = (), changes: Iterable[str] = ()):
+        changes = set(changes)
+        unknown = changes - set(CHANGE_KINDS)
+        if unknown:
+            raise ValueError(f"unknown change kinds {sorted(unknown)}, expected some of {list(CHANGE_KINDS)}")
+        self.companies = {normalize_query(name) for name in companies if name.strip()}
+        self.industries = {normalize_query(name) for name in industries if name.strip()}
+        self.changes = changes
+
+    def describe_filter(self) -> dict:
+        return {
+            "companies": sorted(self.companies),
+            "industries": sorted(self.industries),
+            "changes": sorted(self.changes) or list(CHANGE_KINDS),
+        }
+
+    def select(self, event: dict) -> Optional[dict]:
+        """The event as this subscriber should see it (unrequested change kinds removed), or None."""
+        if self.companies or self.industries:
+            industries = {event["industry"]}
+            if "industry" in event["changes"]:
+                industries.add(event["changes"]["industry"]["old"])
+            if normalize_query(event["company"]) not in self.companies and not any(
+                industry and normalize_query(industry) in self.industries for industry in industries
+            ):
+                return None
+        if not self.changes:
+            return event
+        changes = {kind: value for kind, value in event["changes"].items() if kind in self.changes}
+        return {**event, "changes": changes} if changes else None
+
+    def offer(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.lagged += 1
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        """Next event for this subscriber, preceded by a lagged notice if events were dropped."""
+        if self.lagged:
+            notice = {"type": "lagged", "dropped": self.lagged}
+            self.lagged = 0
+            return notice
+        event = await self.queue.get()
+        self.delivered += 1
+        return event
+
+
+class ChangeHub:
+    """Publishes change events to every matching subscription; publish() never waits on a subscriber."""
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscriptions = set()
+        self.sequence = 0
+        self.published = 0
+        self.fanned_out = 0
+        self._dropped_by_gone = 0  # events dropped for subscribers that have since unsubscribed
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, companies: Iterable[str] = (), industries: Iterable[str] = (),
+                  changes: Iterable[str] = ()) -> Subscription:
+        subscription = Subscription(self.max_queue, companies, industries, changes)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.discard(subscription)
+            self._dropped_by_gone += subscription.dropped
+
+    def publish(self, company: str, industry: str, action: str, changes: dict) -> int:
+        """Queue a {"type": "change", ...} event for matching subscribers; returns how many got it."""
+        if not changes:
+            return 0
+        self.sequence += 1
+        self.published += 1
+        event = {
+            "type": "change",
+            "seq": self.sequence,
+            "company": company,
+            "industry": industry,
+            "action": action,
+            "changes": changes,
+            "at": datetime.utcnow().isoformat(),
+        }
+        delivered = 0
+        for subscription in list(self._subscriptions):
+            selected = subscription.select(event)
+            if selected is not None:
+                subscription.offer(selected)
+                delivered += 1
+        self.fanned_out += delivered
+        return delivered
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "fanned_out": self.fanned_out,
+            "queued": sum(s.queue.qsize() for s in self._subscriptions),
+            "dropped": self._dropped_by_gone + sum(s.dropped for s in self._subscriptions),
+        }
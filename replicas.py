@@ -0,0 +1,85 @@
+"""
+Round-robin routing of read-only sessions across PostgreSQL read replicas
+"""
+import asyncio
+
+from sqlalchemy import exc as sa_exc, text
+
+from circuit_breaker import CircuitBreaker
+
+# Errors that mean "this server is unreachable", as opposed to a bad query
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    sa_exc.InterfaceError,
+    sa_exc.OperationalError,
+    sa_exc.TimeoutError,
+)
+
+
+class ReplicaRouter:
+    """
+    Hands out replica engines round-robin.
+
+    Each replica has a CircuitBreaker: a connection failure takes it out of
+    rotation, and after `reset_timeout` seconds a SELECT 1 health probe decides
+    whether it rejoins. pick() returns (None, None) when no replica is usable,
+    so callers fall back to the primary.
+    """
+
+    def __init__(self, engines: list, failure_threshold: int = 1, reset_timeout: float = 10.0,
+                 probe_timeout: float = 2.0):
+        self.replicas = [
+            (engine, CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout))
+            for engine in engines
+        ]
+        self.probe_timeout = probe_timeout
+        self._next = 0
+        self.reads = [0] * len(engines)
+
+    async def pick(self):
+        """(engine, breaker) of the next healthy replica, or (None, None)."""
+        for _ in range(len(self.replicas)):
+            index = self._next % len(self.replicas)
+            self._next += 1
+            engine, breaker = self.replicas[index]
+            if not breaker.allow():
+                continue
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                try:
+                    healthy = await self.probe(engine)
+                except BaseException:
+                    breaker.record_failure()  # cancelled probe: keep the breaker moving
+                    raise
+                if not healthy:
+                    breaker.record_failure()
+                    continue
+                breaker.record_success()
+                print(f"✅ Read replica {engine.url.host} is back in rotation")
+            self.reads[index] += 1
+            return engine, breaker
+        return None, None
+
+    async def probe(self, engine) -> bool:
+        try:
+            async def ping():
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            await asyncio.wait_for(ping(), timeout=self.probe_timeout)
+            return True
+        except Exception:
+            return False
+
+    def mark_failed(self, breaker: CircuitBreaker, engine, error: Exception):
+        breaker.record_failure()
+        print(f"⚠️ Read replica {engine.url.host} failed ({error!r}); using other replicas or the primary")
+
+    def stats(self) -> list:
+        return [
+            {"host": engine.url.host, "reads": reads, **breaker.stats()}
+            for (engine, breaker), reads in zip(self.replicas, self.reads)
+        ]
+
+    async def dispose(self):
+        for engine, _ in self.replicas:
+            await engine.dispose()
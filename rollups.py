@@ -0,0 +1,107 @@
+"""
+Per-industry aggregates maintained incrementally from company writes
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Sections of company data whose numeric values are aggregated per industry
+METRIC_SECTIONS = ("key_metrics", "financial_highlights")
+
+_NUMBER = re.compile(
+    r"^\s*\$?\s*(-?[0-9][0-9,]*(?:\.[0-9]+)?)\s*(trillion|billion|million|thousand|T|B|M|K)?\s*$",
+    re.IGNORECASE,
+)
+_SCALE = {"trillion": 1e12, "t": 1e12, "billion": 1e9, "b": 1e9, "million": 1e6, "m": 1e6, "thousand": 1e3, "k": 1e3}
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Numeric value of a metric such as 120, "1,200" or "$3.5 billion"; None if it is not a number."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    match = _NUMBER.match(value)
+    if not match:
+        return None
+    number = float(match.group(1).replace(",", ""))
+    unit = match.group(2)
+    return number * _SCALE[unit.lower()] if unit else number
+
+
+def contribution(data: Any, last_updated: Optional[datetime]) -> dict:
+    """What one company adds to its industry's rollup."""
+    metrics = {}
+    news = 0
+    if isinstance(data, dict):
+        for section in METRIC_SECTIONS:
+            values = data.get(section)
+            if isinstance(values, dict):
+                for key, value in values.items():
+                    number = parse_number(value)
+                    if number is not None:
+                        metrics[key] = number
+        if isinstance(data.get("recent_news"), list):
+            news = len(data["recent_news"])
+    return {
+        "companies": 1,
+        "news": news,
+        "metrics": metrics,
+        "updated": last_updated.timestamp() if last_updated else 0.0,
+        "last_updated": last_updated,
+    }
+
+
+def empty_delta() -> dict:
+    return {"companies": 0, "news": 0, "metrics": {}, "updated": 0.0, "last_updated": None}
+
+
+def add(delta: dict, part: dict, sign: int = 1):
+    """Fold a company contribution into `delta` (sign=-1 removes it)."""
+    delta["companies"] += sign * part["companies"]
+    delta["news"] += sign * part["news"]
+    delta["updated"] += sign * part["updated"]
+    for key, value in part["metrics"].items():
+        total, count = delta["metrics"].get(key, (0.0, 0))
+        delta["metrics"][key] = (total + sign * value, count + sign)
+    if sign > 0 and part["last_updated"] and (
+        delta["last_updated"] is None or part["last_updated"] > delta["last_updated"]
+    ):
+        delta["last_updated"] = part["last_updated"]
+
+
+def merge_metrics(stored: Dict[str, list], delta: Dict[str, tuple]) -> Dict[str, list]:
+    """Apply per-metric (sum, count) changes to a stored {metric: [sum, count]} map."""
+    merged = {key: list(value) for key, value in (stored or {}).items()}
+    for key, (total, count) in delta.items():
+        current = merged.get(key, [0.0, 0])
+        current = [current[0] + total, current[1] + count]
+        if current[1] > 0:
+            merged[key] = current
+        else:
+            merged.pop(key, None)
+    return merged
+
+
+def summarize(industry: str, company_count: int, news_count: int, metrics: Dict[str, list],
+              updated_sum: float, newest_update: Optional[datetime], refreshed_at: Optional[datetime],
+              now: Optional[datetime] = None) -> dict:
+    """Readable rollup: counts, per-metric sum/avg and freshness."""
+    now = now or datetime.utcnow()
+    average_age = None
+    if company_count:
+        average_age = round((now.timestamp() - updated_sum / company_count) / 3600, 2)
+    return {
+        "industry": industry,
+        "company_count": company_count,
+        "news_count": news_count,
+        "metrics": {
+            key: {"companies": count, "sum": total, "avg": total / count}
+            for key, (total, count) in sorted((metrics or {}).items())
+        },
+        "newest_update": newest_update.isoformat() if newest_update else None,
+        "average_age_hours": average_age,
+        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+    }
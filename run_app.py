@@ -2,25 +2,148 @@
 """
 Startup script for the async Fleet application
 """
+import argparse
 import asyncio
+import gc
+import os
+import signal
+import socket
+import time
+import traceback
 import uvicorn
-from app import app
+from app import app, config, preload_agent_modules
+from database import preload_shared_state
+
+# A worker that exits sooner than this after starting is crash-looping: restarts back off
+STABLE_UPTIME = 60
+
+# Longest wait before restarting a crash-looping worker
+MAX_RESTART_DELAY = 30
 
 async def run_main_app():
     """Run the main console application"""
     from main import run_system
     await run_system()
 
-def run_web_app():
-    """Run the FastAPI web application"""
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+def run_web_app(workers: int = None):
+    """Run the FastAPI web application; more than one worker forks a pre-warmed process per worker"""
+    host = getattr(config, "WEB_HOST", "0.0.0.0")
+    port = getattr(config, "WEB_PORT", 8000)
+    workers = workers or getattr(config, "WEB_WORKERS", 1)
+    if workers <= 1 or not hasattr(os, "fork"):
+        uvicorn.run(app, host=host, port=port)
+    else:
+        run_forked(workers, host, port)
+
+def run_forked(workers: int, host: str, port: int):
+    """
+    Pre-fork mode: bind the socket and build shared read-only state (the agent
+    stack's imports, typeahead index, data codec) once, then fork `workers`
+    uvicorn servers that accept on the same socket. Children share that state
+    copy-on-write and only initialize their own connections, teams and queues.
+    uvicorn's own --workers spawns fresh interpreters instead, which would redo
+    all of it per worker.
+
+    Query and /chat caches stay per worker; each worker notices the others'
+    writes through the shared data version (database.sync_data_version)
+    within DATA_VERSION_CHECK_INTERVAL seconds.
+
+    A worker that dies is restarted, after a delay that doubles while it keeps
+    dying within STABLE_UPTIME seconds; after WEB_WORKER_MAX_RESTARTS such
+    crashes in a row it stays down.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(getattr(config, "WEB_BACKLOG", 2048))
+    sock.set_inheritable(True)
+
+    if getattr(config, "WEB_PRELOAD", True):
+        preload_agent_modules()
+        try:
+            print(f"Preloaded shared state: {asyncio.run(preload_shared_state())}")
+        except Exception as e:
+            print(f"Preload failed, workers will load on their own: {e}")
+    # Keep the GC from touching (and so copying) every preloaded object in each child
+    gc.freeze()
+
+    children = {}  # pid -> worker index
+    started = {}  # worker index -> when it was last started
+    crashes = {}  # worker index -> consecutive exits within STABLE_UPTIME
+    max_restarts = getattr(config, "WEB_WORKER_MAX_RESTARTS", 5)
+    stopping = False
+
+    def spawn(worker: int):
+        pid = os.fork()
+        if pid == 0:
+            # Own process group: a terminal Ctrl-C reaches the parent only, which stops workers once
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.environ["WEB_WORKER_INDEX"] = str(worker)
+            code = 0
+            try:
+                server = uvicorn.Server(uvicorn.Config(app, lifespan="on"))
+                server.run(sockets=[sock])
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                # Never return into the parent's supervision loop
+                os._exit(code)
+        children[pid] = worker
+        started[worker] = time.monotonic()
+        print(f"Started web worker {worker} (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for worker in range(workers):
+        spawn(worker)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        worker = children.pop(pid, None)
+        if worker is None or stopping:
+            continue
+        if time.monotonic() - started[worker] < STABLE_UPTIME:
+            crashes[worker] = crashes.get(worker, 0) + 1
+        else:
+            crashes[worker] = 1
+        if crashes[worker] > max_restarts:
+            print(f"❌ Web worker {worker} (pid {pid}) exited with status {status} "
+                  f"{crashes[worker]} times in a row right after starting; not restarting it")
+            continue
+        delay = min(2 ** (crashes[worker] - 1), MAX_RESTART_DELAY)
+        print(f"Web worker {worker} (pid {pid}) exited with status {status}, restarting in {delay}s")
+        time.sleep(delay)
+        if not stopping:
+            spawn(worker)
+    sock.close()
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) > 1 and sys.argv[1] == "console":
+    parser = argparse.ArgumentParser(description="Start the Fleet application")
+    parser.add_argument("mode", nargs="?", choices=["web", "console"], default="web")
+    parser.add_argument("--workers", type=int, help="web server processes (default: Config.WEB_WORKERS)")
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.mode == "console":
         print("Starting console application...")
         asyncio.run(run_main_app())
     else:
         print("Starting web application...")
-        run_web_app()
+        run_web_app(args.workers)
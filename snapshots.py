@@ -0,0 +1,144 @@
+"""
+JSON deltas and content hashes for company data
+"""
+import copy
+import hashlib
+import json
+from typing import Any, Dict, List
+
+
+def content_hash(data: Any) -> str:
+    """Stable SHA-256 of a JSON document (key order does not matter)."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# Keys whose values change on every scrape without the content changing
+VOLATILE_KEYS = frozenset({"scraped_at", "extracted_at", "last_updated"})
+
+
+def _without_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _without_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_without_volatile(v) for v in value]
+    return value
+
+
+def payload_hash(industry: Any, data: Any) -> str:
+    """Hash of a company write with VOLATILE_KEYS removed at every level; equal hashes mean a no-op write."""
+    return content_hash({"industry": industry, "data": _without_volatile(data)})
+
+
+def diff(old: Any, new: Any) -> Dict[str, List]:
+    """
+    Delta turning `old` into `new`.
+
+    Dicts are compared key by key; any other changed value (including lists)
+    is replaced wholesale. The result is {"set": [[path, value], ...],
+    "unset": [path, ...]} where each path is a list of keys.
+    """
+    delta = {"set": [], "unset": []}
+    _diff(old, new, [], delta)
+    return delta
+
+
+def _diff(old: Any, new: Any, path: list, delta: dict):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                delta["unset"].append(path + [key])
+        for key, value in new.items():
+            if key not in old:
+                delta["set"].append([path + [key], value])
+            elif old[key] != value:
+                _diff(old[key], value, path + [key], delta)
+    elif old != new:
+        delta["set"].append([path, new])
+
+
+def apply_delta(base: Any, delta: dict) -> Any:
+    """Return a copy of `base` with `delta` (from diff) applied."""
+    result = copy.deepcopy(base)
+    for path in delta.get("unset", []):
+        parent = _walk(result, path[:-1])
+        if isinstance(parent, dict):
+            parent.pop(path[-1], None)
+    for path, value in delta.get("set", []):
+        if not path:
+            result = copy.deepcopy(value)
+            continue
+        parent = _walk(result, path[:-1], create=True)
+        parent[path[-1]] = copy.deepcopy(value)
+    return result
+
+
+def _walk(document: Any, path: list, create: bool = False):
+    node = document
+    for key in path:
+        if create and not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node.get(key) if isinstance(node, dict) else None
+        if node is None:
+            return None
+    return node
+
+
+# Sections of company data compared metric by metric in describe_change
+METRIC_SECTIONS = ("key_metrics", "financial_highlights")
+
+# List of news items in company data; items are told apart by url, then headline
+NEWS_KEY = "recent_news"
+
+# Kinds of change describe_change reports (also the values /ws subscribers filter on)
+CHANGE_KINDS = ("industry", "news", "metrics", "fields")
+
+
+def _news_id(item: Any) -> str:
+    if isinstance(item, dict) and (item.get("url") or item.get("headline")):
+        return str(item.get("url") or item.get("headline"))
+    return content_hash(_without_volatile(item))
+
+
+def _items(data: Any, key: str) -> list:
+    value = data.get(key) if isinstance(data, dict) else None
+    return value if isinstance(value, list) else []
+
+
+def describe_change(old_industry: Any, old_data: Any, new_industry: Any, new_data: Any) -> Dict[str, Any]:
+    """
+    What a company write changed, in domain terms (old_data None = new company).
+
+    Returns only the kinds that changed, out of {"industry": {"old", "new"},
+    "news": [items not in the old data], "metrics": {"section.key": {"old",
+    "new"}}, "fields": [other top-level keys that changed]}. VOLATILE_KEYS
+    are ignored, so a re-scrape of the same content describes no change.
+    """
+    old = _without_volatile(old_data if isinstance(old_data, dict) else {})
+    new = _without_volatile(new_data if isinstance(new_data, dict) else {})
+    change = {}
+    if old_industry != new_industry:
+        change["industry"] = {"old": old_industry, "new": new_industry}
+
+    old_news = {_news_id(item) for item in _items(old_data, NEWS_KEY)}
+    news = [item for item in _items(new_data, NEWS_KEY) if _news_id(item) not in old_news]
+    if news:
+        change["news"] = news
+
+    metrics = {}
+    for section in METRIC_SECTIONS:
+        before = old.get(section) if isinstance(old.get(section), dict) else {}
+        after = new.get(section) if isinstance(new.get(section), dict) else {}
+        for key in list(before) + [key for key in after if key not in before]:
+            if before.get(key) != after.get(key):
+                metrics[f"{section}.{key}"] = {"old": before.get(key), "new": after.get(key)}
+    if metrics:
+        change["metrics"] = metrics
+
+    fields = [
+        key for key in list(old) + [key for key in new if key not in old]
+        if key not in METRIC_SECTIONS and key != NEWS_KEY and old.get(key) != new.get(key)
+    ]
+    if fields:
+        change["fields"] = fields
+    return change
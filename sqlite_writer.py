@@ -0,0 +1,86 @@
+"""
+Single writer task that serializes and group-commits SQLite writes
+"""
+import asyncio
+
+
+class SQLiteWriter:
+    """
+    Single writer task for the production profile.
+
+    Write jobs (async callables taking a session) are queued and executed one
+    at a time on the dedicated write connection. Jobs that are already queued
+    when the writer wakes up share one transaction (group commit), each inside
+    its own savepoint so a failing job does not abort the others.
+    """
+
+    def __init__(self, session_maker, max_batch=64):
+        self._session_maker = session_maker
+        self._max_batch = max_batch
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    async def submit(self, job):
+        """Queue `job` and wait until the transaction containing it has committed."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def stop(self):
+        """Finish every queued job, then stop the writer task."""
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self._max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._commit(batch)
+            except BaseException as e:
+                # Opening the session or rolling back failed: no job of the batch may wait forever
+                for _, future in batch:
+                    if not future.done():
+                        if isinstance(e, Exception):
+                            future.set_exception(e)
+                        else:
+                            future.cancel()
+                if not isinstance(e, Exception):
+                    raise
+                print(f"⚠️ SQLite write batch failed: {e!r}")
+
+    async def _commit(self, batch):
+        outcomes = []
+        async with self._session_maker() as session:
+            try:
+                for job, future in batch:
+                    try:
+                        async with session.begin_nested():
+                            outcomes.append((future, await job(session), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                outcomes = [(future, None, e) for _, future in batch]
+
+        for future, value, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
@@ -5,12 +5,22 @@ Test script to verify database connection and basic functionality
 import asyncio
 import sys
 import os
+import time
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import init_db, store_data, query_db, close_db
+from database import (
+    init_db, store_data, store_many, query_db, query_page, filter_companies, get_query_cache,
+    get_company_version, get_company_history, get_industry_rollup, rebuild_industry_rollups, close_db,
+    add_watch, remove_watch, list_watchlist, sync_industry_watches, watch_freshness, get_change_hub,
+    get_data_version, sync_data_version,
+)
+from cache import QueryCache
+from circuit_breaker import CircuitBreaker
+from codec import DataCodec, zstandard
 from config import Config
+import database
 
 async def test_database():
     """Test database connectivity and basic operations"""
@@ -42,6 +52,163 @@ async def test_database():
         results = await query_db("Technology")
         print(f"✓ Industry search results: {results}")
         
+        # Test 5: Bulk store
+        print("5. Bulk storing test data...")
+        records = [
+            {"company_name": f"Bulk Test Company {i}", "industry": "Technology", "data": test_data}
+            for i in range(25)
+        ]
+        result = await store_many(records, batch_size=10)
+        # Rows left by an earlier run are skipped as unchanged
+        assert result["status"] == "success" and result["written"] + result["skipped"] == 25, result
+        print(f"✓ Bulk store: {result['written']} written, {result['skipped']} unchanged in {result['batches']} batches")
+        
+        # Test 6: Search inside company data
+        print("6. Searching summaries...")
+        await store_data("Search Test Company", "Energy", {"summary": "Offshore wind turbine developer"})
+        results = await query_db("turbine")
+        assert any(r["name"] == "Search Test Company" for r in results), results
+        print(f"✓ Full-text search results: {[r['name'] for r in results]}")
+        
+        # Test 7: Filter inside company data
+        print("7. Filtering on JSON paths...")
+        await store_data("Filter Test Company", "Energy", {"key_metrics": {"market_cap": "$2 billion"}})
+        results = await filter_companies(industry="Energy", has=["key_metrics.market_cap"])
+        assert [r["name"] for r in results] == ["Filter Test Company"], results
+        print(f"✓ JSON filter results: {[r['name'] for r in results]}")
+        
+        # Test 8: Query cache
+        print("8. Checking query cache...")
+        hits = get_query_cache().hits
+        await query_db("Cache Test Company")
+        await query_db("cache test company ")
+        assert get_query_cache().hits == hits + 1
+        await store_data("Cache Test Company", "Technology", test_data)
+        assert any(r["name"] == "Cache Test Company" for r in await query_db("Cache Test Company"))
+        print(f"✓ Query cache: {get_query_cache().stats()}")
+        
+        # Test 9: Paginated, projected search
+        print("9. Paging through bulk results...")
+        names, cursor = [], None
+        while True:
+            page = await query_page("Bulk Test Company", limit=10, after=cursor, fields=["industry"])
+            names += [r["name"] for r in page["results"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert len(names) == len(set(names)) == 25, names
+        assert set(page["results"][0]) == {"name", "industry"}
+        print(f"✓ Paginated search: {len(names)} companies")
+        
+        # Test 10: Snapshot history
+        print("10. Rebuilding snapshot history...")
+        for revenue in ["$1B", "$1B", "$2B", "$3B"]:
+            await store_data("History Test Company", "Technology", {**test_data, "revenue": revenue})
+        history = await get_company_history("History Test Company")
+        assert [v["data"]["revenue"] for v in history][-3:] == ["$1B", "$2B", "$3B"], history
+        first = await get_company_version("History Test Company", version=history[-3]["version"])
+        assert first["data"]["revenue"] == "$1B"
+        print(f"✓ Snapshot history: {len(history)} versions")
+        
+        # Test 11: No-op writes are skipped
+        print("11. Re-storing unchanged data...")
+        result = await store_data("History Test Company", "Technology", {**test_data, "revenue": "$3B"})
+        assert result["action"] == "unchanged", result
+        print(f"✓ Unchanged write skipped: {result}")
+        
+        # Test 12: Industry rollups follow writes
+        print("12. Checking industry rollups...")
+        await store_data("Rollup Test Company A", "Rollup Test", {"key_metrics": {"employees": "100"}})
+        await store_data("Rollup Test Company B", "Rollup Test", {"key_metrics": {"employees": "300"}})
+        await store_data("Rollup Test Company B", "Rollup Test", {"key_metrics": {"employees": "500"}})
+        rollup = await get_industry_rollup("Rollup Test")
+        assert rollup["company_count"] == 2, rollup
+        assert rollup["metrics"]["employees"]["avg"] == 300, rollup
+        print(f"✓ Industry rollup: {rollup['company_count']} companies, avg employees {rollup['metrics']['employees']['avg']}")
+        
+        # Test 13: Watching an industry watches its companies
+        print("13. Maintaining the watchlist...")
+        result = await add_watch("industry", "Rollup Test", interval=600)
+        assert result["status"] == "success", result
+        assert await sync_industry_watches() == 2
+        watched = {item["name"]: item for item in await list_watchlist()}
+        assert watched["Rollup Test Company A"]["source"] == "Rollup Test", watched
+        freshness = await watch_freshness([("company", "Rollup Test Company A"), ("industry", "Rollup Test")])
+        assert not any(freshness.values()), freshness  # watched but not refreshed yet
+        result = await remove_watch("industry", "Rollup Test")
+        assert result["removed"] == 3, result
+        print(f"✓ Watchlist: industry expanded to 2 companies, removed {result['removed']} items")
+        
+        # Test 14: Writes publish what changed to subscribers
+        print("14. Publishing change events...")
+        news = [{"headline": "Feed Test launches", "url": "https://example.com/launch"}]
+        await store_data("Feed Test Company", "Feed Test Old", {"key_metrics": {"revenue": "$1B"}, "recent_news": news})
+        subscription = get_change_hub().subscribe(companies=["feed test company"], changes=["news", "metrics", "industry"])
+        news = news + [{"headline": "Feed Test expands", "url": "https://example.com/expand"}]
+        await store_data("Feed Test Company", "Feed Test", {"key_metrics": {"revenue": "$2B"}, "recent_news": news})
+        await store_data("Other Feed Test Company", "Feed Test", {"key_metrics": {"revenue": "$5B"}})
+        get_change_hub().unsubscribe(subscription)
+        assert subscription.queue.qsize() == 1, subscription.queue.qsize()
+        changes = subscription.queue.get_nowait()["changes"]
+        assert changes["industry"] == {"old": "Feed Test Old", "new": "Feed Test"}, changes
+        assert [item["headline"] for item in changes["news"]] == ["Feed Test expands"], changes
+        assert changes["metrics"] == {"key_metrics.revenue": {"old": "$1B", "new": "$2B"}}, changes
+        print(f"✓ Change event: {sorted(changes)}")
+        
+        # Test 15: Concurrent writers keep the incremental rollups exact
+        print("15. Writing one company concurrently...")
+        industries = ["Race Test A", "Race Test B"]
+        writes = [
+            store_data("Race Test Company", industries[i % 2], {"key_metrics": {"employees": str(100 * (i + 1))}})
+            for i in range(10)
+        ] + [
+            store_many([{"company_name": "Race Test Company", "industry": industries[i % 2],
+                         "data": {"key_metrics": {"employees": str(7 * (i + 1))}}}])
+            for i in range(5)
+        ]
+        results = await asyncio.gather(*writes)
+        assert all(r["status"] == "success" for r in results), results
+        incremental = [await get_industry_rollup(industry) for industry in industries]
+        await rebuild_industry_rollups()
+        rebuilt = [await get_industry_rollup(industry) for industry in industries]
+        for a, b in zip(incremental, rebuilt):
+            assert (a["company_count"], a["metrics"]) == (b["company_count"], b["metrics"]), (a, b)
+        print(f"✓ Rollups match a rebuild: {[r['company_count'] for r in rebuilt]} companies")
+        
+        # Test 16: Compressed rows stay searchable by their news summaries
+        print("16. Searching a compressed row...")
+        if zstandard is None:
+            print("- Skipped: zstandard is not installed")
+        else:
+            news = [{"headline": "Drilling update", "summary": "Compression Test Energy starts a geothermal plant",
+                     "url": "https://example.com/plant"}]
+            codec = database._data_codec
+            database._data_codec = DataCodec(enabled=True, threshold=0)
+            try:
+                await store_data("Compression Test Company", "Energy", {"summary": "Utility", "recent_news": news})
+            finally:
+                database._data_codec = codec
+            results = await query_db("geothermal")
+            assert any(r["name"] == "Compression Test Company" for r in results), results
+            stored = next(r for r in results if r["name"] == "Compression Test Company")
+            assert stored["data"]["recent_news"][0]["url"] == "https://example.com/plant", stored
+            print(f"✓ Compressed row found by news summary: {[r['name'] for r in results]}")
+        
+        # Test 17: A write outside store_data (e.g. another worker's) retires cached results and answers
+        print("17. Invalidating caches after a write from elsewhere...")
+        await store_data("Version Test Company", "Technology", {"summary": "Old summary"})
+        answers = QueryCache()  # keyed like the /chat cache in app.py
+        answers.put("version test", {"response": "old answer"}, variant=await sync_data_version(max_age=0))
+        assert (await query_db("Version Test Company"))[0]["data"]["summary"] == "Old summary"
+        # Bypasses store_data, so nothing in this process invalidates its caches directly
+        await database._run_write(lambda session: database._store_company(
+            session, "Version Test Company", "Technology", {"summary": "New summary"}
+        ))
+        await sync_data_version(max_age=0)
+        assert answers.get("version test", variant=get_data_version()) is None
+        assert (await query_db("Version Test Company"))[0]["data"]["summary"] == "New summary"
+        print(f"✓ Data version after the write: {get_data_version()}")
+        
         print("\n✅ All database tests passed!")
         
     except Exception as e:
@@ -72,6 +239,33 @@ async def test_config():
         print(f"❌ Configuration test failed: {e}")
         return False
 
+def test_circuit_breaker():
+    """Walk the circuit breaker through its states"""
+    print("Testing circuit breaker...")
+    try:
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow()  # one probe at a time
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN and breaker.trips == 2
+        time.sleep(0.06)
+        assert breaker.allow()
+        # The probe is cancelled and never reports: another one goes through later
+        time.sleep(0.06)
+        assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+        print(f"✓ Breaker stats: {breaker.stats()}")
+        return True
+    except AssertionError as e:
+        print(f"❌ Circuit breaker test failed: {e!r}")
+        return False
+
 if __name__ == "__main__":
     print("=== Fleet Application Database Test ===\n")
     
@@ -81,6 +275,10 @@ if __name__ == "__main__":
         if not config_ok:
             return
         
+        print()
+        if not test_circuit_breaker():
+            return
+        
         print()
         # Test database
         db_ok = await test_database()
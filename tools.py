@@ -1,17 +1,28 @@
-from tavily import TavilyClient
 from config import Config
+from tracing import traced
 import asyncio
-import httpx
 
 config = Config()
-tavily_client = TavilyClient(api_key=config.TAVILY_API_KEY)
 
+# Created on first search (see get_tavily_client), so importing tools has no side effects
+_tavily_client = None
+
+def get_tavily_client():
+    """Return the Tavily client, importing the SDK and creating it on first use"""
+    global _tavily_client
+    if _tavily_client is None:
+        from tavily import TavilyClient
+        _tavily_client = TavilyClient(api_key=config.TAVILY_API_KEY)
+    return _tavily_client
+
+@traced("tool.search_web", record=("query",))
 async def search_web(query: str) -> dict:
     """Async wrapper for web search using Tavily API"""
+    client = get_tavily_client()
     loop = asyncio.get_event_loop()
     # Run the blocking Tavily call in a thread pool
     result = await loop.run_in_executor(
         None, 
-        lambda: tavily_client.search(query, max_results=5)
+        lambda: client.search(query, max_results=5)
     )
     return result
\ No newline at end of file
@@ -0,0 +1,454 @@
+"""
+Request tracing: spans linked through contextvars, exported to JSONL or an OTLP/HTTP collector
+"""
+import argparse
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Span the running code belongs to (None = not traced); asyncio tasks inherit it from their creator
+_current: ContextVar = ContextVar("trace_span", default=None)
+
+# Process-wide tracer set by configure(); None = tracing off and every helper is a no-op
+_tracer = None
+
+# Longest string attribute kept on a span
+MAX_ATTRIBUTE_LENGTH = 200
+
+
+def _attribute(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= MAX_ATTRIBUTE_LENGTH else text[:MAX_ATTRIBUTE_LENGTH] + "..."
+
+
+class Span:
+    """One timed operation in a trace; `parent_id` links it to the span it ran under."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = "internal",
+                 attributes: dict = None, start_ns: int = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind  # internal | server | client
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = {}
+        self.error = None
+        self.set(**(attributes or {}))
+
+    def set(self, **attributes):
+        for key, value in attributes.items():
+            self.attributes[key] = _attribute(value)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+# ---------- Exporters ----------
+
+class JsonlExporter:
+    """Appends one JSON object per span to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[dict]):
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def to_otlp(spans: List[dict], service_name: str) -> dict:
+    """An OTLP/JSON ExportTraceServiceRequest body for `spans`."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "fleet.tracing"},
+            "spans": [{
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                **({"parentSpanId": span["parent_id"]} if span["parent_id"] else {}),
+                "name": span["name"],
+                "kind": OTLP_KINDS.get(span["kind"], 1),
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"]),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in span["attributes"].items() if value is not None
+                ],
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+class OtlpHttpExporter:
+    """POSTs spans as OTLP/JSON to a collector's /v1/traces endpoint (OpenTelemetry Collector, Jaeger, Tempo...)."""
+
+    def __init__(self, endpoint: str, service_name: str = "fleet", timeout: float = 5.0):
+        import httpx
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: List[dict]):
+        response = self._client.post(self.endpoint, json=to_otlp(spans, self.service_name))
+        response.raise_for_status()
+
+
+# ---------- Tracer ----------
+
+class Tracer:
+    """
+    Starts traces for a `sample_rate` share of root operations and ships
+    finished spans to `exporters` from a background thread, in batches, so
+    exporting never blocks the event loop. At most `max_queued` spans wait for
+    export; further spans are dropped (and counted) until a slow collector
+    catches up. The last `keep` traces also stay in memory for /traces.
+    """
+
+    def __init__(self, exporters: list, sample_rate: float = 1.0, keep: int = 100,
+                 batch_size: int = 512, flush_interval: float = 1.0, max_queued: int = 10000):
+        self.exporters = exporters
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recent: "OrderedDict[str, list]" = OrderedDict()
+        self.traces = 0
+        self.spans = 0
+        self.exported = 0
+        self.export_errors = 0
+        self.dropped = 0
+        self.last_error = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self, name: str, parent: Optional[Span], kind: str, attributes: dict, start_ns: int = None) -> Span:
+        if parent is None:
+            self.traces += 1
+            return Span(name, os.urandom(16).hex(), None, kind, attributes, start_ns)
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes, start_ns)
+
+    def finish(self, span: Span, end_ns: int = None):
+        span.end_ns = end_ns or time.time_ns()
+        item = span.to_dict()
+        self.spans += 1
+        trace = self.recent.setdefault(span.trace_id, [])
+        trace.append(item)
+        while len(self.recent) > self.keep:
+            self.recent.popitem(last=False)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                return
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._export(batch)
+            if stop:
+                return
+
+    def _export(self, batch: list):
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.export_errors += 1
+                self.last_error = f"{type(exporter).__name__}: {e}"
+                print(f"⚠️ Trace export failed ({self.last_error})")
+
+    def close(self):
+        """Export what is queued and stop the exporter thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "traces": self.traces,
+            "spans": self.spans,
+            "exported": self.exported,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+            "last_error": self.last_error,
+        }
+
+
+def configure(tracer: Optional[Tracer]):
+    """Install the process-wide tracer (None turns tracing off)."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+# ---------- Instrumentation ----------
+
+def start_span(name: str, root: bool = False, kind: str = "internal", **attributes) -> Optional[Span]:
+    """
+    A span under the current one, or a new (sampled) trace when `root` and
+    nothing is being traced. None when tracing is off or the trace is not
+    sampled. The span is not made current: see use_span().
+    """
+    parent = _current.get()
+    if _tracer is None or (parent is None and not (root and _tracer.sampled())):
+        return None
+    return _tracer.start(name, parent, kind, attributes)
+
+
+def end_span(span: Optional[Span], error: BaseException = None):
+    if span is None or _tracer is None:
+        return
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    _tracer.finish(span)
+
+
+@contextmanager
+def use_span(span: Optional[Span]):
+    """Make `span` the parent of spans started inside the block (and tasks created there)."""
+    if span is None:
+        yield None
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, root: bool = False, kind: str = "internal", **attributes):
+    """Trace the block as `name`; yields the Span (None when not traced) for adding attributes."""
+    current = start_span(name, root=root, kind=kind, **attributes)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        _tracer.finish(current)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes):
+    """
+    Record an already finished operation (e.g. an agent turn seen in a
+    message stream) under the current span. Such spans are marked
+    "observed": work traced meanwhile ran as their siblings, and
+    critical_path nests those siblings under them by time.
+    """
+    parent = _current.get()
+    if _tracer is None or parent is None:
+        return
+    _tracer.finish(_tracer.start(name, parent, "internal", {**attributes, "observed": True}, start_ns), end_ns)
+
+
+def traced(name: str, record: tuple = ()):
+    """
+    Decorator tracing every call of an async function as `name`.
+
+    The arguments named in `record` become span attributes, and so do the
+    "status" and "action" of a dict result. The signature is preserved, so
+    traced functions still work as agent tools.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None or _tracer is None:
+                return await func(*args, **kwargs)
+            attributes = {}
+            if record:
+                bound = signature.bind_partial(*args, **kwargs)
+                attributes = {key: bound.arguments[key] for key in record if key in bound.arguments}
+            with span(name, **attributes) as current:
+                result = await func(*args, **kwargs)
+                if isinstance(result, dict):
+                    current.set(**{key: result[key] for key in ("status", "action") if key in result})
+                return result
+
+        return wrapper
+    return decorate
+
+
+# ---------- Analysis ----------
+
+def critical_path(spans: List[dict]) -> List[dict]:
+    """
+    The chain of spans that determined a trace's duration, outermost first.
+
+    From the root, repeatedly follow the child that finished last before the
+    current point in time, then the sibling that finished before that child
+    started, and so on. Each step's `self_ms` is the part of its duration not
+    covered by critical children: time spent in that span's own code, or
+    waiting on something untraced. The `self_ms` values add up to the root's
+    duration.
+    """
+    if not spans:
+        return []
+    ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        if span["parent_id"] in ids:
+            children[span["parent_id"]].append(span)
+    for parent_id, siblings in list(children.items()):
+        observed = [span for span in siblings if span["attributes"].get("observed")]
+        if not observed:
+            continue
+        # Siblings that ran within an observed span (a tool call during an agent turn) belong to it
+        for span in list(siblings):
+            container = next((o for o in observed if o is not span and not span["attributes"].get("observed")
+                              and o["start_ns"] <= span["start_ns"] and span["end_ns"] <= o["end_ns"]), None)
+            if container is not None:
+                children[parent_id].remove(span)
+                children[container["span_id"]].append(span)
+    roots = [span for span in spans if span["parent_id"] not in ids]
+    root = max(roots, key=lambda span: span["end_ns"] - span["start_ns"])
+
+    path = []
+
+    def walk(span: dict, end_ns: int, depth: int):
+        entry = {"name": span["name"], "span_id": span["span_id"], "depth": depth,
+                 "duration_ms": span["duration_ms"], "self_ms": 0.0}
+        path.append(entry)
+        cursor = min(span["end_ns"], end_ns)
+        critical = []
+        for child in sorted(children[span["span_id"]], key=lambda c: c["end_ns"], reverse=True):
+            if child["end_ns"] <= cursor and child["end_ns"] > span["start_ns"]:
+                critical.append((child, cursor))
+                cursor = max(child["start_ns"], span["start_ns"])
+        covered = 0
+        for child, child_end in reversed(critical):
+            start = max(child["start_ns"], span["start_ns"])
+            covered += min(child["end_ns"], child_end) - start
+            walk(child, child_end, depth + 1)
+        own_end = min(span["end_ns"], end_ns)
+        entry["self_ms"] = round(max(0, own_end - span["start_ns"] - covered) / 1e6, 3)
+
+    walk(root, root["end_ns"], 0)
+    return path
+
+
+def summarize(spans: List[dict]) -> dict:
+    """Per-name totals (count, total and max ms) for one trace, slowest first."""
+    totals: Dict[str, dict] = {}
+    for span in spans:
+        item = totals.setdefault(span["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        item["count"] += 1
+        item["total_ms"] = round(item["total_ms"] + span["duration_ms"], 3)
+        item["max_ms"] = max(item["max_ms"], span["duration_ms"])
+    return dict(sorted(totals.items(), key=lambda item: -item[1]["total_ms"]))
+
+
+def load_traces(path: str) -> Dict[str, list]:
+    """Spans of a JSONL export grouped by trace id, in file order."""
+    traces: Dict[str, list] = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Critical path of traces exported to JSONL")
+    parser.add_argument("file", nargs="?", default="traces.jsonl")
+    parser.add_argument("--trace", help="Trace id (default: the slowest trace in the file)")
+    parser.add_argument("--last", type=int, default=0, help="Only consider the last N traces")
+    args = parser.parse_args()
+
+    traces = load_traces(args.file)
+    if args.last:
+        traces = OrderedDict(list(traces.items())[-args.last:])
+    if not traces:
+        print("No traces found")
+        return
+    if args.trace:
+        trace_id = args.trace
+    else:
+        trace_id = max(traces, key=lambda t: max(s["end_ns"] for s in traces[t]) - min(s["start_ns"] for s in traces[t]))
+    spans = traces[trace_id]
+    print(f"Trace {trace_id}: {len(spans)} spans")
+    print("\nCritical path (self time = not covered by a critical child):")
+    for step in critical_path(spans):
+        print(f"  {'  ' * step['depth']}{step['name']:<{50 - 2 * step['depth']}} "
+              f"{step['duration_ms']:>10.1f} ms  self {step['self_ms']:>9.1f} ms")
+    print("\nBy span name:")
+    for name, item in summarize(spans).items():
+        print(f"  {name:<50} x{item['count']:<4} total {item['total_ms']:>10.1f} ms  max {item['max_ms']:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+In-memory prefix index over company names, aliases and industries for typeahead
+"""
+import bisect
+import heapq
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from cache import normalize_query
+
+# Where aliases live in company data: top-level or under company_info
+ALIAS_KEYS = ("aliases", "ticker", "former_names")
+
+# Prefixes up to this long match so many entries that their top TOP_K terms are kept ranked
+# at load and update time instead of being ranked per suggest() call
+MEMO_PREFIX_LENGTH = 2
+
+# Terms kept per short prefix and ranking; /suggest caps limit at 50
+TOP_K = 50
+
+RANKINGS = ("recency", "popularity")
+
+
+def company_aliases(data: Any) -> List[str]:
+    """Alternative names of a company found in its data (aliases, ticker, former names)."""
+    aliases = []
+    for section in (data, data.get("company_info") if isinstance(data, dict) else None):
+        if not isinstance(section, dict):
+            continue
+        for key in ALIAS_KEYS:
+            value = section.get(key)
+            values = value if isinstance(value, list) else [value]
+            aliases += [str(item) for item in values if isinstance(item, (str, int)) and str(item).strip()]
+    return list(dict.fromkeys(aliases))
+
+
+def _keys(text: str) -> List[str]:
+    """Index keys for a term: its normalized text and every suffix starting at a word."""
+    words = normalize_query(text).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def _short_prefixes(key: str) -> set:
+    """Prefixes of an index key up to MEMO_PREFIX_LENGTH characters long."""
+    return {key[:n].rstrip() for n in range(1, min(len(key), MEMO_PREFIX_LENGTH) + 1)}
+
+
+class PrefixIndex:
+    """
+    Sorted array of (key, term) pairs searched with bisect.
+
+    Terms are companies (matched on their name and aliases) and industries.
+    Every word of a term is indexed, so "mot" finds "Tesla Motors". Each term
+    tracks when it was last updated and how often it was searched, and
+    suggest() returns the top `limit` matches by either. The top TOP_K terms of
+    every one- and two-letter prefix are kept ranked as terms change, so the
+    broadest prefixes never rank thousands of matches per call.
+    """
+
+    def __init__(self):
+        self._entries: List[tuple] = []  # sorted (key, kind, term name)
+        self._companies: Dict[str, dict] = {}  # name -> {"industry", "aliases", "updated", "hits"}
+        self._industries: Dict[str, dict] = {}  # name -> {"companies", "updated", "hits"}
+        self._top: Dict[tuple, List[tuple]] = {}  # (short prefix, ranking) -> best TOP_K (kind, name) first
+        self._loading = False
+        self.lookups = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, companies):
+        """Index (name, industry, data, last_updated) rows in bulk: append everything, sort once."""
+        self._loading = True
+        try:
+            for name, industry, data, last_updated in companies:
+                self.add_company(name, industry, data, last_updated)
+        finally:
+            self._loading = False
+        self._entries = sorted(set(self._entries))
+        self._rebuild_top()
+
+    def _info(self, kind: str, name: str) -> dict:
+        return self._companies[name] if kind == "company" else self._industries[name]
+
+    def _texts(self, kind: str, name: str) -> List[str]:
+        return [name] + self._companies[name]["aliases"] if kind == "company" else [name]
+
+    def _rank(self, term: tuple, by: str) -> tuple:
+        """Sort key of a (kind, name) term for a ranking, best first."""
+        info = self._info(*term)
+        field = "updated" if by == "recency" else "hits"
+        return (-info[field], -info["updated"], term[1], term[0])
+
+    def _matches(self, prefix: str) -> set:
+        """(kind, name) of every term with a key starting with `prefix`."""
+        matches = set()
+        position = bisect.bisect_left(self._entries, (prefix,))
+        while position < len(self._entries) and self._entries[position][0].startswith(prefix):
+            matches.add(self._entries[position][1:])
+            position += 1
+        return matches
+
+    def _promote(self, kind: str, name: str, rankings=RANKINGS):
+        """A term was added or now ranks higher: merge it into the top lists of its short prefixes."""
+        if self._loading:
+            return
+        term = (kind, name)
+        prefixes = set().union(*(_short_prefixes(key) for text in self._texts(kind, name) for key in _keys(text)))
+        for prefix in prefixes:
+            for by in rankings:
+                top = [other for other in self._top.get((prefix, by), []) if other != term]
+                bisect.insort(top, term, key=lambda other: self._rank(other, by))
+                self._top[(prefix, by)] = top[:TOP_K]
+
+    def _rebuild_top(self, prefixes: Optional[set] = None):
+        """Re-rank the top lists of `prefixes` (all short prefixes when None) from the entries."""
+        if self._loading:
+            return
+        if prefixes is None:
+            self._top = {}
+            groups: Dict[str, set] = {}
+            for key, kind, name in self._entries:
+                for prefix in _short_prefixes(key):
+                    groups.setdefault(prefix, set()).add((kind, name))
+        else:
+            groups = {prefix: self._matches(prefix) for prefix in prefixes}
+        candidates = set().union(*groups.values())
+        for by in RANKINGS:
+            ranks = {term: self._rank(term, by) for term in candidates}
+            for prefix, terms in groups.items():
+                top = heapq.nsmallest(TOP_K, terms, key=ranks.__getitem__)
+                if top:
+                    self._top[(prefix, by)] = top
+                else:
+                    self._top.pop((prefix, by), None)
+
+    def _insert(self, text: str, kind: str, name: str):
+        if self._loading:
+            self._entries += [(key, kind, name) for key in _keys(text)]
+            return
+        for key in _keys(text):
+            entry = (key, kind, name)
+            position = bisect.bisect_left(self._entries, entry)
+            if position == len(self._entries) or self._entries[position] != entry:
+                self._entries.insert(position, entry)
+
+    def _delete(self, text: str, kind: str, name: str):
+        for key in _keys(text):
+            entry = (key, kind, name)
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+    def add_company(self, name: str, industry: Optional[str], data: Any = None,
+                    last_updated: Optional[datetime] = None):
+        """Index a stored company, replacing what was indexed for it before."""
+        # Stored timestamps are naive UTC; .timestamp() alone would read them as local time
+        updated = last_updated.replace(tzinfo=timezone.utc).timestamp() if last_updated else 0.0
+        previous = self._companies.get(name)
+        aliases = [alias for alias in company_aliases(data) if normalize_query(alias) != normalize_query(name)]
+        # Short prefixes whose top lists may lose this company or an industry: re-ranked from scratch
+        stale = set()
+        if previous is not None:
+            dropped = [alias for alias in previous["aliases"] if alias not in aliases]
+            if updated < previous["updated"]:
+                dropped = [name] + previous["aliases"]
+            stale |= {prefix for text in dropped for key in _keys(text) for prefix in _short_prefixes(key)}
+            if previous["industry"] and previous["industry"] != industry:
+                stale |= {prefix for key in _keys(previous["industry"]) for prefix in _short_prefixes(key)}
+            # Texts of one company can share keys, so drop them all before re-adding
+            for text in [name] + previous["aliases"]:
+                self._delete(text, "company", name)
+            if previous["industry"] != industry:
+                self._leave_industry(previous["industry"])
+        for text in [name] + aliases:
+            self._insert(text, "company", name)
+        if previous is None or previous["industry"] != industry:
+            self._join_industry(industry)
+        if industry:
+            info = self._industries[industry]
+            info["updated"] = max(info["updated"], updated)
+        self._companies[name] = {
+            "industry": industry,
+            "aliases": aliases,
+            "updated": updated,
+            "hits": previous["hits"] if previous else 0,
+        }
+        self._rebuild_top(stale)
+        self._promote("company", name)
+        if industry:
+            self._promote("industry", industry)
+
+    def _join_industry(self, industry: Optional[str]):
+        if not industry:
+            return
+        info = self._industries.get(industry)
+        if info is None:
+            info = self._industries[industry] = {"companies": 0, "updated": 0.0, "hits": 0}
+            self._insert(industry, "industry", industry)
+        info["companies"] += 1
+
+    def _leave_industry(self, industry: Optional[str]):
+        info = self._industries.get(industry) if industry else None
+        if info is None:
+            return
+        info["companies"] -= 1
+        if info["companies"] <= 0:
+            del self._industries[industry]
+            self._delete(industry, "industry", industry)
+
+    def record_search(self, query: str):
+        """Count a search for popularity ranking when it names a company, alias or industry exactly."""
+        key = normalize_query(query)
+        position = bisect.bisect_left(self._entries, (key,))
+        seen = set()
+        while position < len(self._entries) and self._entries[position][0] == key:
+            _, kind, name = self._entries[position]
+            if (kind, name) not in seen:
+                seen.add((kind, name))
+                terms = self._companies if kind == "company" else self._industries
+                terms[name]["hits"] += 1
+                self._promote(kind, name, ("popularity",))
+            position += 1
+
+    def hits(self, kind: str, name: str) -> int:
+        """How often a company or industry was searched by name (0 if it is not indexed)."""
+        terms = self._companies if kind == "company" else self._industries
+        return terms[name]["hits"] if name in terms else 0
+
+    def lookup(self, text: str) -> List[tuple]:
+        """(kind, name) of every company whose name or alias, or industry whose name, is exactly `text`."""
+        key = normalize_query(text)
+        found = []
+        position = bisect.bisect_left(self._entries, (key,))
+        while position < len(self._entries) and self._entries[position][0] == key:
+            _, kind, name = self._entries[position]
+            # Keys include word suffixes ("motors" for "Tesla Motors"): keep whole-text matches only
+            texts = [name] + self._companies[name]["aliases"] if kind == "company" else [name]
+            if any(normalize_query(candidate) == key for candidate in texts) and (kind, name) not in found:
+                found.append((kind, name))
+            position += 1
+        return found
+
+    def suggest(self, prefix: str, limit: int = 8, by: str = "recency") -> List[dict]:
+        """Top `limit` terms starting with `prefix` (at any word), by "recency" or "popularity"."""
+        if by not in ("recency", "popularity"):
+            raise ValueError("by must be 'recency' or 'popularity'")
+        self.lookups += 1
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= MEMO_PREFIX_LENGTH and limit <= TOP_K:
+            ranked = self._top.get((prefix, by), [])[:limit]
+        else:
+            ranked = self._rank_longer(prefix, limit, by)
+        suggestions = []
+        for kind, name in ranked:
+            info = self._info(kind, name)
+            item = {"text": name, "kind": kind, "searches": info["hits"]}
+            if kind == "company":
+                item["industry"] = info["industry"]
+            else:
+                item["companies"] = info["companies"]
+            item["last_updated"] = datetime.utcfromtimestamp(info["updated"]).isoformat() if info["updated"] else None
+            suggestions.append(item)
+        return suggestions
+
+    def _rank_longer(self, prefix: str, limit: int, by: str) -> List[tuple]:
+        """
+        Top `limit` terms for a prefix longer than MEMO_PREFIX_LENGTH. Its
+        matches are a subset of its short prefix's, so when `limit` of that
+        top list match, they are the answer; otherwise rank every match.
+        """
+        if limit <= TOP_K:
+            top = self._top.get((prefix[:MEMO_PREFIX_LENGTH].rstrip(), by), [])
+            found = []
+            for term in top:
+                if any(key.startswith(prefix) for text in self._texts(*term) for key in _keys(text)):
+                    found.append(term)
+                    if len(found) == limit:
+                        return found
+            if len(top) < TOP_K:
+                return found  # the top list holds every match of the short prefix
+        return heapq.nsmallest(limit, self._matches(prefix), key=lambda term: self._rank(term, by))
+
+    def stats(self) -> dict:
+        return {
+            "companies": len(self._companies),
+            "industries": len(self._industries),
+            "keys": len(self._entries),
+            "lookups": self.lookups,
+        }
@@ -0,0 +1,165 @@
+"""
+Write-behind buffer for store_data
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from cache import could_match
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-memory buffer of pending company writes.
+
+    put() returns as soon as the record is buffered. A background task flushes
+    the buffer through `flush_fn` (store_many) when it holds `batch_size`
+    companies or every `interval` seconds. Repeated writes to the same company
+    before a flush are coalesced into the latest one. When `max_pending`
+    companies are waiting, put() blocks until a flush makes room. A write whose
+    flush failed is retried on its own, and dropped (and reported) after
+    `max_attempts` failed flushes.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[list], Awaitable[dict]],
+        max_pending: int = 10000,
+        batch_size: int = 500,
+        interval: float = 0.5,
+        max_attempts: int = 3,
+    ):
+        self._flush_fn = flush_fn
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._pending: "OrderedDict[str, dict]" = OrderedDict()
+        self._inflight = {}  # batch being written by flush(), not committed yet
+        self._attempts = {}  # company name -> failed flushes of its pending write
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.queued = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_dropped = None
+
+    async def put(self, company_name: str, industry: str, data: dict):
+        """Buffer a write, waiting for room if the buffer is full."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        async with self._space:
+            await self._space.wait_for(
+                lambda: company_name in self._pending or len(self._pending) < self.max_pending
+            )
+            if company_name in self._pending:
+                self.coalesced += 1
+                del self._pending[company_name]
+            self._attempts.pop(company_name, None)  # new data gets its own retries
+            self._pending[company_name] = {"company_name": company_name, "industry": industry, "data": data}
+            self.queued += 1
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def has_pending(self, query: str = None, fuzzy: bool = False) -> bool:
+        """Whether any buffered or in-flight write exists (that a search for `query` could return)."""
+        records = list(self._pending.values()) + list(self._inflight.values())
+        if query is None:
+            return bool(records)
+        return any(could_match(query, r["company_name"], r["industry"], r["data"], fuzzy) for r in records)
+
+    async def flush(self):
+        """Write everything buffered so far and wait for the commit (including a flush already running)."""
+        async with self._flush_lock:
+            while self._pending:
+                batch = list(self._pending.values())[: self.batch_size]
+                if self._attempts:
+                    # A write that failed before is retried alone, so it cannot fail its batch-mates again
+                    retry = next((r for r in self._pending.values() if r["company_name"] in self._attempts), None)
+                    batch = [retry] if retry is not None else batch
+                # Still visible to has_pending() until committed, so reads keep waiting for it
+                self._inflight = {record["company_name"]: record for record in batch}
+                for record in batch:
+                    del self._pending[record["company_name"]]
+                async with self._space:
+                    self._space.notify_all()
+
+                try:
+                    try:
+                        result = await self._flush_fn(batch)
+                    except BaseException as e:
+                        self._retry(batch, {record["company_name"]: repr(e) for record in batch})
+                        raise
+                    failed = {name: error["message"] for error in result.get("errors", []) for name in error["companies"]}
+                    self.flushed += len(batch) - len(failed)
+                    for record in batch:
+                        if record["company_name"] not in failed:
+                            self._attempts.pop(record["company_name"], None)
+                    if failed:
+                        self.failed += len(failed)
+                        print(f"⚠️ Write-behind flush failed for {len(failed)} companies, will retry: "
+                              f"{next(iter(failed.values()))}")
+                        self._retry([r for r in batch if r["company_name"] in failed], failed)
+                        break
+                finally:
+                    self._inflight = {}
+
+    def _retry(self, records: list, errors: dict):
+        """
+        Put failed records back unless a newer write for the same company is
+        already waiting; drop the ones that failed `max_attempts` times.
+        """
+        for record in records:
+            name = record["company_name"]
+            if name in self._pending:
+                continue
+            attempts = self._attempts.get(name, 0) + 1
+            if attempts >= self.max_attempts:
+                self._attempts.pop(name, None)
+                self.dropped += 1
+                self.last_dropped = {"company": name, "attempts": attempts, "message": errors.get(name)}
+                print(f"❌ Write-behind dropped the write for {name} after {attempts} failed flushes: {errors.get(name)}")
+                continue
+            self._attempts[name] = attempts
+            self._pending[name] = record
+
+    async def close(self):
+        """Flush pending writes and stop the background flusher."""
+        if self._task is not None:
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._pending:
+            print(f"⚠️ Write-behind closed with {len(self._pending)} unflushed companies")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "inflight": len(self._inflight),
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "last_dropped": self.last_dropped,
+        }
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"⚠️ Write-behind flush error: {e}")